@@ -0,0 +1,4 @@
+"""
+Benchmark suite of medio's readers and writers over synthetic fixtures. Run from the repository root:
+python -m benchmarks.run --sizes small medium --output results.json
+"""
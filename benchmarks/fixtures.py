@@ -0,0 +1,142 @@
+"""
+Synthetic benchmark fixtures, generated once into a data directory and reused across runs.
+Every fixture is a smooth int16 volume with an axis-aligned affine (anisotropic spacing and a shifted origin),
+saved in one of the formats below. The DICOM series is saved by ITK as uint8 (the only pixel type it writes), and the
+multiframe DICOM is an enhanced CT file written with pydicom.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydicom.dataset import Dataset, FileDataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import EnhancedCTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+from medio.read_save import save_dir, save_img
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from numpy.typing import NDArray
+    from pydicom.uid import UID
+
+# spatial shapes (x, y, z)
+SIZES: dict[str, tuple[int, int, int]] = {
+    "tiny": (32, 32, 8),
+    "small": (128, 128, 64),
+    "medium": (256, 256, 128),
+    "large": (512, 512, 256),
+}
+FORMATS = ("nii", "nii.gz", "mhd", "dcm_series", "dcm_multiframe")
+SPACING = (0.8, 0.8, 2.5)
+ORIGIN = (-100.0, -120.0, 30.0)
+
+
+def synthetic_volume(shape: tuple[int, int, int], dtype: type = np.int16) -> NDArray[np.generic]:
+    """A smooth, deterministic volume with values in [0, 1000) (or [0, 250) for uint8)"""
+    x, y, z = np.ogrid[: shape[0], : shape[1], : shape[2]]
+    volume = (x * 7 + y * 3 + z * 11) % 1000
+    if np.dtype(dtype) == np.uint8:
+        volume = volume // 4
+    return volume.astype(dtype)
+
+
+def synthetic_metadata() -> MetaData[object]:
+    return MetaData(Affine(direction=np.eye(3), spacing=list(SPACING), origin=list(ORIGIN)), coord_sys="itk")
+
+
+def fixture_path(data_dir: Path, fmt: str, size: str) -> Path:
+    if fmt in ("nii", "nii.gz", "mhd"):
+        return data_dir / f"{size}.{fmt}"
+    if fmt == "dcm_series":
+        return data_dir / f"{size}_series"
+    if fmt == "dcm_multiframe":
+        return data_dir / f"{size}_multiframe.dcm"
+    raise ValueError(f'Invalid fixture format: "{fmt}", should be one of: {FORMATS}')
+
+
+def make_fixture(data_dir: Path, fmt: str, size: str) -> Path:
+    """Generate the fixture of the format and size in data_dir, unless it already exists, and return its path"""
+    path = fixture_path(data_dir, fmt, size)
+    if path.exists():
+        return path
+    data_dir.mkdir(parents=True, exist_ok=True)
+    shape = SIZES[size]
+    metadata = synthetic_metadata()
+    if fmt == "dcm_series":
+        save_dir(path, synthetic_volume(shape, np.uint8), metadata, parents=True)
+    elif fmt == "dcm_multiframe":
+        write_multiframe(path, synthetic_volume(shape).T)
+    else:
+        save_img(path, synthetic_volume(shape), metadata)
+    return path
+
+
+def write_multiframe(
+    filename: Path,
+    pixels: NDArray[np.generic],
+    spacing: tuple[float, float, float] = SPACING,
+    origin: tuple[float, float, float] = ORIGIN,
+    slope: float = 1.0,
+    intercept: float = 0.0,
+    bits_stored: int | None = None,
+    transfer_syntax: UID = ExplicitVRLittleEndian,
+) -> None:
+    """
+    Write pixels (frames, rows, columns) as an enhanced CT multiframe DICOM file with axial frames
+    :param spacing: the (x, y, z) spacing, z being the distance between consecutive frames
+    :param origin: the position of the first voxel of the first frame
+    :param bits_stored: the stored bits of each pixel value, all the bits of the pixels' dtype by default
+    :param transfer_syntax: the transfer syntax of the file, a compressed one requires pydicom's encoders
+    """
+    n_frames, rows, columns = pixels.shape
+    bits_allocated = pixels.dtype.itemsize * 8
+    bits_stored = bits_allocated if bits_stored is None else bits_stored
+    ds = Dataset()
+    ds.SOPClassUID = EnhancedCTImageStorage
+    ds.SOPInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.Modality = "CT"
+    ds.NumberOfFrames = n_frames
+    ds.Rows, ds.Columns = rows, columns
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = bits_allocated, bits_stored, bits_stored - 1
+    ds.PixelRepresentation = int(np.issubdtype(pixels.dtype, np.signedinteger))
+
+    shared = Dataset()
+    orientation = Dataset()
+    orientation.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    shared.PlaneOrientationSequence = Sequence([orientation])
+    measures = Dataset()
+    measures.PixelSpacing = [spacing[1], spacing[0]]
+    measures.SliceThickness = spacing[2]
+    shared.PixelMeasuresSequence = Sequence([measures])
+    transformation = Dataset()
+    transformation.RescaleSlope = slope
+    transformation.RescaleIntercept = intercept
+    shared.PixelValueTransformationSequence = Sequence([transformation])
+    ds.SharedFunctionalGroupsSequence = Sequence([shared])
+
+    per_frame = []
+    for k in range(n_frames):
+        position = Dataset()
+        position.ImagePositionPatient = [origin[0], origin[1], origin[2] + spacing[2] * k]
+        frame = Dataset()
+        frame.PlanePositionSequence = Sequence([position])
+        per_frame.append(frame)
+    ds.PerFrameFunctionalGroupsSequence = Sequence(per_frame)
+    ds.PixelData = np.ascontiguousarray(pixels).tobytes()
+
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+    file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    file_ds = FileDataset(str(filename), ds, file_meta=file_meta, preamble=b"\0" * 128)
+    if transfer_syntax != ExplicitVRLittleEndian:
+        file_ds.compress(transfer_syntax)
+    file_ds.save_as(filename)
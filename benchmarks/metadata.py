@@ -0,0 +1,82 @@
+"""
+Microbenchmark of the metadata objects: constructing MetaData (with its Affine), converting its coordinate system,
+pickling it, and bulk read_meta scans of the tiny fixtures, where the metadata construction is a large part of the
+call. Run from the repository root:
+python -m benchmarks.metadata --number 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import pickle
+import tempfile
+import timeit
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from benchmarks.fixtures import make_fixture
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+from medio.read_save import read_meta
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+DEFAULT_DATA_DIR = Path(tempfile.gettempdir()) / "medio_benchmarks"
+SCAN_FORMATS = ("nii", "mhd", "dcm_multiframe")
+
+
+def oblique_affine() -> np.ndarray:
+    """An affine with a rotated direction, anisotropic spacing and a shifted origin"""
+    angle = np.deg2rad(20)
+    rotation = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+    return Affine.construct_affine(rotation, [0.8, 0.8, 2.5], [-100.0, -120.0, 30.0])
+
+
+def benchmarks(data_dir: Path) -> dict[str, Callable[[], object]]:
+    matrix = oblique_affine()
+    metadata = MetaData(matrix, coord_sys="itk", spatial_shape=(32, 32, 8))
+
+    def convert() -> None:
+        MetaData(matrix, coord_sys="itk").convert("nib")
+
+    scan_paths = [make_fixture(data_dir, fmt, "tiny") for fmt in SCAN_FORMATS]
+
+    def scan() -> None:
+        for path in scan_paths:
+            read_meta(path)
+
+    return {
+        "construct": lambda: MetaData(matrix, coord_sys="itk"),
+        "construct+spacing": lambda: MetaData(matrix, coord_sys="itk").spacing,
+        "convert": convert,
+        "pickle": lambda: pickle.loads(pickle.dumps(metadata)),
+        f"read_meta scan ({len(scan_paths)} files)": scan,
+    }
+
+
+def run(number: int, data_dir: Path, repeat: int = 5) -> dict[str, float]:
+    """The minimal microseconds per call of every benchmark, the scan is run number // 100 times"""
+    results = {}
+    for name, func in benchmarks(data_dir).items():
+        n = max(number // 100, 1) if name.startswith("read_meta") else number
+        results[name] = min(timeit.repeat(func, number=n, repeat=repeat)) / n * 1e6
+    return results
+
+
+def main(argv: list[str] | None = None) -> dict[str, float]:
+    parser = argparse.ArgumentParser(description="Microbenchmark of the construction of medio's metadata")
+    parser.add_argument("--number", type=int, default=20000, help="number of calls per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="directory of the generated fixtures")
+    args = parser.parse_args(argv)
+    results = run(args.number, args.data_dir, args.repeat)
+    for name, microseconds in results.items():
+        print(f"{name:<30} {microseconds:>10.2f} us")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Command line runner of the benchmark suite, which prints a results table and optionally saves the results as JSON.
+Example (from the repository root):
+python -m benchmarks.run --sizes small medium --operations read_img read_meta --output results.json
+With --calibrate, the read results are also fitted into a cost table for backend='auto-fast' (see
+medio.backends.cost_model), which is used when the MEDIO_COST_TABLE environment variable points to it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+
+from benchmarks.fixtures import FORMATS, SIZES
+from benchmarks.suite import OPERATIONS, cases, run_suite
+from medio.backends.cost_model import calibrate, save_cost_table
+
+DEFAULT_DATA_DIR = Path(tempfile.gettempdir()) / "medio_benchmarks"
+
+
+def environment() -> dict[str, str]:
+    packages = ("medio", "numpy", "nibabel", "itk", "pydicom", "dicom-numpy")
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **{package: version(package) for package in packages},
+    }
+
+
+def format_record(record: dict[str, Any]) -> str:
+    if "error" in record:
+        return f"{record['name']:<45} ERROR {record['error']}"
+    peak = record["peak_rss_mb"]
+    rss = "" if peak is None else f"{peak:>10.1f} {peak - record['baseline_rss_mb']:>10.1f}"
+    return f"{record['name']:<45} {record['min'] * 1e3:>10.2f} {record['median'] * 1e3:>10.2f} {rss}"
+
+
+def main(argv: list[str] | None = None) -> list[dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Benchmark medio's readers and writers")
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS), choices=OPERATIONS)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--backends", nargs="+", default=None, choices=("itk", "nib", "pdcm"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="directory of the generated fixtures")
+    parser.add_argument("--no-isolate", action="store_true", help="run the cases in this process (inaccurate RSS)")
+    parser.add_argument("--output", type=Path, default=None, help="JSON file to save the results to")
+    parser.add_argument("--calibrate", type=Path, default=None, help="JSON file to save the fitted cost table to")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<45} {'min [ms]':>10} {'median':>10} {'peak [MB]':>10} {'delta':>10}")
+    records = run_suite(
+        cases(args.operations, args.formats, args.sizes, args.backends),
+        args.data_dir,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        isolate=not args.no_isolate,
+        callback=lambda record: print(format_record(record), flush=True),
+    )
+    if args.output is not None:
+        args.output.write_text(json.dumps({"environment": environment(), "results": records}, indent=2))
+    if args.calibrate is not None:
+        save_cost_table(args.calibrate, calibrate(records))
+    return records
+
+
+if __name__ == "__main__":
+    sys.exit(0 if all("error" not in record for record in main()) else 1)
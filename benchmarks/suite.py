@@ -0,0 +1,194 @@
+"""
+Benchmark cases: read_img, read_meta, reorientation (read_img with a desired orientation), save_img and save_dir, for
+every backend that supports the fixture's format.
+A case is timed over a number of repeats, and by default runs in a fresh subprocess, so its peak resident set size
+(RSS) is not shadowed by previous cases. The peak RSS is reported together with the baseline RSS before the timed
+operation (after the imports and the setup), so their difference is the memory overhead of the operation.
+"""
+
+from __future__ import annotations
+
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple, cast
+
+import numpy as np
+
+from benchmarks.fixtures import FORMATS, SIZES, make_fixture, synthetic_metadata, synthetic_volume
+from medio.backends.cost_model import inspect_input
+from medio.read_save import read_img, read_meta, save_dir, save_img
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from medio.read_save import ReadBackend, WriteBackend
+
+OPERATIONS = ("read_img", "read_meta", "reorient", "save_img", "save_dir")
+# the backends that read each fixture format
+READ_BACKENDS: dict[str, tuple[str, ...]] = {
+    "nii": ("nib", "itk"),
+    "nii.gz": ("nib", "itk"),
+    "mhd": ("itk",),
+    "dcm_series": ("itk", "pdcm"),
+    "dcm_multiframe": ("pdcm", "itk"),
+}
+# the backends that write each format
+WRITE_BACKENDS: dict[str, tuple[str, ...]] = {
+    "nii": ("nib", "itk"),
+    "nii.gz": ("nib", "itk"),
+    "mhd": ("itk",),
+    "dcm_series": ("itk",),
+}
+# the desired orientation of the reorientation benchmark, which permutes and flips the axes of the fixtures (RAI)
+REORIENT_ORNT = "ASL"
+
+
+class Case(NamedTuple):
+    operation: str
+    fmt: str
+    size: str
+    backend: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.operation}[{self.fmt}-{self.size}-{self.backend}]"
+
+
+def cases(
+    operations: Iterable[str] = OPERATIONS,
+    formats: Iterable[str] = FORMATS,
+    sizes: Iterable[str] = SIZES,
+    backends: Iterable[str] | None = None,
+) -> list[Case]:
+    """All the cases of the given operations, formats and sizes, for the backends that support them"""
+    backends = None if backends is None else set(backends)
+    all_cases = []
+    for size in sizes:
+        for fmt in formats:
+            for operation in operations:
+                if operation == "save_dir":
+                    supported = WRITE_BACKENDS["dcm_series"] if fmt == "dcm_series" else ()
+                elif operation == "save_img":
+                    supported = WRITE_BACKENDS.get(fmt, ()) if fmt != "dcm_series" else ()
+                else:
+                    supported = READ_BACKENDS[fmt]
+                all_cases.extend(
+                    Case(operation, fmt, size, backend)
+                    for backend in supported
+                    if backends is None or backend in backends
+                )
+    return all_cases
+
+
+def peak_rss_mb() -> float | None:
+    """The peak RSS of the current process in MB"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def prepare(case: Case, data_dir: Path, out_dir: Path) -> tuple[Callable[[int], object], Path]:
+    """Return the benchmarked function of the case, of the repeat number, and the path of its fixture"""
+    path = make_fixture(data_dir, case.fmt, case.size)
+    operation = case.operation
+    # the cases' backends are the ones of READ_BACKENDS and WRITE_BACKENDS
+    backend = cast("ReadBackend", case.backend)
+    if operation == "read_img":
+        return lambda _: read_img(path, backend=backend), path
+    if operation == "read_meta":
+        return lambda _: read_meta(path, backend=backend), path
+    if operation == "reorient":
+        return lambda _: read_img(path, REORIENT_ORNT, backend=backend), path
+    metadata = synthetic_metadata()
+    if operation == "save_img":
+        image = synthetic_volume(SIZES[case.size])
+        suffix = path.name.split(".", 1)[1]
+        write_backend = cast("WriteBackend", case.backend)
+        return lambda i: save_img(out_dir / f"{i}.{suffix}", image, metadata, backend=write_backend), path
+    if operation == "save_dir":
+        image = synthetic_volume(SIZES[case.size], dtype=np.uint8)
+        return lambda i: save_dir(out_dir / str(i), image, metadata), path
+    raise ValueError(f'Invalid operation: "{operation}", should be one of: {OPERATIONS}')
+
+
+def run_case(case: Case, data_dir: str | Path, repeat: int = 5, warmup: int = 1) -> dict[str, Any]:
+    """Run a case in the current process and return its results record"""
+    data_dir = Path(data_dir)
+    record: dict[str, Any] = {**case._asdict(), "name": case.name, "shape": SIZES[case.size]}
+    out_dir = Path(tempfile.mkdtemp(prefix="medio_bench_"))
+    try:
+        func, path = prepare(case, data_dir, out_dir)
+        # the same size measure as the cost model of backend='auto-fast'
+        record["file_mb"] = round(inspect_input(path).size_mb, 3)
+        # before the warmup, which already reaches the peak RSS of the operation
+        baseline_rss = peak_rss_mb()
+        for i in range(warmup):
+            func(-1 - i)
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            func(i)
+            times.append(time.perf_counter() - start)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        return record
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    record.update(
+        times=times,
+        min=min(times),
+        median=statistics.median(times),
+        baseline_rss_mb=baseline_rss,
+        peak_rss_mb=peak_rss_mb(),
+    )
+    return record
+
+
+def run_isolated(case: Case, data_dir: str | Path, repeat: int = 5, warmup: int = 1) -> dict[str, Any]:
+    """Run a case in a fresh subprocess, for an accurate peak RSS"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_case, case, str(data_dir), repeat, warmup).result()
+
+
+def run_suite(
+    suite_cases: Iterable[Case],
+    data_dir: str | Path,
+    repeat: int = 5,
+    warmup: int = 1,
+    isolate: bool = True,
+    callback: Callable[[dict[str, Any]], None] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Run the cases and return their results records
+    :param suite_cases: the cases to run, see cases()
+    :param data_dir: the directory of the fixtures, which are generated on the first run
+    :param repeat: the number of timed repeats of every case
+    :param warmup: the number of untimed runs before the timed ones
+    :param isolate: run every case in a fresh subprocess (for the peak RSS)
+    :param callback: optional function, called with the record of every case when it is finished
+    :return: list of records with the case, times (seconds), min, median, file_mb, baseline_rss_mb, peak_rss_mb, or
+    an error message
+    """
+    runner = run_isolated if isolate else run_case
+    records = []
+    for case in suite_cases:
+        # generate the fixture here, so its generation is not counted in the peak RSS of the case
+        make_fixture(Path(data_dir), case.fmt, case.size)
+        record = runner(case, data_dir, repeat, warmup)
+        if callback is not None:
+            callback(record)
+        records.append(record)
+    return records
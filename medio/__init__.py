@@ -4,7 +4,7 @@ from importlib.metadata import version
 
 from medio.backends.itk_io import ItkIO
 from medio.medimg import MedImg
-from medio.metadata.affine import Affine
+from medio.metadata.affine import Affine, AffineStack
 from medio.metadata.metadata import CoordSys, MetaData
 from medio.read_save import read_img, read_meta, save_dir, save_img
 
@@ -12,6 +12,7 @@ __version__ = version("medio")
 
 __all__ = [
     "Affine",
+    "AffineStack",
     "CoordSys",
     "ItkIO",
     "MedImg",
@@ -0,0 +1,189 @@
+"""
+Asynchronous read_img, read_meta, save_img and save_dir for asyncio applications, e.g. a server of many concurrent
+studies. The blocking work (file access, decoding and encoding) runs in a managed thread pool, so the event loop is
+never blocked, and every call accepts a timeout and can be cancelled:
+>>> import medio.aio
+>>> np_image, metadata = await medio.aio.read_img(path, timeout=30)
+>>> images = await asyncio.gather(*(medio.aio.read_img(path) for path in paths))
+The arguments are the same as of the synchronous functions in medio.read_save, with the keyword-only timeout (seconds)
+and executor (instead of the managed one).
+A timed-out or cancelled call raises asyncio.TimeoutError or asyncio.CancelledError immediately. A call which has not
+started yet is removed from the pool's queue; a read which has started finishes in its thread and its result is
+discarded, since the decoders cannot be interrupted. A save writes to a temporary file in the output directory which is
+renamed to the filename at the end, and a cancelled save removes it instead, so a timed-out save never leaves a
+partial or a new file (except of the two-file formats .mhd and .hdr/.img, which are written in place).
+The calls run in a copy of the caller's context, so medio.instrument records them for the calling task.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+from medio import read_save
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import numpy as np
+    from numpy.typing import NDArray
+
+    from medio.metadata.metadata import MetaData
+
+T = TypeVar("T")
+
+# formats whose header references a separate data file by name, so they cannot be renamed after writing
+_MULTI_FILE_SUFFIXES = (".mhd", ".hdr", ".img", ".img.gz")
+
+_executor: Executor | None = None
+_owns_executor = False
+_lock = threading.Lock()
+
+
+def get_executor() -> Executor:
+    """The executor of the calls: the one set with set_executor, or a managed thread pool which is created lazily"""
+    global _executor, _owns_executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="medio-aio")
+            _owns_executor = True
+        return _executor
+
+
+def set_executor(executor: Executor | None) -> None:
+    """
+    Set the executor of the calls, e.g. a ThreadPoolExecutor with a max_workers limit for bounding the concurrent
+    decodes. The executor is not shut down by medio. None restores the managed thread pool
+    """
+    global _executor, _owns_executor
+    shutdown(wait=False)
+    with _lock:
+        _executor = executor
+        _owns_executor = False
+
+
+def shutdown(wait: bool = True) -> None:
+    """Shut down the managed thread pool (a new one is created on the next call)"""
+    global _executor, _owns_executor
+    with _lock:
+        executor, owned = _executor, _owns_executor
+        _executor, _owns_executor = None, False
+    if executor is not None and owned:
+        executor.shutdown(wait=wait)
+
+
+async def _run(
+    func: Callable[..., T],
+    *args: Any,
+    timeout: float | None = None,
+    executor: Executor | None = None,
+    cancelled: threading.Event | None = None,
+    **kwargs: Any,
+) -> T:
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    future = loop.run_in_executor(get_executor() if executor is None else executor, call)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        if cancelled is not None:
+            cancelled.set()
+        raise
+
+
+async def read_img(
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
+    *args: Any,
+    timeout: float | None = None,
+    executor: Executor | None = None,
+    **kwargs: Any,
+) -> tuple[NDArray[np.generic], MetaData[Any]]:
+    """Asynchronous medio.read_img, see its documentation. timeout is in seconds, None for no timeout"""
+    return await _run(read_save.read_img, input_path, *args, timeout=timeout, executor=executor, **kwargs)
+
+
+async def read_meta(
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
+    *args: Any,
+    timeout: float | None = None,
+    executor: Executor | None = None,
+    **kwargs: Any,
+) -> MetaData[Any]:
+    """Asynchronous medio.read_meta, see its documentation. timeout is in seconds, None for no timeout"""
+    return await _run(read_save.read_meta, input_path, *args, timeout=timeout, executor=executor, **kwargs)
+
+
+async def save_img(
+    filename: str | os.PathLike[str],
+    np_image: NDArray[np.generic],
+    metadata: MetaData[Any],
+    *args: Any,
+    timeout: float | None = None,
+    executor: Executor | None = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Asynchronous medio.save_img, see its documentation. timeout is in seconds, None for no timeout.
+    The file is written atomically (except of .mhd and .hdr/.img), and not at all if the call is cancelled
+    """
+    cancelled = threading.Event()
+    await _run(
+        _save_img_atomic,
+        filename,
+        np_image,
+        metadata,
+        cancelled,
+        *args,
+        timeout=timeout,
+        executor=executor,
+        cancelled=cancelled,
+        **kwargs,
+    )
+
+
+async def save_dir(
+    dirname: str | os.PathLike[str],
+    np_image: NDArray[np.generic],
+    metadata: MetaData[Any],
+    *args: Any,
+    timeout: float | None = None,
+    executor: Executor | None = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Asynchronous medio.save_dir, see its documentation. timeout is in seconds, None for no timeout.
+    A save which has started is not interrupted, so the directory may be partially written after a timeout
+    """
+    await _run(read_save.save_dir, dirname, np_image, metadata, *args, timeout=timeout, executor=executor, **kwargs)
+
+
+def _save_img_atomic(
+    filename: str | os.PathLike[str],
+    np_image: NDArray[np.generic],
+    metadata: MetaData[Any],
+    cancelled: threading.Event,
+    *args: Any,
+    **kwargs: Any,
+) -> None:
+    """Save to a temporary file with the same suffix and rename it to filename, unless cancelled is set by then"""
+    filename = Path(filename)
+    if filename.name.endswith(_MULTI_FILE_SUFFIXES):
+        read_save.save_img(filename, np_image, metadata, *args, **kwargs)
+        return
+    suffix = "".join(filename.suffixes[-2:]) if filename.suffix == ".gz" else filename.suffix
+    temp = filename.with_name(f".{filename.name}.{uuid.uuid4().hex}.partial{suffix}")
+    try:
+        read_save.save_img(temp, np_image, metadata, *args, **kwargs)
+        if not cancelled.is_set():
+            os.replace(temp, filename)
+    finally:
+        if temp.exists():
+            temp.unlink()
@@ -0,0 +1,477 @@
+"""
+The medio chunked volume format (.mvc), for storing images with random access to their regions: a single file of a
+JSON header, an index of the chunks and the chunks - fixed-size blocks of the image (the blocks at the ends of the axes
+may be smaller) that are compressed separately. The chunks are compressed, written, read and decompressed by a thread
+pool, and reading a region of interest (roi) reads only the chunks that overlap it. The file may also hold a pyramid of
+levels of the image downsampled by 2, 4, ..., chunked likewise, for reading a coarse image without the full one.
+Layout:
+- MAGIC (8 bytes) and the length of the header (little endian uint64)
+- the header, UTF-8 JSON: version, shape, dtype, chunk_shape, compression, affine (nibabel convention), ornt, and the
+shape, dtype and affine of every downsampled level
+- the index of every level: the offset and the length in bytes of every chunk in C order of the chunk grid, little
+endian uint64
+- the chunks: the C order bytes of every chunk (with the channels of the image, if any, as its last axes), compressed
+>>> ChunkIO.save_img('scan.mvc', np_image, metadata, chunk_shape=(64, 64, 64), compression='zstd', levels=3)
+>>> roi_image, roi_metadata = read_img('scan.mvc', roi=(slice(0, 64), slice(100, 164), slice(None)))
+>>> coarse_image, coarse_metadata = read_img('scan.mvc', level=2)
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Literal, NamedTuple
+
+import numpy as np
+
+from medio.instrument import instrumented, stage
+from medio.metadata.affine import Affine
+from medio.metadata.header import LazyHeader
+from medio.metadata.metadata import MetaData
+from medio.metadata.ornt_tables import FLIPS, TRANSPOSES, affine2axcodes, ornt_index, reorient_affine, reorient_array
+from medio.utils.channels import move_channels
+from medio.utils.resample import REDUCTIONS, block_reduce, downsample_affine
+
+try:
+    import lz4.frame  # type: ignore[import-not-found]
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+
+    from numpy.typing import NDArray
+
+MAGIC = b"MEDIOMVC"
+VERSION = 1
+_HEADER_PREFIX = struct.Struct("<8sQ")
+_INDEX_DTYPE = np.dtype("<u8")
+
+
+class Compression(NamedTuple):
+    compress: Callable[[bytes, int], bytes]
+    decompress: Callable[[bytes], bytes]
+    default_level: int
+
+
+def _available_compressions() -> dict[str, Compression]:
+    compressions = {
+        "none": Compression(lambda data, level: data, lambda data: data, 0),
+        "zlib": Compression(zlib.compress, zlib.decompress, 1),
+    }
+    if lz4 is not None:
+        frame = lz4.frame
+        compressions["lz4"] = Compression(
+            lambda data, level: frame.compress(data, compression_level=level), frame.decompress, 0
+        )
+    if zstandard is not None:
+        zstd = zstandard
+        compressions["zstd"] = Compression(
+            lambda data, level: zstd.ZstdCompressor(level=level).compress(data),
+            lambda data: zstd.ZstdDecompressor().decompress(data),
+            3,
+        )
+    return compressions
+
+
+# the compressions of the installed libraries: none, zlib, lz4 (with the lz4 package) and zstd (with zstandard)
+COMPRESSIONS = _available_compressions()
+
+
+class ChunkIO:
+    coord_sys: ClassVar[Literal["nib"]] = "nib"
+    DEFAULT_CHUNK_SHAPE = (64, 64, 64)
+
+    @staticmethod
+    @instrumented("read_img", "chunk")
+    def read_img(
+        input_path: str | os.PathLike[str],
+        desired_axcodes: str | tuple[str, ...] | None = None,
+        header: bool = False,
+        channels_axis: int | None = None,
+        roi: Sequence[slice] | None = None,
+        level: int = 0,
+        max_workers: int | None = None,
+        header_tags: Iterable[str] | None = None,
+    ) -> tuple[NDArray[np.generic], MetaData[LazyHeader]]:
+        """
+        Read an image, or a region of it, from a chunked volume file
+        :param input_path: the path of the .mvc file
+        :param desired_axcodes: the orientation of the returned image (nibabel convention), or None for the orientation
+        of the file
+        :param header: whether to include the JSON header of the file in the returned metadata
+        :param channels_axis: if not None and the image is channeled, move the channels to channels_axis
+        :param roi: the region of interest, a slice (with a step of 1 or None) per spatial axis of the returned
+        (reoriented) image. Only the chunks that overlap it are read, and the affine is of the region
+        :param level: the level of the pyramid of the file (see save_img), 0 for the full resolution image. Only the
+        chunks of the level are read
+        :param max_workers: the maximal number of threads, the number of CPUs by default
+        :param header_tags: with header=True, the keys of the JSON header to include, all the keys by default
+        :return: the image array and its metadata
+        """
+        with open(input_path, "rb") as f:
+            with stage("header"):
+                file_header, index = ChunkIO._read_header(f, level)
+            level_header = _level_header(file_header, level)
+            shape = tuple(level_header["shape"])
+            affine = Affine(np.array(level_header["affine"], dtype=np.float64))
+            dim = affine.dim
+            start_axcodes = affine2axcodes(affine)
+            region = ChunkIO._file_region(roi, shape[:dim], start_axcodes, desired_axcodes)
+            with stage("decode") as s:
+                img = ChunkIO._read_region(f, file_header, level_header, index, region, max_workers)
+                s.nbytes = img.nbytes
+        affine.origin = affine.index2coord([r.start for r in region])
+        if desired_axcodes is not None:
+            with stage("reorient"):
+                affine = Affine(reorient_affine(affine, img.shape[:dim], desired_axcodes)[0])
+                img = reorient_array(img, start_axcodes, desired_axcodes)
+        if img.ndim > dim:
+            img = move_channels(img, -1, channels_axis)
+        metadata: MetaData[LazyHeader] = MetaData(affine, orig_ornt=start_axcodes, coord_sys=ChunkIO.coord_sys)
+        if header:
+            metadata.header = LazyHeader(file_header, file_header.__getitem__, header_tags)
+        return img, metadata
+
+    @staticmethod
+    @instrumented("read_meta", "chunk")
+    def read_meta(
+        input_path: str | os.PathLike[str],
+        desired_axcodes: str | tuple[str, ...] | None = None,
+        header: bool = False,
+        level: int = 0,
+        header_tags: Iterable[str] | None = None,
+    ) -> MetaData[LazyHeader]:
+        """Read the metadata of a chunked volume file (see read_img), with the spatial shape of the image"""
+        with open(input_path, "rb") as f, stage("header"):
+            file_header, _ = ChunkIO._read_header(f, index=False)
+        level_header = _level_header(file_header, level)
+        affine = np.array(level_header["affine"], dtype=np.float64)
+        spatial_shape = tuple(level_header["shape"][: len(affine) - 1])
+        orig_ornt = affine2axcodes(affine)
+        if desired_axcodes is not None:
+            with stage("reorient"):
+                affine, spatial_shape = reorient_affine(affine, spatial_shape, desired_axcodes)
+        metadata: MetaData[LazyHeader] = MetaData(
+            Affine(affine), orig_ornt=orig_ornt, coord_sys=ChunkIO.coord_sys, spatial_shape=spatial_shape
+        )
+        if header:
+            metadata.header = LazyHeader(file_header, file_header.__getitem__, header_tags)
+        return metadata
+
+    @staticmethod
+    @instrumented("save_img", "chunk")
+    def save_img(
+        filename: str | os.PathLike[str],
+        img: NDArray[np.generic],
+        metadata: MetaData[Any],
+        use_original_ornt: bool = True,
+        channels_axis: int | None = None,
+        chunk_shape: Sequence[int] = DEFAULT_CHUNK_SHAPE,
+        compression: str = "zlib",
+        compression_level: int | None = None,
+        levels: int = 0,
+        levels_reduce: str = "mean",
+        max_workers: int | None = None,
+    ) -> None:
+        """
+        Save an image as a chunked volume file, optionally with a pyramid of downsampled levels
+        :param filename: the output path, with a .mvc suffix
+        :param img: the image array
+        :param metadata: the metadata of the image
+        :param use_original_ornt: whether to save the image in its original orientation (metadata.orig_ornt)
+        :param channels_axis: if not None, the channels axis of img, which is stored as the last axis of the chunks
+        :param chunk_shape: the spatial shape of the chunks
+        :param compression: one of COMPRESSIONS: 'none', 'zlib', and 'lz4' or 'zstd' if their packages are installed
+        :param compression_level: the compression level, the default level of the compression by default
+        :param levels: the number of downsampled levels of the pyramid: level k is level k - 1 downsampled by 2 along
+        every axis (see medio.utils.resample.downsample), with the spacing 2**k times that of the image. The levels are
+        built in the same pass over the image that writes it, from the chunk rows of the previous level
+        :param levels_reduce: the reduction of the downsampling blocks of the levels: 'mean', 'max' or 'mode'
+        :param max_workers: the maximal number of threads, the number of CPUs by default
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f'The compression "{compression}" is not available, it must be one of {list(COMPRESSIONS)}'
+            )
+        if levels_reduce not in REDUCTIONS:
+            raise ValueError(f'Invalid levels_reduce "{levels_reduce}", it must be one of {REDUCTIONS}')
+        with stage("prepare"):
+            nib_metadata = metadata.in_coord_sys(ChunkIO.coord_sys)
+            affine = Affine(np.asarray(nib_metadata.affine))
+            dim = affine.dim
+            img = move_channels(img, channels_axis, -1)
+            if use_original_ornt and nib_metadata.orig_ornt is not None:
+                start_axcodes = affine2axcodes(affine)
+                affine = Affine(reorient_affine(affine, img.shape[:dim], nib_metadata.orig_ornt)[0])
+                img = reorient_array(img, start_axcodes, nib_metadata.orig_ornt)
+            chunk_shape = tuple(int(c) for c in chunk_shape)
+            if len(chunk_shape) != dim or min(chunk_shape) < 1:
+                raise ValueError(f"Invalid chunk shape {chunk_shape} for an image of {dim} spatial dimensions")
+            level_headers = _pyramid(img, affine, levels, levels_reduce)
+            file_header = {
+                "version": VERSION,
+                **level_headers[0],
+                "chunk_shape": list(chunk_shape),
+                "compression": compression,
+                "ornt": affine2axcodes(affine),
+                "levels": level_headers[1:],
+                "levels_reduce": levels_reduce,
+            }
+            header_bytes = json.dumps(file_header).encode()
+        codec = COMPRESSIONS[compression]
+        compression_level = codec.default_level if compression_level is None else compression_level
+
+        with stage("write", img.nbytes), open(filename, "wb") as f:
+            f.write(_HEADER_PREFIX.pack(MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+                writer = _PyramidWriter(
+                    f,
+                    [level_header["shape"] for level_header in level_headers],
+                    chunk_shape,
+                    lambda data: codec.compress(data, compression_level),
+                    levels_reduce,
+                    executor,
+                )
+                # a single pass over the chunk rows of the image, which also builds the rows of the levels
+                for start in range(0, img.shape[0], chunk_shape[0]):
+                    writer.feed(0, img[start : start + chunk_shape[0]])
+                writer.close()
+
+    @staticmethod
+    def _read_header(f: Any, level: int = 0, index: bool = True) -> tuple[dict[str, Any], NDArray[np.uint64] | None]:
+        """The JSON header of an open chunked volume file, and the chunk index of a level"""
+        magic, header_length = _HEADER_PREFIX.unpack(f.read(_HEADER_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{getattr(f, 'name', f)} is not a medio chunked volume file")
+        file_header = json.loads(f.read(header_length))
+        if file_header["version"] > VERSION:
+            raise ValueError(f"Unsupported chunked volume version {file_header['version']}, upgrade medio to read it")
+        if file_header["compression"] not in COMPRESSIONS:
+            raise ValueError(f'The compression "{file_header["compression"]}" of the file is not available')
+        if not index:
+            return file_header, None
+        # the indices of the levels follow the header in order
+        chunk_shape = file_header["chunk_shape"]
+        n_chunks = [_n_chunks(_level_header(file_header, k)["shape"], chunk_shape) for k in range(level + 1)]
+        f.seek(sum(n_chunks[:-1]) * 2 * _INDEX_DTYPE.itemsize, os.SEEK_CUR)
+        chunk_index = np.frombuffer(f.read(n_chunks[-1] * 2 * _INDEX_DTYPE.itemsize), dtype=_INDEX_DTYPE)
+        return file_header, chunk_index.reshape(n_chunks[-1], 2)
+
+    @staticmethod
+    def _file_region(
+        roi: Sequence[slice] | None,
+        shape: tuple[int, ...],
+        start_axcodes: str,
+        desired_axcodes: str | tuple[str, ...] | None,
+    ) -> list[range]:
+        """The index ranges in the file of the roi of the reoriented image"""
+        if roi is None:
+            return [range(n) for n in shape]
+        if len(roi) != len(shape):
+            raise ValueError(f"The roi {roi} must have a slice per spatial axis, {len(shape)}")
+        if desired_axcodes is None:
+            transpose, flips = list(range(len(shape))), [False] * len(shape)
+        else:
+            i, j = ornt_index(start_axcodes), ornt_index(desired_axcodes)
+            transpose, flips = TRANSPOSES[i, j].tolist(), FLIPS[i, j].tolist()
+        region = [range(0)] * len(shape)
+        for k, key in enumerate(roi):
+            axis = transpose[k]
+            n = shape[axis]
+            start, stop, step = key.indices(n)
+            if step != 1 or stop <= start:
+                raise ValueError(f"Invalid roi slice {key}, it must be non-empty with a step of 1")
+            region[axis] = range(n - stop, n - start) if flips[axis] else range(start, stop)
+        return region
+
+    @staticmethod
+    def _read_region(
+        f: Any,
+        file_header: dict[str, Any],
+        level_header: dict[str, Any],
+        index: NDArray[np.uint64],
+        region: list[range],
+        max_workers: int | None,
+    ) -> NDArray[np.generic]:
+        """Read and decompress the chunks that overlap a region of a level, in parallel, into its array"""
+        shape = tuple(level_header["shape"])
+        dim = len(region)
+        chunk_shape = tuple(file_header["chunk_shape"])
+        dtype = np.dtype(level_header["dtype"])
+        decompress = COMPRESSIONS[file_header["compression"]].decompress
+        grid = tuple(-(-n // c) for n, c in zip(shape[:dim], chunk_shape))
+        out = np.empty((*map(len, region), *shape[dim:]), dtype=dtype)
+        read_at = _reader(f)
+        # the chunk indices that overlap the region along every axis
+        axes_chunks = [range(r.start // c, (r.stop - 1) // c + 1) for r, c in zip(region, chunk_shape)]
+
+        def read_chunk(chunk: tuple[int, ...]) -> None:
+            offset, nbytes = index[np.ravel_multi_index(chunk, grid)].tolist()
+            starts = [i * c for i, c in zip(chunk, chunk_shape)]
+            stops = [min(s + c, n) for s, c, n in zip(starts, chunk_shape, shape)]
+            data = decompress(read_at(offset, nbytes))
+            array = np.frombuffer(data, dtype=dtype).reshape((*(b - a for a, b in zip(starts, stops)), *shape[dim:]))
+            src, dst = [], []
+            for a, b, r in zip(starts, stops, region):
+                lo, hi = max(a, r.start), min(b, r.stop)
+                src.append(slice(lo - a, hi - a))
+                dst.append(slice(lo - r.start, hi - r.start))
+            out[tuple(dst)] = array[tuple(src)]
+
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+            for future in [executor.submit(read_chunk, chunk) for chunk in itertools.product(*axes_chunks)]:
+                future.result()
+        return out
+
+
+class _PyramidWriter:
+    def __init__(
+        self,
+        f: Any,
+        shapes: list[list[int]],
+        chunk_shape: tuple[int, ...],
+        compress: Callable[[bytes], bytes],
+        reduce: str,
+        executor: ThreadPoolExecutor,
+    ) -> None:
+        """
+        Writer of the chunks of the levels of a pyramid to a file after its header, from the rows (along the first
+        axis) of the image. The rows of a level are written in chunk rows, and reduced in pairs into the rows of the
+        next level as they are fed, so every level holds at most a chunk row
+        :param f: the file, positioned after the header
+        :param shapes: the shape of every level
+        :param chunk_shape: the spatial shape of the chunks
+        :param compress: the compression of the bytes of a chunk
+        :param reduce: the reduction of the downsampling blocks (see block_reduce)
+        :param executor: the thread pool of the compression
+        """
+        self.f = f
+        self.shapes = shapes
+        self.chunk_shape = chunk_shape
+        self.compress = compress
+        self.reduce = reduce
+        self.executor = executor
+        self.indices = [np.zeros((_n_chunks(shape, chunk_shape), 2), dtype=_INDEX_DTYPE) for shape in shapes]
+        self.index_offset = f.tell()
+        self.offset = self.index_offset + sum(index.nbytes for index in self.indices)
+        f.seek(self.offset)
+        self.written_rows = [0] * len(shapes)
+        self.to_write: list[list[NDArray[np.generic]]] = [[] for _ in shapes]
+        self.to_reduce: list[list[NDArray[np.generic]]] = [[] for _ in shapes]
+
+    def feed(self, level: int, rows: NDArray[np.generic]) -> None:
+        """Feed the next rows of a level"""
+        self.to_write[level].append(rows)
+        self._write(level, final=False)
+        if level + 1 == len(self.shapes):
+            return
+        self.to_reduce[level].append(rows)
+        pending = _concatenate(self.to_reduce[level])
+        n = len(pending) // 2 * 2
+        # an odd row waits for its pair, and the last odd row of the level is dropped like in block_reduce
+        self.to_reduce[level] = [pending[n:]] if n < len(pending) else []
+        if n:
+            factors = (2,) * len(self.chunk_shape)
+            self.feed(level + 1, block_reduce(pending[:n], factors, self.reduce))
+
+    def close(self) -> None:
+        """Write the last chunk rows of the levels and the indices"""
+        for level in range(len(self.shapes)):
+            self._write(level, final=True)
+        self.f.seek(self.index_offset)
+        for index in self.indices:
+            self.f.write(index.tobytes())
+
+    def _write(self, level: int, final: bool) -> None:
+        """Write the complete chunk rows of a level, and the last incomplete one if final"""
+        if not self.to_write[level]:
+            return
+        pending = _concatenate(self.to_write[level])
+        rows = self.chunk_shape[0]
+        n = len(pending) if final else len(pending) // rows * rows
+        shape = self.shapes[level]
+        # the chunks of a chunk row are consecutive in C order of the chunk grid
+        row_chunks = _n_chunks(shape[1 : len(self.chunk_shape)], self.chunk_shape[1:])
+        for start in range(0, n, rows):
+            chunk_row = pending[start : start + rows]
+            first = (self.written_rows[level] // rows) * row_chunks
+            keys = [
+                (slice(None), *key) for key in _chunk_slices(shape[1 : len(self.chunk_shape)], self.chunk_shape[1:])
+            ]
+            chunks = (np.ascontiguousarray(chunk_row[key]) for key in keys)
+            for i, data in enumerate(self.executor.map(lambda chunk: self.compress(chunk.tobytes()), chunks), first):
+                self.f.write(data)
+                self.indices[level][i] = self.offset, len(data)
+                self.offset += len(data)
+            self.written_rows[level] += len(chunk_row)
+        self.to_write[level] = [pending[n:]] if n < len(pending) else []
+
+
+def _pyramid(img: NDArray[np.generic], affine: Affine, levels: int, reduce: str) -> list[dict[str, Any]]:
+    """The shape, dtype and affine of every level of the pyramid of an image, without computing the levels"""
+    dim = affine.dim
+    level_headers = [{"shape": list(img.shape), "dtype": img.dtype.str, "affine": np.asarray(affine).tolist()}]
+    factors = (2,) * dim
+    dtype = img.dtype
+    for _ in range(levels):
+        shape = [n // 2 for n in level_headers[-1]["shape"][:dim]]
+        if not all(shape):
+            raise ValueError(f"Too many levels ({levels}) for an image of the spatial shape {img.shape[:dim]}")
+        affine = downsample_affine(affine, factors)
+        # the dtype of the reduction, of a single block
+        dtype = block_reduce(np.zeros(factors, dtype=dtype), factors, reduce).dtype
+        level_headers.append(
+            {"shape": [*shape, *img.shape[dim:]], "dtype": dtype.str, "affine": np.asarray(affine).tolist()}
+        )
+    return level_headers
+
+
+def _level_header(file_header: dict[str, Any], level: int) -> dict[str, Any]:
+    """The shape, dtype and affine of a level of the pyramid of a file, the full resolution image for level 0"""
+    levels = file_header.get("levels", [])
+    if not 0 <= level <= len(levels):
+        raise ValueError(f"Invalid level {level}, the file has the levels 0 to {len(levels)}")
+    return file_header if level == 0 else levels[level - 1]
+
+
+def _n_chunks(shape: Sequence[int], chunk_shape: Sequence[int]) -> int:
+    """The number of chunks of the spatial shape"""
+    return int(np.prod([-(-n // c) for n, c in zip(shape, chunk_shape)]))
+
+
+def _concatenate(arrays: list[NDArray[np.generic]]) -> NDArray[np.generic]:
+    """The arrays concatenated along the first axis, without copying a single array"""
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+def _chunk_slices(shape: Sequence[int], chunk_shape: Sequence[int]) -> Iterator[tuple[slice, ...]]:
+    """The slices of the chunks of an image in C order of the chunk grid"""
+    axes = [[slice(s, min(s + c, n)) for s in range(0, n, c)] for n, c in zip(shape, chunk_shape)]
+    return itertools.product(*axes)
+
+
+def _reader(f: Any) -> Callable[[int, int], bytes]:
+    """A thread-safe function reading nbytes at an offset of an open file, without moving its position on posix"""
+    if hasattr(os, "pread"):
+        fd = f.fileno()
+        return lambda offset, nbytes: os.pread(fd, nbytes, offset)
+    lock = threading.Lock()
+
+    def read_at(offset: int, nbytes: int) -> bytes:
+        with lock:
+            f.seek(offset)
+            return f.read(nbytes)
+
+    return read_at
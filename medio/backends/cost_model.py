@@ -0,0 +1,249 @@
+"""
+Cost-based backend selection for read_img and read_meta with backend='auto-fast'.
+The input is inspected cheaply (file type, size, compression and DICOM transfer syntax), the backends that support it
+and the requested options are ranked by their estimated cost, and read_img falls back to the next backend when a
+backend fails.
+The cost of a backend is modeled per operation and format as fixed_seconds + seconds_per_mb * size_mb. The default
+table was fitted from a run of the benchmark suite, and it can be recalibrated on the local machine:
+python -m benchmarks.run --operations read_img read_meta --calibrate cost_table.json
+then the table is loaded with load_cost_table, or automatically from the path in the MEDIO_COST_TABLE environment
+variable.
+"""
+
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import numpy as np
+import pydicom
+
+from medio.backends.pdcm_codecs import CODECS, PydicomCodec
+from medio.utils.files import is_chunked, is_dicom, is_path
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping, Sequence
+
+logger = logging.getLogger(__name__)
+
+AUTO_FAST = "auto-fast"
+COST_TABLE_ENV = "MEDIO_COST_TABLE"
+# operation -> format -> backend -> (fixed_seconds, seconds_per_mb)
+CostTable = dict[str, dict[str, dict[str, tuple[float, float]]]]
+
+# the backends that can read each format, in the order of preference when there is no cost estimate
+FORMAT_BACKENDS: dict[str, tuple[str, ...]] = {
+    "nii": ("nib", "itk"),
+    "nii.gz": ("nib", "itk"),
+    "mhd": ("itk",),
+    "dcm_series": ("itk", "pdcm"),
+    "dcm_multiframe": ("pdcm", "itk"),
+    "mvc": ("chunk",),
+    "other": ("itk",),
+}
+
+# fitted from a run of the benchmark suite (tiny, small and medium sizes) on a Linux x86-64 machine
+DEFAULT_COST_TABLE: CostTable = {
+    "read_img": {
+        "nii": {"nib": (0.000925, 0.000015), "itk": (0.000365, 0.001392)},
+        "nii.gz": {"nib": (0.000379, 0.065585), "itk": (0.000450, 0.063039)},
+        "mhd": {"itk": (0.000739, 0.001050)},
+        "dcm_series": {"itk": (0.016257, 0.007450), "pdcm": (0.025056, 0.012240)},
+        "dcm_multiframe": {"pdcm": (0.003388, 0.001760), "itk": (0.000545, 0.002995)},
+    },
+    "read_meta": {
+        "nii": {"nib": (0.000739, 0.000000), "itk": (0.000629, 0.000000)},
+        "nii.gz": {"nib": (0.001060, 0.000000), "itk": (0.001175, 0.000173)},
+        "mhd": {"itk": (0.000699, 0.000000)},
+        "dcm_series": {"itk": (0.003851, 0.001348), "pdcm": (0.014659, 0.007850)},
+        "dcm_multiframe": {"pdcm": (0.003601, 0.000643), "itk": (0.001229, 0.000732)},
+    },
+}
+
+_cost_table: CostTable | None = None
+
+
+class InputInfo(NamedTuple):
+    fmt: str  # a key of FORMAT_BACKENDS
+    size_mb: float
+    compressed: bool = False  # gzip or an encapsulated DICOM transfer syntax
+    transfer_syntax: str | None = None  # for DICOM
+    pdcm_decodable: bool = True  # whether pydicom has a frame-level codec for the transfer syntax
+
+
+def get_cost_table() -> CostTable:
+    """The current cost table: set with set_cost_table or load_cost_table, from MEDIO_COST_TABLE, or the default"""
+    global _cost_table
+    if _cost_table is None:
+        path = os.environ.get(COST_TABLE_ENV)
+        _cost_table = load_cost_table(path) if path else DEFAULT_COST_TABLE
+    return _cost_table
+
+
+def set_cost_table(table: CostTable | None) -> None:
+    """Set the cost table, None resets it to the default (or MEDIO_COST_TABLE)"""
+    global _cost_table
+    _cost_table = table
+
+
+def load_cost_table(path: str | os.PathLike[str]) -> CostTable:
+    """Load a cost table JSON file. Entries which are missing from the file are taken from the default table"""
+    loaded = json.loads(Path(path).read_text())
+    table: CostTable = {operation: dict(formats) for operation, formats in DEFAULT_COST_TABLE.items()}
+    for operation, formats in loaded.items():
+        for fmt, backends in formats.items():
+            table.setdefault(operation, {})[fmt] = {
+                **table.get(operation, {}).get(fmt, {}),
+                **{backend: (float(fixed), float(per_mb)) for backend, (fixed, per_mb) in backends.items()},
+            }
+    return table
+
+
+def save_cost_table(path: str | os.PathLike[str], table: CostTable | None = None) -> None:
+    Path(path).write_text(json.dumps(get_cost_table() if table is None else table, indent=2))
+
+
+def calibrate(records: Iterable[dict[str, Any]]) -> CostTable:
+    """
+    Fit a cost table from benchmark results records (see benchmarks.suite.run_suite) by least squares of the minimal
+    time over the file sizes, per operation, format and backend. Records of failed cases are ignored
+    """
+    samples: dict[tuple[str, str, str], list[tuple[float, float]]] = {}
+    for record in records:
+        if "error" in record or record["operation"] not in ("read_img", "read_meta"):
+            continue
+        key = (record["operation"], record["fmt"], record["backend"])
+        samples.setdefault(key, []).append((record["file_mb"], record["min"]))
+    table: CostTable = {}
+    for (operation, fmt, backend), points in samples.items():
+        sizes, seconds = np.array(points).T
+        if np.ptp(sizes) > 0:
+            per_mb, fixed = np.polyfit(sizes, seconds, 1)
+        else:
+            per_mb, fixed = 0.0, float(seconds.mean())
+        # a negative coefficient is noise of the measurement
+        per_mb = max(float(per_mb), 0.0)
+        fixed = max(float(fixed), 0.0)
+        table.setdefault(operation, {}).setdefault(fmt, {})[backend] = (round(fixed, 6), round(per_mb, 6))
+    return table
+
+
+def inspect_input(input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]]) -> InputInfo:
+    """Inspect the type, size and compression of an input file, directory or sequence of the files of a DICOM series
+    without reading the image data"""
+    if not is_path(input_path):
+        files = [Path(filename) for filename in input_path]
+        size_mb = sum(filename.stat().st_size for filename in files) / 2**20
+        dataset = _read_dicom_header(files[0]) if files else None
+        return _dicom_info("dcm_series", size_mb, dataset)
+    input_path = Path(input_path)
+    if input_path.is_dir():
+        files = [entry for entry in os.scandir(input_path) if entry.is_file()]
+        size_mb = sum(entry.stat().st_size for entry in files) / 2**20
+        dataset = _read_dicom_header(files[0].path) if files else None
+        return _dicom_info("dcm_series", size_mb, dataset)
+    if not input_path.is_file():
+        raise FileNotFoundError(f'No such file or directory: "{input_path}"')
+    size_mb = input_path.stat().st_size / 2**20
+    name = input_path.name
+    if name.endswith((".nii.gz", ".img.gz")):
+        return InputInfo("nii.gz", size_mb, compressed=True)
+    if name.endswith((".nii", ".img", ".hdr")):
+        return InputInfo("nii", size_mb)
+    if name.endswith(".mhd"):
+        return InputInfo("mhd", size_mb + _mhd_data_size_mb(input_path))
+    if name.endswith(".mha"):
+        return InputInfo("mhd", size_mb)
+    if is_chunked(input_path):
+        return InputInfo("mvc", size_mb, compressed=True)
+    dataset = _read_dicom_header(input_path) if is_dicom(input_path) or _has_dicom_preamble(input_path) else None
+    if dataset is None:
+        return InputInfo("other", size_mb, compressed=name.endswith(".gz"))
+    return _dicom_info("dcm_multiframe", size_mb, dataset)
+
+
+def _mhd_data_size_mb(filename: Path) -> float:
+    """The size of the data file of a MetaImage header (.mhd)"""
+    with open(filename, errors="replace") as f:
+        for line in f:
+            key, _, value = line.partition("=")
+            if key.strip() == "ElementDataFile":
+                data_file = filename.parent / value.strip()
+                return data_file.stat().st_size / 2**20 if data_file.is_file() else 0.0
+    return 0.0
+
+
+def _has_dicom_preamble(filename: Path) -> bool:
+    with open(filename, "rb") as f:
+        f.seek(128)
+        return f.read(4) == b"DICM"
+
+
+def _read_dicom_header(filename: str | os.PathLike[str]) -> pydicom.Dataset | None:
+    try:
+        return pydicom.dcmread(filename, stop_before_pixels=True)
+    except Exception:
+        return None
+
+
+def _dicom_info(fmt: str, size_mb: float, dataset: pydicom.Dataset | None) -> InputInfo:
+    if dataset is None:
+        return InputInfo(fmt, size_mb)
+    uid = getattr(getattr(dataset, "file_meta", None), "TransferSyntaxUID", None)
+    compressed = uid is not None and uid.is_compressed
+    # without a frame-level codec, PdcmIO would decode the pixel data with ITK anyway
+    pdcm_decodable = not compressed or any(isinstance(codec, PydicomCodec) for codec in CODECS.available(dataset))
+    return InputInfo(fmt, size_mb, compressed, None if uid is None else str(uid), pdcm_decodable)
+
+
+def estimate_cost(info: InputInfo, operation: str, backend: str, table: CostTable | None = None) -> float:
+    """The estimated seconds of the operation with the backend, infinity if there is no estimate"""
+    table = get_cost_table() if table is None else table
+    fmt = "mhd" if info.fmt == "other" else info.fmt
+    coefficients = table.get(operation, {}).get(fmt, {}).get(backend)
+    if coefficients is None:
+        return float("inf")
+    fixed, per_mb = coefficients
+    return fixed + per_mb * info.size_mb
+
+
+def supports_kwargs(reader: Callable[..., object], kwargs: Iterable[str]) -> bool:
+    parameters = inspect.signature(reader).parameters
+    return all(key in parameters for key in kwargs)
+
+
+def select_backends(
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
+    operation: str,
+    readers: Mapping[str, Callable[..., Any]],
+    header: bool = False,
+    kwargs: Iterable[str] = (),
+) -> list[str]:
+    """
+    Rank the backends which can read the input with the requested options by their estimated cost
+    :param input_path: the input file or directory, or the files of a DICOM series
+    :param operation: 'read_img' or 'read_meta'
+    :param readers: the backends' reader functions of the operation, for checking their supported kwargs
+    :param header: whether the header is requested
+    :param kwargs: the names of the backend-specific kwargs
+    :return: the backends, from the cheapest
+    """
+    info = inspect_input(input_path)
+    kwargs = list(kwargs)
+    candidates = []
+    for backend in FORMAT_BACKENDS[info.fmt]:
+        if not supports_kwargs(readers[backend], kwargs):
+            continue
+        if backend == "pdcm" and ((info.fmt == "dcm_series" and header) or not info.pdcm_decodable):
+            continue
+        candidates.append(backend)
+    if not candidates:
+        raise ValueError(f"No backend supports reading {info.fmt} with the options: header={header}, {kwargs}")
+    # sorted is stable, so backends without an estimate keep the order of preference
+    ranked = sorted(candidates, key=lambda backend: estimate_cost(info, operation, backend))
+    logger.debug(f"auto-fast {operation} of {input_path} ({info}): {ranked}")
+    return ranked
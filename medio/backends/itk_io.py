@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 from datetime import datetime
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, ClassVar, Literal
@@ -7,20 +8,36 @@ from typing import TYPE_CHECKING, Any, ClassVar, Literal
 import itk
 import itk.support.types as itkt
 import numpy as np
+import pydicom
+from pydicom.errors import InvalidDicomError
 
+from medio.backends.pdcm_slice_geometry import sort_slices
+from medio.instrument import instrumented, stage
 from medio.metadata.affine import Affine
 from medio.metadata.dcm_uid import generate_uid
+from medio.metadata.header import LazyHeader
 from medio.metadata.itk_orientation import itk_orientation_code
 from medio.metadata.metadata import MetaData, check_dcm_ornt
-from medio.utils.files import is_dicom, make_dir, parse_series_uids
+from medio.metadata.ornt_tables import reorient_affine
+from medio.utils.channels import move_channels
+from medio.utils.files import is_dicom, is_path, make_dir, parse_series_uids
 
 if TYPE_CHECKING:
     import os
+    from collections.abc import Iterable, Sequence
 
     from numpy.typing import NDArray
 
     from medio.metadata.metadata import CoordSys
 
+logger = logging.getLogger(__name__)
+
+# the tags of the slices of a dicom series which are read for sorting them with ItkIO.sort_series
+SORT_TAGS = ("SeriesInstanceUID", "ImagePositionPatient", "ImageOrientationPatient")
+# the relative deviation of the slice spacing above which the fast metadata of a series is reported as unsafe, as ITK's
+# series reader reports non-uniform sampling
+SPACING_RTOL = 1e-4
+
 
 class ItkIO:
     coord_sys: ClassVar[Literal["itk"]] = "itk"
@@ -31,8 +48,9 @@ class ItkIO:
     image_type = itk.Image[pixel_type, dimension]
 
     @staticmethod
+    @instrumented("read_img", "itk")
     def read_img(
-        input_path: str | os.PathLike[str],
+        input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         desired_axcodes: str | tuple[str, ...] | None = None,
         header: bool = False,
         components_axis: int | None = None,
@@ -40,16 +58,24 @@ class ItkIO:
         fallback_only: bool = True,
         series: str | int | None = None,
         private_tags: bool = False,
+        header_tags: Iterable[str] | None = None,
+        presorted: bool = False,
     ) -> tuple[NDArray[np.generic], MetaData[object]]:
         """
         The main reader function, reads images and performs reorientation and unpacking
-        :param input_path: path of image file or directory containing dicom series
+        :param input_path: path of image file or directory containing dicom series, or a sequence of the files of a
+        dicom series, which are read without discovering them with GDCM
         :param desired_axcodes: string or tuple - e.g. 'LPI', ('R', 'A', 'S')
         :param header: whether to include a header attribute with additional metadata in the returned metadata
         :param components_axis: if not None and the image is channeled (e.g. RGB) move the channels to channels_axis
         :param pixel_type: preferred itk pixel type for the image
         :param fallback_only: if True, finds the pixel_type automatically and uses pixel_type only if failed
         :param series: str or int of the series to read (in the case of multiple series in a directory)
+        :param private_tags: if True, also load private DICOM tags (requires header=True)
+        :param header_tags: with header=True, the keys of the metadata dictionary to include (e.g. DICOM tags
+        ['0010|0020', '0008|103e']), all the keys by default
+        :param presorted: relevant for a sequence of files - whether they are sorted along the slice normal, otherwise
+        they are sorted by reading only their position tags (see sort_series)
         :return: numpy image and metadata object which includes pixdim, affine, original orientation string and
         coordinates system
         """
@@ -60,14 +86,18 @@ class ItkIO:
                 imageio.LoadPrivateTagsOn()
         else:
             imageio = None
-        input_path = Path(input_path)
-        if input_path.is_dir():
+        if not is_path(input_path):
+            if imageio is not None:
+                # fallback_only=True would skip the imageio, so disable it
+                fallback_only = False
+            img = ItkIO.read_files(input_path, pixel_type, fallback_only, presorted, imageio)
+        elif Path(input_path).is_dir():
             # We assume that the directory contains dicom series, do imageio will work, if used.
             if imageio is not None:
                 # fallback_only=True would skip the imageio, so disable it
                 fallback_only = False
             img = ItkIO.read_dir(str(input_path), pixel_type, fallback_only, series, imageio)
-        elif input_path.is_file():
+        elif Path(input_path).is_file():
             # If the input file is not a dicom (e.g. NIfTI), fallback to not use imageio.
             use_dicom_imageio = imageio is not None and imageio.CanReadFile(str(input_path))
             if use_dicom_imageio:
@@ -75,7 +105,9 @@ class ItkIO:
                 fallback_only = False
             else:
                 imageio = None
-            img = ItkIO.read_img_file(str(input_path), pixel_type, fallback_only, imageio)
+            with stage("decode") as s:
+                img = ItkIO.read_img_file(str(input_path), pixel_type, fallback_only, imageio)
+                s.nbytes = lambda: ItkIO.img_nbytes(img)
         else:
             raise FileNotFoundError(f'No such file or directory: "{input_path}"')
 
@@ -85,100 +117,124 @@ class ItkIO:
             image_np = ItkIO.itk_img_to_array(img)
         else:
             orig_ornt = metadata.ornt
-            img, _ = ItkIO.reorient(img, desired_axcodes)
-            image_np, affine = ItkIO.unpack_img(img)
+            with stage("reorient"):
+                img, _ = ItkIO.reorient(img, desired_axcodes)
+                image_np, affine = ItkIO.unpack_img(img)
             metadata = MetaData(affine=affine, orig_ornt=orig_ornt, coord_sys=ItkIO.coord_sys)
         if header:
             metadict = imageio.GetMetaDataDictionary() if imageio else img.GetMetaDataDictionary()
-            metadata.header = {key: metadict[key] for key in metadict.GetKeys() if not key.startswith("ITK_")}
+            metadata.header = ItkIO.header_mapping(metadict, header_tags)
 
-        # TODO: consider unifying with PdcmIO.move_channels_axis
         n_components = img.GetNumberOfComponentsPerPixel()
-        if (n_components > 1) and (components_axis is not None):
-            # assert image_np.shape[ItkIO.DEFAULT_COMPONENTS_AXIS] == n_components
-            image_np = np.moveaxis(image_np, ItkIO.DEFAULT_COMPONENTS_AXIS, components_axis)
+        if n_components > 1:
+            image_np = move_channels(image_np, ItkIO.DEFAULT_COMPONENTS_AXIS, components_axis)
 
         return image_np, metadata
 
     @staticmethod
+    @instrumented("read_meta", "itk")
     def read_meta(
-        input_path: str | os.PathLike[str],
+        input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         desired_axcodes: str | tuple[str, ...] | None = None,
         header: bool = False,
         pixel_type: itkt.PixelTypes | None = pixel_type,
         fallback_only: bool = True,
         series: str | int | None = None,
         private_tags: bool = False,
+        header_tags: Iterable[str] | None = None,
+        fast: bool = False,
+        presorted: bool = False,
     ) -> MetaData[object]:
         """
         Read only the metadata (affine, orientation, spatial shape) without loading pixel data.
         Uses ITK's UpdateOutputInformation() which processes only the file header.
-        :param input_path: path of image file or directory containing dicom series
+        :param input_path: path of image file or directory containing dicom series, or a sequence of the files of a
+        dicom series (see read_img)
         :param desired_axcodes: optional orientation string, e.g. 'LPI'
         :param header: whether to include a header attribute with additional metadata
         :param pixel_type: preferred itk pixel type
         :param fallback_only: if True, auto-detect pixel type
         :param series: series to read when a directory has multiple series
         :param private_tags: if True, also load private DICOM tags (requires header=True)
+        :param header_tags: with header=True, the keys of the metadata dictionary to include, all the keys by default
+        :param fast: for a dicom series, sort the files by reading only their position tags (see sort_series) instead
+        of parsing them with GDCM, and read only the first and the last slices. The geometry is computed as ITK's
+        series reader computes it, and a warning is logged if it may not represent the slices (e.g. non-uniform
+        spacing). The series is selected by its Series Instance UID, and the header is of the first slice
+        :param presorted: relevant for a sequence of files - whether they are sorted (see read_img). With fast=True,
+        only the first and the last of presorted files are read
         :return: MetaData with spatial_shape set
         """
 
-        from medio.backends.nib_io import _reorient_affine
         from medio.metadata.convert_nib_itk import convert_affine, inv_axcodes
 
-        input_path = Path(input_path)
         image_type = itk.Image[pixel_type, ItkIO.dimension]
 
-        if input_path.is_dir():
-            filenames = ItkIO.extract_series(str(input_path), series)
-            reader = itk.ImageSeriesReader[image_type].New()
-            if isinstance(filenames, str):
-                reader.SetFileNames([filenames])
+        positions = None
+        if not is_path(input_path):
+            if presorted:
+                filenames: list[str] | str = [str(filename) for filename in input_path]
             else:
+                with stage("discover"):
+                    filenames, positions = ItkIO.sort_series(input_path)
+        elif Path(input_path).is_dir():
+            with stage("discover"):
+                if fast:
+                    filenames, positions = ItkIO.sort_series(str(input_path), series)
+                else:
+                    filenames = ItkIO.extract_series(str(input_path), series)
+        else:
+            filenames = str(input_path)
+            if not Path(filenames).is_file():
+                raise FileNotFoundError(f'No such file or directory: "{input_path}"')
+        if not isinstance(filenames, str):
+            filenames = list(filenames) if len(filenames) > 1 else filenames[0]  # a single image in the series
+
+        if fast and isinstance(filenames, list):
+            imageio = itk.GDCMImageIO.New()
+            if private_tags:
+                imageio.LoadPrivateTagsOn()
+            with stage("header"):
+                affine, spatial_shape = ItkIO.series_meta(filenames, positions, image_type, imageio)
+        else:
+            if isinstance(filenames, list):
+                reader = itk.ImageSeriesReader[image_type].New()
                 reader.SetFileNames(filenames)
-            if header:
-                imageio = itk.GDCMImageIO.New()
-                if private_tags:
-                    imageio.LoadPrivateTagsOn()
-                reader.SetImageIO(imageio)
+                dicom = True
             else:
-                imageio = None
-            reader.UpdateOutputInformation()
-            img = reader.GetOutput()
-        elif input_path.is_file():
-            reader = itk.ImageFileReader[image_type].New()
-            reader.SetFileName(str(input_path))
-            if header and is_dicom(str(input_path), check_exist=False):
+                reader = itk.ImageFileReader[image_type].New()
+                reader.SetFileName(filenames)
+                dicom = is_dicom(filenames, check_exist=False)
+            if header and dicom:
                 imageio = itk.GDCMImageIO.New()
                 if private_tags:
                     imageio.LoadPrivateTagsOn()
                 reader.SetImageIO(imageio)
             else:
                 imageio = None
-            reader.UpdateOutputInformation()
+            with stage("header"):
+                reader.UpdateOutputInformation()
             img = reader.GetOutput()
-        else:
-            raise FileNotFoundError(f'No such file or directory: "{input_path}"')
-
-        affine = ItkIO.get_img_aff(img)
-
-        # Spatial shape in ITK is z, y, x from GetSize(); after the .T transpose in itk_img_to_array it becomes x, y, z
-        itk_size = img.GetLargestPossibleRegion().GetSize()
-        spatial_shape: tuple[int, ...] = tuple(itk_size[i] for i in range(ItkIO.dimension))
+            affine = ItkIO.get_img_aff(img)
+            # Spatial shape in ITK is z, y, x from GetSize(); after the .T transpose in itk_img_to_array it becomes
+            # x, y, z
+            itk_size = img.GetLargestPossibleRegion().GetSize()
+            spatial_shape: tuple[int, ...] = tuple(itk_size[i] for i in range(ItkIO.dimension))
 
         metadata: MetaData[object] = MetaData(affine=affine, coord_sys=ItkIO.coord_sys, spatial_shape=spatial_shape)
 
         if desired_axcodes is not None and desired_axcodes != metadata.ornt:
             orig_ornt = metadata.ornt
             # Reorient using pure affine math (no pixel data)
-            # Convert to nib convention for _reorient_affine
+            # Convert to nib convention for reorient_affine
             nib_affine = convert_affine(affine)
             nib_desired = (
                 inv_axcodes(desired_axcodes)
                 if isinstance(desired_axcodes, str)
                 else tuple(inv_axcodes(c) for c in desired_axcodes)
             )
-            new_nib_affine, new_shape = _reorient_affine(nib_affine, spatial_shape, nib_desired)
+            with stage("reorient"):
+                new_nib_affine, new_shape = reorient_affine(nib_affine, spatial_shape, nib_desired)
             new_affine = convert_affine(new_nib_affine)
             metadata = MetaData(
                 affine=new_affine, orig_ornt=orig_ornt, coord_sys=ItkIO.coord_sys, spatial_shape=new_shape
@@ -187,13 +243,14 @@ class ItkIO:
         if header:
             try:
                 metadict = imageio.GetMetaDataDictionary() if imageio else img.GetMetaDataDictionary()
-                metadata.header = {key: metadict[key] for key in metadict.GetKeys() if not key.startswith("ITK_")}
+                metadata.header = ItkIO.header_mapping(metadict, header_tags)
             except Exception:
                 metadata.header = {}
 
         return metadata
 
     @staticmethod
+    @instrumented("save_img", "itk")
     def save_img(
         filename: str | os.PathLike[str],
         image_np: NDArray[np.generic],
@@ -215,17 +272,19 @@ class ItkIO:
         :param compression: use compression or not
         """
         is_dcm = is_dicom(filename, check_exist=False)
-        if is_dcm:
-            image_np = ItkIO.prepare_dcm_array(image_np, is_vector=components_axis is not None)
-        image = ItkIO.prepare_image(
-            image_np,
-            metadata,
-            use_original_ornt,
-            components_axis=components_axis,
-            is_dcm=is_dcm,
-            allow_dcm_reorient=allow_dcm_reorient,
-        )
-        ItkIO.save_img_file(image, str(filename), compression=compression)
+        with stage("prepare"):
+            if is_dcm:
+                image_np = ItkIO.prepare_dcm_array(image_np, is_vector=components_axis is not None)
+            image = ItkIO.prepare_image(
+                image_np,
+                metadata,
+                use_original_ornt,
+                components_axis=components_axis,
+                is_dcm=is_dcm,
+                allow_dcm_reorient=allow_dcm_reorient,
+            )
+        with stage("write", image_np.nbytes):
+            ItkIO.save_img_file(image, str(filename), compression=compression)
 
     @staticmethod
     def prepare_image(
@@ -237,8 +296,7 @@ class ItkIO:
         allow_dcm_reorient: bool = False,
     ) -> object:
         """Prepare image for saving"""
-        orig_coord_sys = metadata.coord_sys
-        metadata.convert(ItkIO.coord_sys)
+        metadata = metadata.in_coord_sys(ItkIO.coord_sys)
         desired_ornt = metadata.orig_ornt if use_original_ornt else None
         if is_dcm:
             # checking right-handed orientation before saving a dicom file/series
@@ -246,7 +304,6 @@ class ItkIO:
         image = ItkIO.pack2img(image_np, metadata.affine, components_axis=components_axis)
         if (desired_ornt is not None) and (desired_ornt != metadata.ornt):
             image, _ = ItkIO.reorient(image, desired_ornt)
-        metadata.convert(orig_coord_sys)
         return image
 
     @staticmethod
@@ -323,15 +380,30 @@ class ItkIO:
         img_array = itk.array_from_image(img_itk).T
         return img_array
 
+    @staticmethod
+    def header_mapping(metadict: object, header_tags: Iterable[str] | None = None) -> LazyHeader:
+        """
+        The entries of an itk metadata dictionary (except ITK's own entries), whose values are converted when they are
+        accessed. The dictionary is copied (without converting its values), so the header does not keep the image or
+        the imageio alive
+        """
+        metadict = itk.MetaDataDictionary(metadict)
+        keys = [key for key in metadict.GetKeys() if not key.startswith("ITK_")]
+        return LazyHeader(keys, metadict.__getitem__, header_tags)
+
+    @staticmethod
+    def img_nbytes(img: object) -> int:
+        """The size of the pixel buffer of an itk image in bytes"""
+        return itk.array_view_from_image(img).nbytes
+
     @staticmethod
     def array_to_itk_img(img_array: NDArray[np.generic], components_axis: int | None = None) -> object:
         """Set components_axis to not None for vector images, e.g. RGB"""
-        is_vector = False
-        if components_axis is not None:
-            img_array = np.moveaxis(img_array, components_axis, ItkIO.DEFAULT_COMPONENTS_AXIS)
-            is_vector = True
-        # copy is crucial for the ordering
-        img_itk = itk.image_from_array(img_array.T.copy(), is_vector=is_vector)
+        is_vector = components_axis is not None
+        img_array = move_channels(img_array, components_axis, ItkIO.DEFAULT_COMPONENTS_AXIS)
+        # C order is crucial for the ordering, and image_from_array copies the array anyway, so an array in the order of
+        # itk (e.g. read by itk) is not copied before it
+        img_itk = itk.image_from_array(np.ascontiguousarray(img_array.T), is_vector=is_vector)
         return img_itk
 
     @staticmethod
@@ -375,8 +447,8 @@ class ItkIO:
             metadata = MetaData(affine=affine, orig_ornt=orig_ornt, coord_sys=ItkIO.coord_sys)
 
         n_components = img.GetNumberOfComponentsPerPixel()
-        if (n_components > 1) and (components_axis is not None):
-            image_np = np.moveaxis(image_np, ItkIO.DEFAULT_COMPONENTS_AXIS, components_axis)
+        if n_components > 1:
+            image_np = move_channels(image_np, ItkIO.DEFAULT_COMPONENTS_AXIS, components_axis)
 
         if coord_sys is not None:
             metadata.convert(coord_sys)
@@ -396,9 +468,8 @@ class ItkIO:
         :param components_axis: axis in np_image holding image components (e.g. RGB channels)
         :return: itk.Image with spatial metadata applied
         """
-        metadata_itk = metadata.clone()
-        metadata_itk.convert(ItkIO.coord_sys)
-        return ItkIO.pack2img(np_image, metadata_itk.affine, components_axis=components_axis)
+        itk_affine = metadata.in_coord_sys(ItkIO.coord_sys).affine
+        return ItkIO.pack2img(np_image, itk_affine, components_axis=components_axis)
 
     @staticmethod
     def get_img_aff(img: object) -> Affine:
@@ -467,8 +538,31 @@ class ItkIO:
         Shorter option for a single series (provided the slices order is known):
         >>> itk.imread([filename0, filename1, ...])
         """
-        filenames = ItkIO.extract_series(dirname, series)
-        return itk.imread(filenames, pixel_type, fallback_only, imageio)
+        with stage("discover"):
+            filenames = ItkIO.extract_series(dirname, series)
+        with stage("decode") as s:
+            img = itk.imread(filenames, pixel_type, fallback_only, imageio)
+            s.nbytes = lambda: ItkIO.img_nbytes(img)
+        return img
+
+    @staticmethod
+    def read_files(
+        filenames: Sequence[str | os.PathLike[str]],
+        pixel_type: itk.itkCType | None = None,
+        fallback_only: bool = False,
+        presorted: bool = False,
+        imageio: object | None = None,
+    ) -> object:
+        """Read the files of a dicom series, sorted by sort_series unless they are presorted"""
+        if presorted:
+            filenames = [str(filename) for filename in filenames]
+        else:
+            with stage("discover"):
+                filenames, _ = ItkIO.sort_series(filenames)
+        with stage("decode") as s:
+            img = itk.imread(filenames if len(filenames) > 1 else filenames[0], pixel_type, fallback_only, imageio)
+            s.nbytes = lambda: ItkIO.img_nbytes(img)
+        return img
 
     @staticmethod
     def extract_series(dirname: str, series: str | int | None = None) -> list[str] | str:
@@ -486,6 +580,111 @@ class ItkIO:
         return filenames
 
     @staticmethod
+    def sort_series(
+        dirname: str | Sequence[str | os.PathLike[str]], series: str | int | None = None
+    ) -> tuple[list[str], NDArray[np.float64]]:
+        """
+        The sorted filenames of a series in the directory dirname, as extract_series, by reading only the tags of the
+        files which are needed for sorting them (SORT_TAGS) instead of parsing the whole files with GDCM. The series is
+        selected by its Series Instance UID. Non-DICOM files are skipped. dirname can also be a sequence of the files of
+        a series, which are only sorted
+        :return: the sorted filenames, and the positions of the slices along the slice normal
+        """
+        if not is_path(dirname):
+            datasets: list[pydicom.Dataset] = [
+                pydicom.dcmread(filename, stop_before_pixels=True, specific_tags=list(SORT_TAGS))
+                for filename in dirname
+            ]
+        else:
+            slices: dict[str, list[pydicom.Dataset]] = {}
+            for path in sorted(Path(dirname).iterdir()):
+                if not path.is_file():
+                    continue
+                try:
+                    ds = pydicom.dcmread(path, stop_before_pixels=True, specific_tags=list(SORT_TAGS))
+                except InvalidDicomError:
+                    continue
+                slices.setdefault(str(ds.get("SeriesInstanceUID", "")), []).append(ds)
+            series_uid = parse_series_uids(dirname, slices.keys(), series)
+            datasets = slices[series_uid]
+        try:
+            datasets, positions = sort_slices(datasets)
+        except AttributeError as e:
+            raise ValueError(
+                f'The slices of the series of "{datasets[0].filename}" cannot be sorted without: {e}'
+            ) from e
+        orientations = np.array([ds.ImageOrientationPatient for ds in datasets], dtype=np.float64).reshape(-1, 6)
+        if not np.allclose(orientations, orientations[0], atol=1e-5):
+            logger.warning(f'The slices of the series of "{datasets[0].filename}" have different orientations')
+        return [str(ds.filename) for ds in datasets], positions
+
+    @staticmethod
+    def series_meta(
+        filenames: list[str],
+        positions: NDArray[np.float64] | None,
+        image_type: object,
+        imageio: object,
+    ) -> tuple[Affine, tuple[int, ...]]:
+        """
+        The affine and the spatial shape of a dicom series from the headers of its first and last slices only, as
+        ITK's series reader computes them: the origin and the direction of the first slice, and the slice spacing is
+        the distance between the first and the last slices over the number of slices minus one. A warning is logged if
+        they may not represent the slices: the slices are not in ascending order along the slice normal, their spacing
+        is non-uniform (if the positions of all the slices are given), or it differs from the first slice's
+        SpacingBetweenSlices (otherwise)
+        :param filenames: the sorted files of the series
+        :param positions: the positions of the slices along the slice normal, if known
+        :param image_type: the itk image type to read the slices with
+        :param imageio: the GDCMImageIO to read the first slice with, for its metadata dictionary
+        """
+        first = itk.ImageFileReader[image_type].New()
+        first.SetFileName(filenames[0])
+        first.SetImageIO(imageio)
+        first.UpdateOutputInformation()
+        last = itk.ImageFileReader[image_type].New()
+        last.SetFileName(filenames[-1])
+        last.SetImageIO(itk.GDCMImageIO.New())
+        last.UpdateOutputInformation()
+        first_affine = ItkIO.get_img_aff(first.GetOutput())
+        last_affine = ItkIO.get_img_aff(last.GetOutput())
+
+        n_slices = len(filenames)
+        offset = last_affine.origin - first_affine.origin
+        spacing = float(np.linalg.norm(offset)) / (n_slices - 1)
+        problems = []
+        if not np.allclose(first_affine.direction, last_affine.direction, atol=1e-5):
+            problems.append("the first and the last slices have different orientations")
+        if offset @ first_affine.direction[:, 2] <= 0:
+            problems.append("the slices are not in ascending order along the slice normal")
+        if positions is not None:
+            diffs = np.diff(positions)
+            deviation = float(np.abs(diffs - spacing).max()) / spacing if spacing > 0 else np.inf
+            if deviation > SPACING_RTOL:
+                problems.append(f"the slice spacing is non-uniform, max relative deviation: {deviation:.3g}")
+        else:
+            metadict = imageio.GetMetaDataDictionary()
+            nominal = abs(float(metadict["0018|0088"])) if metadict.HasKey("0018|0088") else None
+            if nominal and abs(spacing - nominal) > SPACING_RTOL * nominal:
+                problems.append(
+                    f"the slice spacing {spacing:.6g} differs from the SpacingBetweenSlices {nominal:.6g} of the first "
+                    "slice, there may be missing slices"
+                )
+        if problems:
+            logger.warning(
+                f'The fast metadata of the series of "{filenames[0]}" may not represent its slices: '
+                + "; ".join(problems)
+            )
+
+        affine = Affine(
+            direction=first_affine.direction,
+            spacing=[*first_affine.spacing[:2], spacing],
+            origin=first_affine.origin,
+        )
+        size = first.GetOutput().GetLargestPossibleRegion().GetSize()
+        return affine, (int(size[0]), int(size[1]), n_slices)
+
+    @staticmethod
+    @instrumented("save_dir", "itk")
     def save_dcm_dir(
         dirname: str | os.PathLike[str],
         image_np: NDArray[np.generic],
@@ -510,14 +709,15 @@ class ItkIO:
         :param allow_dcm_reorient: whether to allow automatic reorientation to a right-handed orientation or not
         :param kwargs: optional kwargs passed to ItkIO.dcm_metadata: pattern, metadata_dict
         """
-        image = ItkIO.prepare_image(
-            image_np,
-            metadata,
-            use_original_ornt,
-            components_axis=components_axis,
-            is_dcm=True,
-            allow_dcm_reorient=allow_dcm_reorient,
-        )
+        with stage("prepare"):
+            image = ItkIO.prepare_image(
+                image_np,
+                metadata,
+                use_original_ornt,
+                components_axis=components_axis,
+                is_dcm=True,
+                allow_dcm_reorient=allow_dcm_reorient,
+            )
         image_type = type(image)
         _, (pixel_type, _) = itk.template(image)
         image2d_type = itk.Image[pixel_type, 2]
@@ -532,7 +732,8 @@ class ItkIO:
         dicom_io.KeepOriginalUIDOn()
         writer.SetImageIO(dicom_io)
         writer.SetInput(image)
-        writer.Update()
+        with stage("write", image_np.nbytes):
+            writer.Update()
 
     @staticmethod
     def dcm_series_metadata(
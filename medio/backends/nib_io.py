@@ -6,51 +6,55 @@ import nibabel as nib
 import nibabel.spatialimages
 import numpy as np
 
+from medio.instrument import instrumented, stage
 from medio.metadata.affine import Affine
+from medio.metadata.header import LazyHeader
 from medio.metadata.metadata import MetaData
+from medio.metadata.ornt_tables import (
+    TRANSPOSES,
+    affine2axcodes,
+    ornt_index,
+    ornt_transform,
+    reorient_affine,
+    reorient_array,
+)
+from medio.utils.channels import (
+    RGB_DTYPE,
+    RGBA_DTYPE,
+    channels_to_structured,
+    is_structured,
+    move_channels,
+    structured_to_channels,
+)
+from medio.utils.resample import block_factors, block_reduce, downsample_affine
 
 if TYPE_CHECKING:
     import os
+    from collections.abc import Iterable, Sequence
 
     from numpy.typing import NDArray
 
 
-def _reorient_affine(
-    nib_affine: NDArray[np.floating],
-    orig_shape: tuple[int, ...],
-    desired_nib_axcodes: str | tuple[str, ...],
-) -> tuple[NDArray[np.floating], tuple[int, ...]]:
-    """Reorient a nibabel affine and shape to `desired_nib_axcodes` without loading pixel data.
-
-    :param nib_affine: 4x4 nibabel-convention affine matrix
-    :param orig_shape: spatial shape in the current orientation (x, y, z)
-    :param desired_nib_axcodes: destination orientation, e.g. 'LPI' or ('L', 'P', 'I')
-    :return: (new_nib_affine, new_shape)
-    """
-    if isinstance(desired_nib_axcodes, str):
-        desired_nib_axcodes = tuple(desired_nib_axcodes)
-    start_ornt = nib.orientations.io_orientation(nib_affine)
-    end_ornt = nib.orientations.axcodes2ornt(desired_nib_axcodes)
-    ornt_transform = nib.orientations.ornt_transform(start_ornt, end_ornt)
-    new_affine = nib.orientations.inv_ornt_aff(ornt_transform, orig_shape) @ nib_affine
-    new_shape = tuple(orig_shape[int(t[0])] for t in ornt_transform)
-    return new_affine, new_shape
-
-
 NibImage = nibabel.spatialimages.SpatialImage
+# the approximate size of a slab of the full resolution image that is decoded at once when downsampling
+SLAB_BYTES = 16 * 2**20
 
 
 class NibIO:
     coord_sys: ClassVar[Literal["nib"]] = "nib"
-    RGB_DTYPE = np.dtype([("R", np.uint8), ("G", np.uint8), ("B", np.uint8)])
-    RGBA_DTYPE = np.dtype([("R", np.uint8), ("G", np.uint8), ("B", np.uint8), ("A", np.uint8)])
+    RGB_DTYPE = RGB_DTYPE
+    RGBA_DTYPE = RGBA_DTYPE
 
     @staticmethod
+    @instrumented("read_img", "nib")
     def read_img(
         input_path: str | os.PathLike[str],
         desired_axcodes: tuple[str, ...] | str | None = None,
         header: bool = False,
         channels_axis: int | None = None,
+        downsample: int | Sequence[int] | None = None,
+        downsample_reduce: str = "mean",
+        header_tags: Iterable[str] | None = None,
     ) -> tuple[NDArray[np.floating], MetaData[object]]:
         """
         Reads a NIFTI file and returns the image array and metadata
@@ -58,43 +62,70 @@ class NibIO:
         :param desired_axcodes: str, tuple of str or None - the desired orientation of the image to be returned
         :param header: whether to include a header attribute with additional metadata in the returned metadata
         :param channels_axis: if not None and the array dtype is structured, stacks the channels along channels_axis
+        :param downsample: if not None, the factors of the axes of the returned image to downsample it by, which is
+        done slab by slab while decoding (see NibIO.read_downsampled)
+        :param downsample_reduce: the reduction of the downsampling blocks, 'mean', 'max' or 'mode'
+        :param header_tags: with header=True, the NIfTI header fields to include (e.g. ['descrip', 'pixdim']), all
+        the fields by default
         :return: image array and corresponding metadata
         """
-        img_struct = nib.load(input_path)
-        orig_ornt_str = "".join(nib.aff2axcodes(img_struct.affine))
+        with stage("header"):
+            # the file is kept open for reading the slabs of a downsampled image (a gzip stream is not decompressed
+            # again from its start for every slab)
+            img_struct = nib.load(input_path, keep_file_open=True if downsample is not None else None)
+            orig_ornt_str = affine2axcodes(img_struct.affine)
+        if downsample is not None:
+            with stage("decode") as s:
+                img, affine = NibIO.read_downsampled(
+                    img_struct, desired_axcodes, downsample, downsample_reduce, channels_axis
+                )
+                s.nbytes = img.nbytes
+            metadata = MetaData(affine=affine, orig_ornt=orig_ornt_str, coord_sys=NibIO.coord_sys)
+            if header:
+                metadata.header = NibIO.header_mapping(img_struct, header_tags)
+            return img, metadata
         if desired_axcodes is not None:
-            img_struct = NibIO.reorient(img_struct, desired_axcodes)
-        img = np.asanyarray(img_struct.dataobj)
+            # nibabel decodes the pixel data for the reorientation
+            with stage("reorient"):
+                img_struct = NibIO.reorient(img_struct, desired_axcodes)
+        with stage("decode") as s:
+            img = np.asanyarray(img_struct.dataobj)
+            s.nbytes = img.nbytes
         if channels_axis is not None:
             img = NibIO.unravel_array(img, channels_axis)
         affine = Affine(img_struct.affine)
         metadata = MetaData(affine=affine, orig_ornt=orig_ornt_str, coord_sys=NibIO.coord_sys)
         if header:
-            metadata.header = {key: img_struct.header[key] for key in img_struct.header}
+            metadata.header = NibIO.header_mapping(img_struct, header_tags)
         return img, metadata
 
     @staticmethod
+    @instrumented("read_meta", "nib")
     def read_meta(
         input_path: str | os.PathLike[str],
         desired_axcodes: tuple[str, ...] | str | None = None,
         header: bool = False,
+        header_tags: Iterable[str] | None = None,
     ) -> MetaData[object]:
         """
         Read only the metadata (affine, orientation, spatial shape) of a NIfTI file without loading pixel data.
         :param input_path: path to the NIfTI file
         :param desired_axcodes: optional desired orientation, e.g. 'RAS'
         :param header: if True, populate metadata.header with NIfTI header fields
+        :param header_tags: with header=True, the NIfTI header fields to include, all the fields by default
         :return: MetaData with spatial_shape set
         """
         # nibabel already does lazy loading of the pixel data, so we can read the affine and header
         # without loading the whole image.
-        img_struct = nib.load(input_path)
-        orig_ornt_str = "".join(nib.aff2axcodes(img_struct.affine))
+        with stage("header"):
+            img_struct = nib.load(input_path)
+            orig_ornt_str = affine2axcodes(img_struct.affine)
         nib_affine: NDArray[np.floating] = img_struct.affine
         orig_shape: tuple[int, ...] = tuple(img_struct.shape[:3])
 
         if desired_axcodes is not None:
-            new_affine, new_shape = _reorient_affine(nib_affine, orig_shape, desired_axcodes)
+            with stage("reorient"):
+                new_affine, new_shape = reorient_affine(nib_affine, orig_shape, desired_axcodes)
         else:
             new_affine, new_shape = nib_affine, orig_shape
 
@@ -106,10 +137,11 @@ class NibIO:
         )
         metadata.spatial_shape = new_shape
         if header:
-            metadata.header = {key: img_struct.header[key] for key in img_struct.header}
+            metadata.header = NibIO.header_mapping(img_struct, header_tags)
         return metadata
 
     @staticmethod
+    @instrumented("save_img", "nib")
     def save_img(
         filename: str | os.PathLike[str],
         img: NDArray[np.floating],
@@ -125,59 +157,100 @@ class NibIO:
         :param use_original_ornt: whether to use the original orientation of the image of not
         :param channels_axis: if not None gives the channels axis of img (for channeled images RGB/RGBA)
         """
-        if channels_axis is not None:
-            img = NibIO.pack_channeled_img(img, channels_axis)
-        orig_coord_sys = metadata.coord_sys
-        metadata.convert(NibIO.coord_sys)
-        img_struct = nib.Nifti1Image(img, metadata.affine)
-        desired_axcodes = metadata.orig_ornt if use_original_ornt else None
-        metadata.convert(orig_coord_sys)
-        img_struct = NibIO.reorient(img_struct, desired_axcodes)
-        nib.save(img_struct, filename)
+        with stage("prepare"):
+            if channels_axis is not None:
+                img = NibIO.pack_channeled_img(img, channels_axis)
+            nib_metadata = metadata.in_coord_sys(NibIO.coord_sys)
+            img_struct = nib.Nifti1Image(img, nib_metadata.affine)
+            desired_axcodes = nib_metadata.orig_ornt if use_original_ornt else None
+            img_struct = NibIO.reorient(img_struct, desired_axcodes)
+        with stage("write", img.nbytes):
+            nib.save(img_struct, filename)
+
+    @staticmethod
+    def read_downsampled(
+        img_struct: NibImage,
+        desired_axcodes: tuple[str, ...] | str | None,
+        factors: int | Sequence[int],
+        reduce: str = "mean",
+        channels_axis: int | None = None,
+    ) -> tuple[NDArray[np.generic], Affine]:
+        """
+        Decode a 3d image downsampled by block_reduce (see medio.utils.resample), slab by slab of its last axis in the
+        file, so that the full resolution image is not held in memory. The image is downsampled in the orientation of
+        the file and reoriented afterwards
+        :param img_struct: the nibabel image
+        :param desired_axcodes: the orientation of the returned image, or None for the orientation of the file
+        :param factors: the downsampling factors of the axes of the returned image
+        :param reduce: 'mean', 'max' or 'mode'
+        :param channels_axis: the channels axis of a structured (e.g. RGB) image
+        :return: the downsampled image and its affine
+        """
+        shape = img_struct.shape
+        if len(shape) < 3:
+            raise ValueError(f"Downsampling while reading is supported for 3d images, got an image of shape {shape}")
+        factors = block_factors(factors, 3)
+        start_axcodes = affine2axcodes(img_struct.affine)
+        if desired_axcodes is not None:
+            # the file axis of every axis of the reoriented image
+            transpose = TRANSPOSES[ornt_index(start_axcodes), ornt_index(desired_axcodes)].tolist()
+            factors = tuple(factors[transpose.index(axis)] for axis in range(3))
+        dtype = img_struct.get_data_dtype()
+        slice_bytes = int(np.prod(shape[:2]) * np.prod(shape[3:])) * dtype.itemsize
+        slab = factors[2] * max(SLAB_BYTES // (factors[2] * slice_bytes), 1)
+        structured = is_structured(dtype)
+        if structured and channels_axis is None:
+            raise ValueError("Downsampling a structured (e.g. RGB) image requires a channels_axis")
+        slabs = []
+        for start in range(0, shape[2] // factors[2] * factors[2], slab):
+            img_slab = np.asanyarray(img_struct.dataobj[:, :, start : start + slab])
+            if structured:
+                img_slab = NibIO.unravel_array(img_slab, -1)
+            slabs.append(block_reduce(img_slab, factors, reduce))
+        img = np.concatenate(slabs, axis=2)
+        affine = downsample_affine(Affine(img_struct.affine), factors)
+        if desired_axcodes is not None:
+            affine = Affine(reorient_affine(affine, img.shape, desired_axcodes)[0])
+            img = reorient_array(img, start_axcodes, desired_axcodes)
+        if structured:
+            img = move_channels(img, -1, channels_axis)
+        return img, affine
+
+    @staticmethod
+    def header_mapping(img_struct: NibImage, header_tags: Iterable[str] | None = None) -> LazyHeader:
+        """The NIfTI header fields of a nibabel image, read when they are accessed"""
+        nib_header = img_struct.header
+        return LazyHeader(nib_header.keys(), nib_header.__getitem__, header_tags)
 
     @staticmethod
     def reorient(img_struct: NibImage, desired_axcodes: tuple[str, ...] | str | None) -> NibImage:
         """Reorient a nibabel image to a desired orientation described by desired_axcodes strings tuple, for example
         ('L', 'P', 'I'). If desired_axcodes is None it returns the given img_struct"""
         if desired_axcodes is not None:
-            if isinstance(desired_axcodes, str):
-                desired_axcodes = tuple(desired_axcodes)
-            start_ornt = nib.orientations.io_orientation(img_struct.affine)
-            end_ornt = nib.orientations.axcodes2ornt(desired_axcodes)
-            ornt_tform = nib.orientations.ornt_transform(start_ornt, end_ornt)
-            img_struct = img_struct.as_reoriented(ornt_tform)
+            img_struct = img_struct.as_reoriented(ornt_transform(affine2axcodes(img_struct.affine), desired_axcodes))
         return img_struct
 
     @staticmethod
     def unravel_array(array: NDArray[np.generic], channels_axis: int = -1) -> NDArray[np.generic]:
         """Simplify array dtype if it is a structured data type. For example, if the array if of RGB dtype:
         np.dtype([('R', 'uint8'), ('G', 'uint8'), ('B', 'uint8')])
-        Convert it into an array with dtype 'uint8' and 3 channels for RGB in an additional last dimension"""
-        dtype = array.dtype
-        if not (hasattr(dtype, "__len__") and len(dtype) > 1):
-            return array
-        return np.stack([array[field] for field in dtype.fields], axis=channels_axis)
+        Convert it into an array with dtype 'uint8' and 3 channels for RGB in an additional channels_axis. The result
+        is a view of the array (see medio.utils.channels.structured_to_channels)"""
+        return structured_to_channels(array, channels_axis)
 
     @staticmethod
     def pack_channeled_img(img: NDArray[np.uint8], channels_axis: int) -> NDArray[np.void]:
+        """
+        The RGB or RGBA structured array of a uint8 image with channels in channels_axis, a view if the channels of a
+        voxel are adjacent in memory (see medio.utils.channels.channels_to_structured)
+        """
         dtype = img.dtype
         if not np.issubdtype(dtype, np.uint8):
             raise ValueError(f'RGB or RGBA images must have dtype "np.uint8", got: "{dtype}"')
         n_channels = img.shape[channels_axis]
-        img = np.moveaxis(img, channels_axis, -1)
-        r_channel = img[..., 0]
         if n_channels == 3:
-            img_rgb = np.empty_like(r_channel, dtype=NibIO.RGB_DTYPE)
-            img_rgb["R"] = r_channel
-            img_rgb["G"] = img[..., 1]
-            img_rgb["B"] = img[..., 2]
-            return img_rgb
+            return channels_to_structured(img, channels_axis, NibIO.RGB_DTYPE)
         elif n_channels == 4:
-            img_rgba = np.empty_like(r_channel, dtype=NibIO.RGBA_DTYPE)
-            img_rgba["R"] = r_channel
-            img_rgba["G"] = img[..., 1]
-            img_rgba["B"] = img[..., 2]
-            img_rgba["A"] = img[..., 3]
-            return img_rgba
+            return channels_to_structured(img, channels_axis, NibIO.RGBA_DTYPE)
         else:
             raise ValueError(f"Invalid number of channels: {n_channels}, should be 3 (RGB) or 4 (RGBA)")
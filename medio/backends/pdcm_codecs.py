@@ -0,0 +1,271 @@
+"""
+Pluggable codec layer for decoding the pixel data of compressed (encapsulated) DICOM transfer syntaxes, such as
+JPEG-2000, JPEG-LS and RLE.
+The codecs are tried in the registry order and the first one that supports the dataset decodes it (if a codec fails,
+the next one is tried). The frames of a dataset are decoded in parallel chunks by a thread pool - the underlying
+decoders are C libraries that release the GIL. Every codec accumulates timing counters, so slow codecs are visible:
+>>> PdcmIO.codecs.stats()
+{'pylibjpeg': CodecStats(calls=3, frames=450, seconds=1.21)}
+The default codecs are pydicom's decoding plugins: pylibjpeg (with pylibjpeg-openjpeg, pylibjpeg-libjpeg and
+pylibjpeg-rle), pyjpegls, gdcm, pillow and pydicom's native RLE decoder, followed by ITK (GDCM) as a last resort, which
+decodes a whole file at once.
+A custom codec is a subclass of Codec, registered with:
+>>> PdcmIO.codecs.register(MyCodec(), index=0)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+try:
+    from pydicom.pixels import get_decoder, iter_pixels
+except ImportError:  # pydicom < 3 has no decoding plugins interface
+    get_decoder = iter_pixels = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    import pydicom
+    from numpy.typing import NDArray
+    from pydicom.uid import UID
+
+logger = logging.getLogger(__name__)
+
+# pydicom decoding plugins, in the order of preference
+PYDICOM_PLUGINS = ("pylibjpeg", "pyjpegls", "gdcm", "pillow", "pydicom")
+
+
+class CodecStats(NamedTuple):
+    calls: int = 0
+    frames: int = 0
+    seconds: float = 0.0
+
+    @property
+    def seconds_per_frame(self) -> float:
+        return self.seconds / self.frames if self.frames else 0.0
+
+
+def transfer_syntax(dataset: pydicom.Dataset) -> UID | None:
+    file_meta = getattr(dataset, "file_meta", None)
+    return getattr(file_meta, "TransferSyntaxUID", None)
+
+
+def is_compressed(dataset: pydicom.Dataset) -> bool:
+    """Whether the pixel data of dataset is encapsulated (compressed), and should be decoded by a codec"""
+    uid = transfer_syntax(dataset)
+    return uid is not None and uid.is_compressed
+
+
+def header_pixel_dtype(dataset: pydicom.Dataset) -> np.dtype:
+    """The dtype of dataset.pixel_array according to the header tags (without decoding the pixel data)"""
+    if "FloatPixelData" in dataset:
+        return np.dtype(np.float32)
+    if "DoubleFloatPixelData" in dataset:
+        return np.dtype(np.float64)
+    bits_allocated = int(dataset.BitsAllocated)
+    if bits_allocated == 1:
+        # bit-packed data is unpacked by pydicom to uint8
+        return np.dtype(np.uint8)
+    sign = "u" if int(dataset.get("PixelRepresentation", 0)) == 0 else "i"
+    return np.dtype(f"{sign}{bits_allocated // 8}")
+
+
+class Codec:
+    """
+    Base class of a codec. decode yields the selected frames of a dataset in order, each as an array of shape
+    (rows, columns[, samples]) with the stored values, as in dataset.pixel_array
+    """
+
+    name: str = ""
+    # whether the codec decodes single frames, which allows parallel decoding of the frames of a dataset
+    frame_level: bool = True
+
+    def is_available(self, dataset: pydicom.Dataset) -> bool:
+        raise NotImplementedError
+
+    def decode(self, dataset: pydicom.Dataset, indices: list[int]) -> Iterator[NDArray[np.generic]]:
+        raise NotImplementedError
+
+
+class PydicomCodec(Codec):
+    """A pydicom decoding plugin, with frame-level access"""
+
+    def __init__(self, plugin: str) -> None:
+        self.name = plugin
+
+    def is_available(self, dataset: pydicom.Dataset) -> bool:
+        uid = transfer_syntax(dataset)
+        if get_decoder is None or uid is None:
+            return False
+        try:
+            return self.name in get_decoder(uid).available_plugins
+        except NotImplementedError:  # no decoder for the transfer syntax
+            return False
+
+    def decode(self, dataset: pydicom.Dataset, indices: list[int]) -> Iterator[NDArray[np.generic]]:
+        assert iter_pixels is not None  # the codec is available only with pydicom's decoding plugins
+        return iter_pixels(dataset, indices=indices, decoding_plugin=self.name)
+
+
+class ItkCodec(Codec):
+    """ITK's GDCM, which decodes the whole file of a dataset (read from a file) at once"""
+
+    name = "itk"
+    frame_level = False
+
+    def is_available(self, dataset: pydicom.Dataset) -> bool:
+        filename = getattr(dataset, "filename", None)
+        return isinstance(filename, (str, os.PathLike)) and os.path.isfile(filename)
+
+    def decode(self, dataset: pydicom.Dataset, indices: list[int]) -> Iterator[NDArray[np.generic]]:
+        import itk
+
+        image_io = itk.GDCMImageIO.New()
+        pixels = itk.array_from_image(itk.imread(os.fspath(dataset.filename), imageio=image_io))
+        # GDCM applies the rescale slope and intercept, undo it to return the stored values
+        slope, intercept = image_io.GetRescaleSlope(), image_io.GetRescaleIntercept()
+        if slope != 1 or intercept != 0:
+            pixels = np.rint((pixels - intercept) / slope)
+        samples_per_pixel = int(dataset.get("SamplesPerPixel", 1))
+        frame_shape: tuple[int, ...] = (int(dataset.Rows), int(dataset.Columns))
+        if samples_per_pixel > 1:
+            frame_shape = (*frame_shape, samples_per_pixel)
+        pixels = pixels.reshape(-1, *frame_shape).astype(header_pixel_dtype(dataset), copy=False)
+        return iter(pixels[indices])
+
+
+def default_codecs() -> list[Codec]:
+    return [*(PydicomCodec(plugin) for plugin in PYDICOM_PLUGINS), ItkCodec()]
+
+
+class CodecRegistry:
+    """
+    Ordered registry of codecs with per-codec timing counters
+    :param codecs: the codecs, in the order of preference
+    :param max_workers: the maximal number of threads for decoding the frames of a dataset or the slices of a series,
+    None for the number of CPUs
+    """
+
+    def __init__(self, codecs: Iterable[Codec] = (), max_workers: int | None = None) -> None:
+        self._codecs: list[Codec] = list(codecs)
+        self.max_workers = max_workers
+        self._stats: dict[str, CodecStats] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> list[str]:
+        return [codec.name for codec in self._codecs]
+
+    def register(self, codec: Codec, index: int | None = None) -> None:
+        """Register codec at the index position in the order of preference (last by default), replacing a registered
+        codec with the same name"""
+        self.unregister(codec.name)
+        if index is None:
+            self._codecs.append(codec)
+        else:
+            self._codecs.insert(index, codec)
+
+    def unregister(self, name: str) -> None:
+        self._codecs = [codec for codec in self._codecs if codec.name != name]
+
+    def available(self, dataset: pydicom.Dataset) -> list[Codec]:
+        """The codecs which support dataset, in the order of preference"""
+        return [codec for codec in self._codecs if codec.is_available(dataset)]
+
+    def stats(self) -> dict[str, CodecStats]:
+        """The timing counters of the codecs: number of calls, number of decoded frames and the total decoding time
+        (summed over the threads)"""
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def n_workers(self, n_tasks: int) -> int:
+        max_workers = self.max_workers or os.cpu_count() or 1
+        return max(1, min(max_workers, n_tasks))
+
+    def decode_frames(
+        self,
+        dataset: pydicom.Dataset,
+        indices: NDArray[np.integer] | list[int] | None = None,
+        max_workers: int | None = None,
+    ) -> NDArray[np.generic]:
+        """
+        Decode the selected frames of a compressed dataset into an array of shape (frames, rows, columns[, samples])
+        :param dataset: the dataset, with compressed pixel data
+        :param indices: the indices of the frames to decode, all the frames by default
+        :param max_workers: the maximal number of threads, by default the registry's max_workers
+        :return: the stored values array
+        """
+        if indices is None:
+            indices = list(range(int(dataset.get("NumberOfFrames", 1))))
+        indices = [int(i) for i in indices]
+        codecs = self.available(dataset)
+        if not codecs:
+            raise RuntimeError(
+                f"No codec is available for decoding the transfer syntax: {transfer_syntax(dataset)}, registered "
+                f"codecs: {self.names}. Try installing one of the packages: pylibjpeg, pylibjpeg-openjpeg, "
+                "pylibjpeg-libjpeg, pyjpegls or python-gdcm"
+            )
+        for codec in codecs[:-1]:
+            try:
+                return self._decode(codec, dataset, indices, max_workers)
+            except Exception as e:
+                logger.warning(f'Codec "{codec.name}" failed to decode the pixel data, trying the next codec: {e}')
+        return self._decode(codecs[-1], dataset, indices, max_workers)
+
+    def _decode(
+        self,
+        codec: Codec,
+        dataset: pydicom.Dataset,
+        indices: list[int],
+        max_workers: int | None,
+    ) -> NDArray[np.generic]:
+        start = time.perf_counter()
+        frames = codec.decode(dataset, indices[:1])
+        first = next(frames)
+        pixels = np.empty((len(indices), *first.shape), dtype=first.dtype)
+        pixels[0] = first
+        if not codec.frame_level:
+            # the rest of the frames were decoded together with the first one
+            for k, frame in enumerate(frames, 1):
+                pixels[k] = frame
+            self._record(codec.name, len(indices), time.perf_counter() - start)
+            return pixels
+        self._record(codec.name, 1, time.perf_counter() - start)
+
+        def decode_chunk(chunk: NDArray[np.intp]) -> None:
+            chunk_start = time.perf_counter()
+            for k, frame in zip(chunk, codec.decode(dataset, [indices[k] for k in chunk])):
+                pixels[k] = frame
+            self._record(codec.name, len(chunk), time.perf_counter() - chunk_start)
+
+        rest = np.arange(1, len(indices))
+        if rest.size > 0:
+            n_workers = self.n_workers(rest.size) if max_workers is None else max(1, min(max_workers, rest.size))
+            chunks = np.array_split(rest, n_workers)
+            if n_workers == 1:
+                decode_chunk(chunks[0])
+            else:
+                with ThreadPoolExecutor(n_workers) as executor:
+                    # list() propagates the exceptions of the workers
+                    list(executor.map(decode_chunk, chunks))
+        return pixels
+
+    def _record(self, name: str, frames: int, seconds: float) -> None:
+        with self._lock:
+            calls, total_frames, total_seconds = self._stats.get(name, CodecStats())
+            self._stats[name] = CodecStats(calls + 1, total_frames + frames, total_seconds + seconds)
+
+
+# the default registry, used by PdcmIO
+CODECS = CodecRegistry(default_codecs())
@@ -0,0 +1,125 @@
+"""
+Memory efficient alternative to dicom_numpy's combine_slices for a DICOM series.
+The output array is allocated once from the header geometry and every slice is decoded directly into its place, so the
+decoded slices are never held together with the final volume. Compressed slices are decoded in parallel by the codecs
+of medio.backends.pdcm_codecs.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+from dicom_numpy.combine_slices import _requires_rescaling
+
+from medio.backends.pdcm_codecs import CODECS, header_pixel_dtype, is_compressed
+from medio.backends.pdcm_rescale import apply_rescale, dataset_rescaled_dtype, rescale_params
+from medio.backends.pdcm_slice_geometry import (
+    analyze_slices,
+    apply_spacing_policy,
+    geometry_affine,
+    resample_slices,
+    uniform_positions,
+)
+
+if TYPE_CHECKING:
+    import pydicom
+    from numpy.typing import NDArray
+
+    from medio.backends.pdcm_slice_geometry import SpacingPolicy
+
+
+def assemble_slices(
+    datasets: list[pydicom.Dataset],
+    rescale: bool | None = None,
+    out: NDArray[np.generic] | None = None,
+    release_pixels: bool = False,
+    spacing_policy: SpacingPolicy = "reject",
+    spacing_rtol: float = 0.1,
+    presorted: bool = False,
+) -> tuple[NDArray[np.generic], NDArray[np.float32]]:
+    """
+    Stitch a list of pydicom datasets of a single series into a three-dimensional numpy array, and compute the 4x4
+    affine matrix of the volume. The slices are sorted along the slice normal, and the geometry is validated with
+    medio.backends.pdcm_slice_geometry.
+    :param datasets: the slices' datasets (with pixel data) of a single series
+    :param rescale: None applies the rescale slope and intercept only if they are present, True applies them and False
+    keeps the stored values. The output dtype is the smallest one which holds the rescaled values of all the slices
+    :param out: optional preallocated array to decode the slices into. Its shape and dtype must match
+    `slices_array_spec(datasets, rescale)`, for example an array returned by a previous read of the same geometry.
+    It is not supported when the series is resampled
+    :param release_pixels: if True, delete the pixel data of each dataset right after it was copied to the volume
+    :param spacing_policy: how to handle missing slices or non-uniform spacing: 'reject', 'resample' or 'split'
+    :param spacing_rtol: relative tolerance of the slices' spacing from the nominal spacing
+    :param presorted: whether the datasets are already sorted along the slice normal (see analyze_slices)
+    :return: the image array (column-major, with the slices in the last axis) and the affine matrix
+    """
+    geometry = apply_spacing_policy(analyze_slices(datasets, spacing_rtol, presorted=presorted), spacing_policy)
+    sorted_datasets = geometry.datasets
+    transform = geometry_affine(geometry)
+    resample = not geometry.is_uniform
+
+    shape, dtype = slices_array_spec(sorted_datasets, rescale)
+    if resample and out is not None:
+        raise ValueError("The out array is not supported when the series is resampled")
+    if out is None:
+        out = np.empty(shape, dtype=dtype, order="F")
+    elif out.shape != shape or out.dtype != dtype:
+        raise ValueError(f"The out array must have shape {shape} and dtype {dtype}, got: {out.shape} and {out.dtype}")
+
+    if rescale is None:
+        rescale = any(_requires_rescaling(ds) for ds in sorted_datasets)
+
+    def fill_slice(k: int) -> None:
+        dataset = sorted_datasets[k]
+        slc = out[..., k]
+        slc[...] = decode_slice(dataset).T
+        if rescale:
+            # in-place, since slc is a writeable view of the output dtype
+            apply_rescale(slc, *rescale_params(dataset), dtype=out.dtype)
+        if release_pixels:
+            release_pixel_data(dataset)
+
+    n_workers = CODECS.n_workers(len(sorted_datasets)) if is_compressed(sorted_datasets[0]) else 1
+    if n_workers == 1:
+        for k in range(len(sorted_datasets)):
+            fill_slice(k)
+    else:
+        # every slice is written to a separate part of out
+        with ThreadPoolExecutor(n_workers) as executor:
+            list(executor.map(fill_slice, range(len(sorted_datasets))))
+
+    if resample:
+        out = resample_slices(out, geometry.positions, uniform_positions(geometry))
+    return out, transform
+
+
+def slices_array_spec(datasets: list[pydicom.Dataset], rescale: bool | None = None) -> tuple[tuple[int, ...], np.dtype]:
+    """Return the shape and dtype of the volume combined from datasets, computed from the header tags only"""
+    ds0 = datasets[0]
+    columns, rows = int(ds0.Columns), int(ds0.Rows)
+    samples_per_pixel = int(ds0.get("SamplesPerPixel", 1))
+    slice_shape: tuple[int, ...] = (columns, rows) if samples_per_pixel == 1 else (samples_per_pixel, columns, rows)
+    if rescale is None:
+        rescale = any(_requires_rescaling(ds) for ds in datasets)
+    dtype = header_pixel_dtype(ds0)
+    if rescale:
+        dtype = np.result_type(*{dataset_rescaled_dtype(ds, dtype) for ds in datasets})
+    return (*slice_shape, len(datasets)), dtype
+
+
+def decode_slice(dataset: pydicom.Dataset) -> NDArray[np.generic]:
+    """Decode the pixel data of a single-frame dataset, compressed data by the registered codecs"""
+    if is_compressed(dataset):
+        return CODECS.decode_frames(dataset, max_workers=1)[0]
+    return dataset.pixel_array
+
+
+def release_pixel_data(dataset: pydicom.Dataset) -> None:
+    """Free the raw and decoded (cached) pixel data of a dataset"""
+    if "PixelData" in dataset:
+        del dataset.PixelData
+    # pydicom caches the decoded array, deleting the element resets it, but older versions may not
+    if getattr(dataset, "_pixel_array", None) is not None:
+        dataset._pixel_array = None
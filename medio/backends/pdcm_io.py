@@ -3,24 +3,43 @@ from __future__ import annotations
 from pathlib import Path
 from typing import TYPE_CHECKING, ClassVar, Literal
 
-import nibabel.spatialimages
 import numpy as np
 import pydicom
-from dicom_numpy import combine_slices
 from dicom_numpy.combine_slices import _extract_cosines, _validate_image_orientation
-
-from medio.backends.nib_io import NibIO, _reorient_affine
-from medio.backends.pdcm_unpack_ds import affine_from_dataset, unpack_dataset
+from pydicom.tag import Tag
+
+from medio.backends.nib_io import NibIO
+from medio.backends.pdcm_codecs import CODECS, CodecRegistry
+from medio.backends.pdcm_combine_slices import assemble_slices
+from medio.backends.pdcm_slice_geometry import (
+    analyze_slices,
+    apply_spacing_policy,
+    geometry_affine,
+    sort_slices,
+    uniform_positions,
+)
+from medio.backends.pdcm_unpack_ds import affine_from_dataset, frame_indices, unpack_dataset
+from medio.instrument import instrumented, stage
 from medio.metadata.convert_nib_itk import inv_axcodes
+from medio.metadata.header import LazyHeader
 from medio.metadata.metadata import MetaData
+from medio.metadata.ornt_tables import reorient_affine, reorient_array
 from medio.metadata.pdcm_ds import MultiFrameFileDataset, convert_ds
-from medio.utils.files import parse_series_uids
+from medio.utils.channels import move_channels
+from medio.utils.files import is_path, parse_series_uids
 
 if TYPE_CHECKING:
     import os
+    from collections.abc import Iterable, Sequence
 
     from numpy.typing import NDArray
 
+    from medio.backends.pdcm_slice_geometry import SpacingPolicy
+    from medio.backends.pdcm_unpack_ds import Frames
+
+# the pixel data elements, which are not included in the header
+_PIXEL_DATA_TAGS = frozenset(Tag(keyword) for keyword in ("PixelData", "FloatPixelData", "DoubleFloatPixelData"))
+
 
 class PdcmIO:
     coord_sys: ClassVar[Literal["itk"]] = "itk"
@@ -28,20 +47,30 @@ class PdcmIO:
     # value of the tuple, according to the planar configuration (which is either 0 or 1)
     DEFAULT_CHANNELS_AXES_PYDICOM: tuple[int, int] = (0, -1)
     DEFAULT_CHANNELS_AXES_DICOM_NUMPY: tuple[int, int] = (0, 2)
+    # codecs for compressed transfer syntaxes, with their timing counters: PdcmIO.codecs.stats()
+    codecs: ClassVar[CodecRegistry] = CODECS
 
     @staticmethod
+    @instrumented("read_img", "pdcm")
     def read_img(
-        input_path: str | os.PathLike[str],
+        input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         desired_ornt: str | None = None,
         header: bool = False,
         channels_axis: int | None = None,
         globber: str = "*",
         allow_default_affine: bool = False,
         series: str | int | None = None,
+        out: NDArray[np.generic] | None = None,
+        rescale: bool | None = None,
+        frames: Frames | None = None,
+        spacing_policy: SpacingPolicy = "reject",
+        header_tags: Iterable[str | int] | None = None,
+        presorted: bool = False,
     ) -> tuple[NDArray[np.generic], MetaData[object]]:
         """
         Read a dicom file or folder (series) and return the numpy array and the corresponding metadata
-        :param input_path: path-like object (str or pathlib.Path) of the file or directory to read
+        :param input_path: path-like object (str or pathlib.Path) of the file or directory to read, or a sequence of the
+        files of a series, which are read without discovering and grouping the files of a directory
         :param desired_ornt: str, tuple of str or None - the desired orientation of the image to be returned
         :param header: whether to include a header attribute with additional metadata in the returned metadata (single
         file only)
@@ -50,18 +79,37 @@ class PdcmIO:
         :param globber: relevant for a directory - globber for selecting the series files (all files by default)
         :param allow_default_affine: whether to allow default affine when some tags are missing (multiframe file only)
         :param series: str or int of the series to read (in the case of multiple series in a directory)
+        :param out: relevant for a directory - optional preallocated array to decode the series into, for reusing a
+        buffer across reads of the same geometry. It is filled in the original orientation and the returned array may be
+        a reoriented view of it
+        :param rescale: whether to apply the Rescale Slope and Intercept (modality LUT). None applies them if they are
+        present. False keeps the raw stored values, then the rescale can be deferred with
+        medio.backends.pdcm_rescale.apply_rescale and rescale_params
+        :param frames: relevant for a multiframe file - indices or a slice of the frames to read. Only these frames are
+        decoded, and the affine corresponds to them
+        :param spacing_policy: relevant for a directory - how to handle missing slices or non-uniform slice spacing:
+        'reject' (raise an error), 'resample' (onto a uniform grid) or 'split' (read the largest uniform sub-volume)
+        :param header_tags: with header=True, the DICOM tags to include - keywords (e.g. 'PatientID'), int tags or
+        header keys (e.g. '(0010,0020)') - all the tags by default
+        :param presorted: relevant for a sequence of files - whether they are sorted along the slice normal, then they
+        are not sorted (unless their order is not ascending)
         :return: numpy array and metadata
         """
-        input_path = Path(input_path)
+        if is_path(input_path):
+            input_path = Path(input_path)
         # if there are channels, they must be in the last axis for the reorientation
         temp_channels_axis = -1
-        if input_path.is_dir():
+        if not is_path(input_path) or input_path.is_dir():
             img, metadata, channeled = PdcmIO.read_dcm_dir(
                 input_path,
                 header,
                 globber,
                 channels_axis=temp_channels_axis,
                 series=series,
+                out=out,
+                rescale=rescale,
+                spacing_policy=spacing_policy,
+                presorted=presorted,
             )
         else:
             img, metadata, channeled = PdcmIO.read_dcm_file(
@@ -69,50 +117,68 @@ class PdcmIO:
                 header,
                 allow_default_affine=allow_default_affine,
                 channels_axis=temp_channels_axis,
+                rescale=rescale,
+                frames=frames,
+                header_tags=header_tags,
             )
-        img, metadata = PdcmIO.reorient(img, metadata, desired_ornt)
+        with stage("reorient"):
+            img, metadata = PdcmIO.reorient(img, metadata, desired_ornt)
         # move the channels after the reorientation
-        if channeled and channels_axis != temp_channels_axis:
-            img = np.moveaxis(img, temp_channels_axis, channels_axis)
+        if channeled:
+            img = move_channels(img, temp_channels_axis, channels_axis)
         return img, metadata
 
     @staticmethod
+    @instrumented("read_meta", "pdcm")
     def read_meta(
-        input_path: str | os.PathLike[str],
+        input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         desired_ornt: str | None = None,
         header: bool = False,
         globber: str = "*",
         allow_default_affine: bool = False,
         series: str | int | None = None,
+        frames: Frames | None = None,
+        spacing_policy: SpacingPolicy = "reject",
+        header_tags: Iterable[str | int] | None = None,
+        presorted: bool = False,
     ) -> MetaData[object]:
         """
         Read only the metadata (affine, orientation, spatial shape) of a DICOM file or directory without loading pixel
         data.
-        :param input_path: path-like object (str or pathlib.Path) of the file or directory to read
+        :param input_path: path-like object (str or pathlib.Path) of the file or directory to read, or a sequence of the
+        files of a series (see read_img)
         :param desired_ornt: optional orientation string to reorient the metadata, e.g. 'LPI'
         :param header: whether to include a header attribute (single file only; series raises NotImplementedError)
         :param globber: relevant for a directory - globber for selecting the series files
         :param allow_default_affine: use a default identity affine when geometric tags are missing (multiframe only)
         :param series: series to read when a directory has multiple series
+        :param frames: indices or a slice of frames of a multiframe file (see read_img)
+        :param spacing_policy: missing slices or non-uniform spacing handling of a directory (see read_img)
+        :param header_tags: with header=True, the DICOM tags to include (see read_img)
+        :param presorted: relevant for a sequence of files - whether they are sorted (see read_img)
         :return: MetaData with spatial_shape set
         """
         from medio.metadata.convert_nib_itk import convert_affine
 
-        input_path = Path(input_path)
-        if input_path.is_dir():
-            slices = PdcmIO.extract_slices_no_pixels(input_path, globber, series)
-            affine = PdcmIO._compute_series_affine(slices)
-            ds0 = slices[0]
-            spatial_shape: tuple[int, ...] = (int(ds0.Columns), int(ds0.Rows), len(slices))
+        if is_path(input_path):
+            input_path = Path(input_path)
+        if not is_path(input_path) or input_path.is_dir():
+            slices = PdcmIO.extract_slices_no_pixels(input_path, globber, series, presorted)
+            geometry = apply_spacing_policy(analyze_slices(slices, presorted=presorted), spacing_policy)
+            affine = geometry_affine(geometry)
+            n_slices = len(geometry.datasets) if geometry.is_uniform else len(uniform_positions(geometry))
+            ds0 = geometry.datasets[0]
+            spatial_shape: tuple[int, ...] = (int(ds0.Columns), int(ds0.Rows), n_slices)
             metadata: MetaData[object] = PdcmIO.aff2meta(affine)
             if header:
                 raise NotImplementedError("header=True is currently not supported for a series")
         else:
-            ds = pydicom.dcmread(input_path, stop_before_pixels=True)
-            ds = convert_ds(ds)
+            with stage("header"):
+                ds = pydicom.dcmread(input_path, stop_before_pixels=True)
+                ds = convert_ds(ds)
             if ds.__class__ is MultiFrameFileDataset:
-                affine = affine_from_dataset(ds, allow_default_affine=allow_default_affine)
-                n_frames = int(ds.NumberOfFrames)
+                affine = affine_from_dataset(ds, allow_default_affine=allow_default_affine, frames=frames)
+                n_frames = frame_indices(int(ds.NumberOfFrames), frames).size
                 spatial_shape = (int(ds.Columns), int(ds.Rows), n_frames)
             else:
                 try:
@@ -126,14 +192,15 @@ class PdcmIO:
                 spatial_shape = (int(ds.Columns), int(ds.Rows), 1)
             metadata = PdcmIO.aff2meta(affine)
             if header:
-                metadata.header = {str(key): ds[key] for key in ds}
+                metadata.header = PdcmIO.header_mapping(ds, header_tags)
 
         if desired_ornt is not None and desired_ornt != metadata.ornt:
             orig_ornt = metadata.ornt
             # Convert affine to nib convention, reorient via pure matrix math, convert back
             nib_affine = convert_affine(metadata.affine)
             nib_desired = inv_axcodes(desired_ornt)
-            new_nib_affine, spatial_shape = _reorient_affine(np.array(nib_affine), spatial_shape, nib_desired)
+            with stage("reorient"):
+                new_nib_affine, spatial_shape = reorient_affine(np.array(nib_affine), spatial_shape, nib_desired)
             metadata = MetaData(
                 affine=convert_affine(new_nib_affine),
                 orig_ornt=orig_ornt,
@@ -158,47 +225,34 @@ class PdcmIO:
         transform[:3, 3] = [float(x) for x in ds.ImagePositionPatient]
         return transform
 
-    @staticmethod
-    def _compute_series_affine(slices: list[pydicom.Dataset]) -> NDArray[np.float32]:
-        """Compute affine from a sorted list of DICOM slice datasets using header tags only."""
-        ds0 = slices[0]
-        row_cosine, column_cosine, _ = _extract_cosines(ds0.ImageOrientationPatient)
-        row_spacing, column_spacing = [float(x) for x in ds0.PixelSpacing]
-        first_pos = np.array([float(x) for x in ds0.ImagePositionPatient], dtype=np.float32)
-        if len(slices) == 1:
-            slice_cosine = np.cross(row_cosine, column_cosine)
-            slice_spacing = float(getattr(ds0, "SpacingBetweenSlices", 1))
-            slice_vector = slice_cosine * slice_spacing
-        else:
-            last_pos = np.array([float(x) for x in slices[-1].ImagePositionPatient], dtype=np.float32)
-            slice_vector = (last_pos - first_pos) / (len(slices) - 1)
-        transform = np.identity(4, dtype=np.float32)
-        transform[:3, 0] = row_cosine * column_spacing
-        transform[:3, 1] = column_cosine * row_spacing
-        transform[:3, 2] = slice_vector
-        transform[:3, 3] = first_pos
-        return transform
-
     @staticmethod
     def read_dcm_file(
         filename: str | os.PathLike[str],
         header: bool = False,
         allow_default_affine: bool = False,
         channels_axis: int | None = None,
+        rescale: bool | None = None,
+        frames: Frames | None = None,
+        header_tags: Iterable[str | int] | None = None,
     ) -> tuple[NDArray[np.generic], MetaData[object], bool]:
         """
-        Read a single dicom file.
+        Read a single dicom file. For a multiframe file, frames selects the frames to decode.
         Return the image array, metadata, and whether it has channels
         """
-        ds = pydicom.dcmread(filename)
-        ds = convert_ds(ds)
-        if ds.__class__ is MultiFrameFileDataset:
-            img, affine = unpack_dataset(ds, allow_default_affine=allow_default_affine)
-        else:
-            img, affine = combine_slices([ds])
+        with stage("header"):
+            ds = pydicom.dcmread(filename)
+            ds = convert_ds(ds)
+        with stage("decode") as s:
+            if ds.__class__ is MultiFrameFileDataset:
+                img, affine = unpack_dataset(
+                    ds, rescale=rescale, allow_default_affine=allow_default_affine, frames=frames
+                )
+            else:
+                img, affine = assemble_slices([ds], rescale=rescale)
+            s.nbytes = img.nbytes
         metadata = PdcmIO.aff2meta(affine)
         if header:
-            metadata.header = {str(key): ds[key] for key in ds}
+            metadata.header = PdcmIO.header_mapping(ds, header_tags)
         samples_per_pixel = ds.SamplesPerPixel
         img = PdcmIO.move_channels_axis(
             img,
@@ -209,21 +263,54 @@ class PdcmIO:
         )
         return img, metadata, samples_per_pixel > 1
 
+    @staticmethod
+    def header_mapping(ds: pydicom.Dataset, header_tags: Iterable[str | int] | None = None) -> LazyHeader:
+        """
+        The data elements of a dataset by their tag strings (e.g. '(0010,0020)'), which are converted when they are
+        accessed. The header has its own dataset of the raw elements (except the pixel data), so it does not keep the
+        pixel data of the dataset alive
+        :param ds: the dataset
+        :param header_tags: the tags to include - keywords, int tags or tag strings - all the tags by default
+        """
+        # iterating a dataset converts its elements, its keys are the tags
+        tags = [tag for tag in ds.keys() if tag not in _PIXEL_DATA_TAGS]  # noqa: SIM118
+        if header_tags is not None:
+            included = {_tag_key(tag) for tag in header_tags}
+            tags = [tag for tag in tags if str(tag) in included]
+        header_ds = pydicom.Dataset({tag: ds.get_item(tag) for tag in tags})
+        keys = {str(tag): tag for tag in tags}
+        return LazyHeader(keys, lambda key: header_ds[keys[key]])
+
     @staticmethod
     def read_dcm_dir(
-        input_dir: str | os.PathLike[str],
+        input_dir: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         header: bool = False,
         globber: str = "*",
         channels_axis: int | None = None,
         series: str | int | None = None,
+        out: NDArray[np.generic] | None = None,
+        rescale: bool | None = None,
+        spacing_policy: SpacingPolicy = "reject",
+        presorted: bool = False,
     ) -> tuple[NDArray[np.generic], MetaData[object], bool]:
         """
-        Reads a 3D dicom image: input path can be a file or directory (DICOM series).
+        Reads a 3D dicom image: input path can be a directory or a sequence of the files of a DICOM series.
+        The volume is allocated once (or given by `out`) and each slice is decoded directly into it, while the pixel
+        data of the slices' datasets is released.
         Return the image array, metadata, and whether it has channels
         """
-        # find all dicom files within the specified folder, read every file separately and sort them by InstanceNumber
-        slices = PdcmIO.extract_slices(input_dir, globber=globber, series=series)
-        img, affine = combine_slices(slices)
+        # find all dicom files within the specified folder, read every file separately and sort them along the normal
+        slices = PdcmIO.extract_slices(input_dir, globber=globber, series=series, presorted=presorted)
+        with stage("decode") as s:
+            img, affine = assemble_slices(
+                slices,
+                rescale=rescale,
+                out=out,
+                release_pixels=True,
+                spacing_policy=spacing_policy,
+                presorted=presorted,
+            )
+            s.nbytes = img.nbytes
         metadata = PdcmIO.aff2meta(affine)
         if header:
             # TODO: add header support, something like
@@ -241,46 +328,52 @@ class PdcmIO:
 
     @staticmethod
     def extract_slices(
-        input_dir: str | os.PathLike[str],
+        input_dir: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         globber: str = "*",
         series: str | int | None = None,
+        presorted: bool = False,
+        stop_before_pixels: bool = False,
     ) -> list[pydicom.Dataset]:
-        """Extract slices from input_dir and return them sorted"""
-        files = Path(input_dir).glob(globber)
-        slices = [pydicom.dcmread(filename) for filename in files]
+        """Extract slices from input_dir and return them sorted. input_dir can also be a sequence of the files of a
+        series, which are neither discovered nor grouped by series, and are not sorted if presorted is True"""
+        if not is_path(input_dir):
+            with stage("header"):
+                slices: list[pydicom.Dataset] = [
+                    pydicom.dcmread(filename, stop_before_pixels=stop_before_pixels) for filename in input_dir
+                ]
+            return slices if presorted else PdcmIO.sort_slices(slices)
+        with stage("discover"):
+            files = list(Path(input_dir).glob(globber))
+        with stage("header"):
+            slices = [pydicom.dcmread(filename, stop_before_pixels=stop_before_pixels) for filename in files]
 
         # filter by Series Instance UID
-        datasets = {}
+        datasets: dict[str, list[pydicom.Dataset]] = {}
         for slc in slices:
             key = slc.SeriesInstanceUID
             datasets[key] = [*datasets.get(key, []), slc]
 
         series_uid = parse_series_uids(input_dir, datasets.keys(), series, globber)
-        slices = datasets[series_uid]
-
-        slices.sort(key=lambda ds: ds.get("InstanceNumber", 0))
-        return slices
+        return PdcmIO.sort_slices(datasets[series_uid])
 
     @staticmethod
     def extract_slices_no_pixels(
-        input_dir: str | os.PathLike[str],
+        input_dir: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
         globber: str = "*",
         series: str | int | None = None,
+        presorted: bool = False,
     ) -> list[pydicom.Dataset]:
         """Extract slices from input_dir without loading pixel data (header-only).
         Returns sorted list of pydicom Datasets read with stop_before_pixels=True."""
-        files = list(Path(input_dir).glob(globber))
-        slices = [pydicom.dcmread(f, stop_before_pixels=True) for f in files]
-
-        datasets: dict[str, list[pydicom.Dataset]] = {}
-        for slc in slices:
-            key = slc.SeriesInstanceUID
-            datasets[key] = [*datasets.get(key, []), slc]
+        return PdcmIO.extract_slices(input_dir, globber, series, presorted, stop_before_pixels=True)
 
-        series_uid = parse_series_uids(input_dir, datasets.keys(), series, globber)
-        slices = datasets[series_uid]
-        slices.sort(key=lambda ds: ds.get("InstanceNumber", 0))
-        return slices
+    @staticmethod
+    def sort_slices(slices: list[pydicom.Dataset]) -> list[pydicom.Dataset]:
+        """Sort slices by their position along the slice normal, or by InstanceNumber without geometry tags"""
+        try:
+            return sort_slices(slices)[0]
+        except AttributeError:
+            return sorted(slices, key=lambda ds: ds.get("InstanceNumber", 0))
 
     @staticmethod
     def aff2meta(affine: NDArray[np.floating]) -> MetaData[object]:
@@ -318,7 +411,7 @@ class PdcmIO:
         if not flag:
             raise ValueError("The original channels axis was not detected")
 
-        return np.moveaxis(array, orig_axis, channels_axis)
+        return move_channels(array, orig_axis, channels_axis)
 
     @staticmethod
     def reorient(
@@ -327,23 +420,20 @@ class PdcmIO:
         desired_ornt: str | None,
     ) -> tuple[NDArray[np.generic], MetaData[object]]:
         """
-        Reorient img array and affine (in the metadata) to desired_ornt (str) using nibabel.
-        desired_ornt is in itk convention.
+        Reorient img array and affine (in the metadata) to desired_ornt (str) with the orientation tables, the returned
+        array is a view of img. desired_ornt is in itk convention.
         Note that if img has channels (RGB for example), they must be in last axis
         """
         if (desired_ornt is None) or (desired_ornt == metadata.ornt):
             return img, metadata
-        # convert from pydicom (itk) to nibabel convention
-        metadata.convert(NibIO.coord_sys)
-        orig_ornt = metadata.ornt
+        # the reorientation tables are in nibabel convention
+        nib_metadata = metadata.in_coord_sys(NibIO.coord_sys)
+        orig_ornt = nib_metadata.ornt
         desired_ornt = inv_axcodes(desired_ornt)
-        # use nibabel for the reorientation
-        img_struct = nibabel.spatialimages.SpatialImage(img, metadata.affine)
-        reoriented_img_struct = NibIO.reorient(img_struct, desired_ornt)
-
-        img = np.asanyarray(reoriented_img_struct.dataobj)
+        affine, _ = reorient_affine(nib_metadata.affine, img.shape[:3], desired_ornt)
+        img = reorient_array(img, orig_ornt, desired_ornt)
         metadata = MetaData(
-            reoriented_img_struct.affine,
+            affine,
             orig_ornt=orig_ornt,
             coord_sys=NibIO.coord_sys,
             header=metadata.header,
@@ -383,3 +473,10 @@ class PdcmIO:
             img_arr = img_arr.astype(dtype, copy=False)
         ds.PixelData = img_arr.tobytes()
         ds.save_as(output_filename)
+
+
+def _tag_key(tag: str | int) -> str:
+    """The header key of a tag - a keyword, an int tag or a header key (returned as is)"""
+    if isinstance(tag, str) and tag.startswith("("):
+        return tag
+    return str(Tag(tag))
@@ -0,0 +1,106 @@
+"""
+Rescale (modality LUT) engine for pydicom pixel data: output = stored_value * RescaleSlope + RescaleIntercept.
+The output dtype is the smallest one that holds the rescaled range of the stored values, and the transformation is
+applied in-place, without full-size temporaries. An identity rescale (slope 1 and intercept 0) is skipped.
+To defer the rescale and keep the raw stored values, read with rescale=False and apply later:
+>>> voxels = apply_rescale(raw_voxels, *rescale_params(dataset))
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pydicom
+    from numpy.typing import NDArray
+
+Number = Union[int, float]
+
+# candidates for an integer output dtype, from the smallest
+_INT_DTYPES = tuple(np.dtype(t) for t in (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.int64))
+
+
+def rescale_params(dataset: pydicom.Dataset) -> tuple[Number, Number]:
+    """Return the rescale slope and intercept of dataset, as integers when they are integral"""
+    slope = float(getattr(dataset, "RescaleSlope", 1))
+    intercept = float(getattr(dataset, "RescaleIntercept", 0))
+    if slope.is_integer() and intercept.is_integer():
+        return int(slope), int(intercept)
+    return slope, intercept
+
+
+def is_identity(slope: Number, intercept: Number) -> bool:
+    return slope == 1 and intercept == 0
+
+
+def stored_value_range(dtype: np.dtype, bits_stored: int | None = None) -> tuple[Number, Number]:
+    """The range of the stored values according to dtype and (optionally) the Bits Stored tag"""
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        info = np.finfo(dtype)
+        return float(info.min), float(info.max)
+    info = np.iinfo(dtype.type)
+    if bits_stored is None or bits_stored >= info.bits:
+        return int(info.min), int(info.max)
+    if dtype.kind == "u":
+        return 0, 2**bits_stored - 1
+    return -(2 ** (bits_stored - 1)), 2 ** (bits_stored - 1) - 1
+
+
+def rescaled_dtype(
+    dtype: np.dtype,
+    slope: Number,
+    intercept: Number,
+    bits_stored: int | None = None,
+) -> np.dtype:
+    """Return the smallest dtype that holds the stored values of dtype after the rescale"""
+    dtype = np.dtype(dtype)
+    if is_identity(slope, intercept):
+        return dtype
+    if dtype.kind == "f":
+        return np.result_type(dtype, np.float32)
+    if isinstance(slope, int) and isinstance(intercept, int):
+        low, high = stored_value_range(dtype, bits_stored)
+        low, high = sorted((low * slope + intercept, high * slope + intercept))
+        # the in-place operations require that slope and intercept are also representable in the output dtype
+        low, high = min(low, slope, intercept), max(high, slope, intercept)
+        for candidate in _INT_DTYPES:
+            info = np.iinfo(candidate.type)
+            if info.min <= low and high <= info.max:
+                return candidate
+    # float32 represents exactly every integer up to 2**24
+    return np.dtype(np.float32) if dtype.itemsize <= 2 else np.dtype(np.float64)
+
+
+def apply_rescale(
+    voxels: NDArray[np.generic],
+    slope: Number,
+    intercept: Number,
+    dtype: np.dtype | None = None,
+) -> NDArray[np.generic]:
+    """
+    Apply voxels * slope + intercept. If voxels is writeable and already of the output dtype, it is modified in-place,
+    otherwise it is converted once to the output dtype and the copy is modified in-place.
+    :param voxels: the stored values array
+    :param slope: rescale slope
+    :param intercept: rescale intercept
+    :param dtype: the output dtype, by default the smallest safe dtype according to rescaled_dtype
+    :return: the rescaled array
+    """
+    if dtype is None:
+        dtype = rescaled_dtype(voxels.dtype, slope, intercept)
+    if voxels.dtype != dtype or not voxels.flags.writeable:
+        voxels = voxels.astype(dtype)
+    if slope != 1:
+        np.multiply(voxels, slope, out=voxels, casting="unsafe")
+    if intercept != 0:
+        np.add(voxels, intercept, out=voxels, casting="unsafe")
+    return voxels
+
+
+def dataset_rescaled_dtype(dataset: pydicom.Dataset, dtype: np.dtype) -> np.dtype:
+    """The output dtype for the pixel data of dataset, whose stored values are of the given dtype"""
+    bits_stored = dataset.get("BitsStored", None)
+    return rescaled_dtype(dtype, *rescale_params(dataset), None if bits_stored is None else int(bits_stored))
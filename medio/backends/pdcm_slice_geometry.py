@@ -0,0 +1,226 @@
+"""
+Geometry engine for a DICOM series: sorting the slices by their position along the slice normal, and validating their
+spacing in a single vectorized pass over the slices' positions.
+The spacing issues are duplicate positions, gaps (missing slices) and non-uniform spacing, and they are handled
+according to a spacing policy (slices with duplicate positions are always dropped):
+- 'reject': raise a DicomImportException
+- 'resample': interpolate the slices linearly onto a uniform grid with the nominal (median) spacing
+- 'split': split the series into sub-volumes of nominal spacing, and use the largest one
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Literal, NamedTuple
+
+import numpy as np
+from dicom_numpy import DicomImportException
+from dicom_numpy.combine_slices import _extract_cosines, _validate_image_orientation
+
+if TYPE_CHECKING:
+    import pydicom
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+SpacingPolicy = Literal["reject", "resample", "split"]
+
+# properties which must be equal for all the slices of a volume
+INVARIANT_PROPERTIES = (
+    "Modality",
+    "SOPClassUID",
+    "SeriesInstanceUID",
+    "Rows",
+    "Columns",
+    "SamplesPerPixel",
+    "PixelSpacing",
+    "PixelRepresentation",
+    "BitsAllocated",
+)
+# relative tolerance for warning about a slightly non-uniform spacing, as in dicom_numpy
+WARN_RTOL = 1e-5
+
+
+class SliceGeometry(NamedTuple):
+    """The slices of a series sorted along the slice normal, and their spacing analysis"""
+
+    datasets: list[pydicom.Dataset]  # sorted, without duplicates
+    positions: NDArray[np.float64]  # positions of the sorted slices along the normal
+    normal: NDArray[np.float64]
+    spacing: float  # nominal spacing - the median distance between consecutive slices
+    n_duplicates: int  # number of dropped slices with duplicate positions
+    gaps: NDArray[np.intp]  # indices i for which the distance between slices i and i+1 deviates from spacing
+    max_deviation: float  # maximal relative deviation of the distance between consecutive slices from spacing
+
+    @property
+    def is_uniform(self) -> bool:
+        return self.gaps.size == 0
+
+
+def slice_normal(dataset: pydicom.Dataset) -> NDArray[np.float64]:
+    return _extract_cosines(np.asarray(dataset.ImageOrientationPatient, dtype=np.float64))[2]
+
+
+def slice_positions(datasets: list[pydicom.Dataset]) -> NDArray[np.float64]:
+    """The positions of the datasets along the slice normal: their ImagePositionPatient projected onto it"""
+    normal = slice_normal(datasets[0])
+    return np.array([ds.ImagePositionPatient for ds in datasets], dtype=np.float64).reshape(-1, 3) @ normal
+
+
+def sort_slices(
+    datasets: list[pydicom.Dataset], presorted: bool = False
+) -> tuple[list[pydicom.Dataset], NDArray[np.float64]]:
+    """Sort the datasets by projecting their ImagePositionPatient onto the slice normal. Return them with the sorted
+    positions along the normal. Presorted datasets are kept in their order if it is ascending"""
+    positions = slice_positions(datasets)
+    if presorted and np.all(np.diff(positions) >= 0):
+        return datasets, positions
+    order = np.argsort(positions, kind="stable")
+    return [datasets[i] for i in order], positions[order]
+
+
+def analyze_slices(
+    datasets: list[pydicom.Dataset],
+    rtol: float = 0.1,
+    default_spacing: float = 1.0,
+    presorted: bool = False,
+) -> SliceGeometry:
+    """
+    Sort the slices, validate that they belong to the same volume and analyze their spacing
+    :param datasets: the slices' datasets (pixel data is not required)
+    :param rtol: relative tolerance of the distance between consecutive slices from the nominal spacing
+    :param default_spacing: the spacing of a single slice without a SpacingBetweenSlices tag
+    :param presorted: whether the datasets are already sorted along the slice normal, then they are sorted only if
+    their order is not ascending
+    :return: SliceGeometry
+    """
+    if len(datasets) == 0:
+        raise DicomImportException("Must provide at least one image DICOM dataset")
+    validate_invariant_properties(datasets)
+    sorted_datasets, positions = sort_slices(datasets, presorted)
+    normal = slice_normal(sorted_datasets[0])
+
+    diffs = np.diff(positions)
+    duplicates = np.flatnonzero(np.isclose(diffs, 0, rtol=0, atol=1e-4))
+    if duplicates.size > 0:
+        keep = np.ones(len(positions), dtype=bool)
+        keep[duplicates + 1] = False
+        sorted_datasets = [ds for ds, k in zip(sorted_datasets, keep) if k]
+        positions = positions[keep]
+        diffs = np.diff(positions)
+        logger.warning(f"Dropped {duplicates.size} slices with duplicate positions")
+
+    if diffs.size == 0:
+        spacing = float(getattr(sorted_datasets[0], "SpacingBetweenSlices", default_spacing))
+        return SliceGeometry(sorted_datasets, positions, normal, spacing, duplicates.size, np.empty(0, np.intp), 0.0)
+
+    spacing = float(np.median(diffs))
+    deviations = np.abs(diffs - spacing) / spacing
+    max_deviation = float(deviations.max())
+    gaps = np.flatnonzero(deviations > rtol)
+    if WARN_RTOL < max_deviation <= rtol:
+        logger.warning(f"The slice spacing is slightly non-uniform, max relative deviation: {max_deviation}")
+    return SliceGeometry(sorted_datasets, positions, normal, spacing, duplicates.size, gaps, max_deviation)
+
+
+def validate_invariant_properties(datasets: list[pydicom.Dataset]) -> None:
+    """Validate that the slices share the invariant properties and the image orientation"""
+    ds0 = datasets[0]
+    for property_name in INVARIANT_PROPERTIES:
+        initial_value = getattr(ds0, property_name, None)
+        for ds in datasets[1:]:
+            value = getattr(ds, property_name, None)
+            if value != initial_value:
+                raise DicomImportException(
+                    f'All slices must have the same value for "{property_name}": {value} != {initial_value}'
+                )
+    _validate_image_orientation(ds0.ImageOrientationPatient)
+    orientations = np.array([ds.ImageOrientationPatient for ds in datasets], dtype=np.float64).reshape(-1, 6)
+    if not np.allclose(orientations, orientations[0], atol=1e-5):
+        raise DicomImportException('All slices must have the same value for "ImageOrientationPatient" within "1e-05"')
+
+
+def apply_spacing_policy(geometry: SliceGeometry, policy: SpacingPolicy = "reject") -> SliceGeometry:
+    """
+    Handle a non-uniform geometry according to the policy. 'reject' raises an error, 'split' returns the geometry of
+    the largest sub-volume, and 'resample' returns the geometry as is (the volume is resampled after it is assembled,
+    see resample_slices)
+    """
+    if policy not in ("reject", "resample", "split"):
+        raise ValueError(f'Invalid spacing policy: "{policy}", should be one of: "reject", "resample", "split"')
+    if geometry.is_uniform:
+        return geometry
+    if policy == "reject":
+        raise DicomImportException(
+            "It appears there are missing slices or the slice spacing is non-uniform. "
+            f"Nominal spacing: {geometry.spacing}, relative deviation: {geometry.max_deviation}.\n"
+            "Try using the spacing policy 'resample' or 'split'"
+        )
+    if policy == "split":
+        sub_volumes = split_slices(geometry)
+        largest = max(sub_volumes, key=lambda g: len(g.datasets))
+        logger.warning(
+            f"The series was split into {len(sub_volumes)} sub-volumes, using the largest one: {len(largest.datasets)} "
+            f"out of {len(geometry.datasets)} slices"
+        )
+        return largest
+    return geometry
+
+
+def split_slices(geometry: SliceGeometry) -> list[SliceGeometry]:
+    """Split the slices at the gaps into sub-volumes with the nominal spacing"""
+    bounds = np.concatenate(([0], geometry.gaps + 1, [len(geometry.datasets)]))
+    return [
+        SliceGeometry(
+            geometry.datasets[start:stop],
+            geometry.positions[start:stop],
+            geometry.normal,
+            geometry.spacing,
+            0,
+            np.empty(0, np.intp),
+            float(np.abs(np.diff(geometry.positions[start:stop]) - geometry.spacing).max(initial=0) / geometry.spacing),
+        )
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def uniform_positions(geometry: SliceGeometry) -> NDArray[np.float64]:
+    """The positions along the normal of a uniform grid with the nominal spacing, covering the slices"""
+    first, last = geometry.positions[0], geometry.positions[-1]
+    n_slices = round((last - first) / geometry.spacing) + 1
+    return first + geometry.spacing * np.arange(n_slices)
+
+
+def resample_slices(
+    volume: NDArray[np.generic],
+    positions: NDArray[np.float64],
+    new_positions: NDArray[np.float64],
+) -> NDArray[np.floating]:
+    """
+    Linearly interpolate the volume along its last (slices) axis from positions to new_positions (both ascending).
+    Integer volumes are resampled to float32
+    """
+    upper = positions.searchsorted(new_positions, side="right").clip(1, len(positions) - 1)
+    lower = upper - 1
+    weights = (new_positions - positions[lower]) / (positions[upper] - positions[lower])
+    weights = np.clip(weights, 0, 1)
+    dtype = np.result_type(volume.dtype, np.float32)
+    resampled = np.empty((*volume.shape[:-1], len(new_positions)), dtype=dtype, order="F")
+    for k, (i, j, w) in enumerate(zip(lower, upper, weights)):
+        slc = resampled[..., k]
+        np.multiply(volume[..., i], 1 - w, out=slc, casting="unsafe")
+        slc += w * volume[..., j]
+    return resampled
+
+
+def geometry_affine(geometry: SliceGeometry) -> NDArray[np.float32]:
+    """The affine matrix of the volume of the sorted slices with the nominal spacing"""
+    ds0 = geometry.datasets[0]
+    row_cosine, column_cosine, slice_cosine = _extract_cosines(ds0.ImageOrientationPatient)
+    row_spacing, column_spacing = (float(x) for x in ds0.PixelSpacing)
+    transform = np.identity(4, dtype=np.float32)
+    transform[:3, 0] = row_cosine * column_spacing
+    transform[:3, 1] = column_cosine * row_spacing
+    transform[:3, 2] = slice_cosine * geometry.spacing
+    transform[:3, 3] = [float(x) for x in ds0.ImagePositionPatient]
+    return transform
@@ -5,25 +5,56 @@ This module is equivalent to dicom_numpy's module: combine_slices.py, but here f
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Union
 
 import numpy as np
+from dicom_numpy import DicomImportException
 from dicom_numpy.combine_slices import (
     _extract_cosines,
     _requires_rescaling,
     _validate_image_orientation,
 )
 
+from medio.backends.pdcm_codecs import CODECS, is_compressed
+from medio.backends.pdcm_rescale import apply_rescale, dataset_rescaled_dtype, rescale_params
+
+try:
+    from pydicom.pixels import iter_pixels
+except ImportError:  # pydicom < 3 has no per-frame decoding
+    iter_pixels = None  # type: ignore[assignment]
+
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
     import pydicom
     from numpy.typing import NDArray
 
 logger = logging.getLogger(__name__)
 
+# the relative tolerance of the steps between the selected frames from a uniform step
+FRAMES_SPACING_RTOL = 1e-2
+# the slice spacing of a single frame file without a SpacingBetweenSlices tag (as analyze_slices for a single slice)
+DEFAULT_SLICE_SPACING = 1.0
+
+# selection of frames: indices or a slice
+Frames = Union["Sequence[int]", "NDArray[np.integer]", slice]
+
+
+def frame_indices(n_frames: int, frames: Frames | None = None) -> NDArray[np.intp]:
+    """Return the explicit array of frame indices (supporting negative indices) selected by frames"""
+    indices = np.arange(n_frames)
+    if frames is None:
+        return indices
+    indices = np.atleast_1d(indices[frames])
+    if indices.size == 0:
+        raise ValueError(f"No frames were selected by: {frames}")
+    return indices
+
 
 def affine_from_dataset(
     dataset: pydicom.Dataset,
     allow_default_affine: bool = False,
+    frames: Frames | None = None,
 ) -> NDArray[np.float32]:
     """
     Compute the 4x4 affine transformation matrix for a multiframe pydicom dataset
@@ -33,7 +64,7 @@ def affine_from_dataset(
     """
     try:
         _validate_image_orientation(dataset.ImageOrientationPatient)
-        return _ijk_to_patient_xyz_transform_matrix(dataset)
+        return _ijk_to_patient_xyz_transform_matrix(dataset, frames)
     except AttributeError as e:
         if allow_default_affine:
             return np.eye(4, dtype=np.float32)
@@ -44,6 +75,7 @@ def unpack_dataset(
     dataset: pydicom.Dataset,
     rescale: bool | None = None,
     allow_default_affine: bool = False,
+    frames: Frames | None = None,
 ) -> tuple[NDArray[np.generic], NDArray[np.float32]]:
     """
     Given a pydicom dataset of a single image file return three-dimensional numpy array.
@@ -59,11 +91,16 @@ def unpack_dataset(
     `Rescale Intercept <https://dicom.innolitics.com/ciods/ct-image/ct-image/00281052>`_
     attributes.  If either of these attributes are present they will be applied.
 
-    If `rescale` is `True` the voxels will be cast to `float32`, if set to
-    `False`, the original dtype will be preserved even if DICOM rescaling information is present.
+    If `rescale` is `True` the rescaling is applied (an identity rescale is skipped) and the voxels are cast to the
+    smallest dtype which holds the rescaled values, see `medio.backends.pdcm_rescale`. If set to `False`, the stored
+    values and their dtype will be preserved even if DICOM rescaling information is present.
 
     The returned array has the column-major byte-order.
 
+    If `frames` is given (indices or a slice), only the selected frames are decoded (with pydicom >= 3, which supports
+    per-frame access, also for encapsulated pixel data) and the affine matrix corresponds to the selected frames. The
+    selected frames are assumed to be equally spaced, e.g. a slice with a step.
+
     This function requires that the datasets:
 
     - Be in same series (have the same
@@ -98,50 +135,101 @@ def unpack_dataset(
     """
     try:
         _validate_image_orientation(dataset.ImageOrientationPatient)
-        transform = _ijk_to_patient_xyz_transform_matrix(dataset)
+        transform = _ijk_to_patient_xyz_transform_matrix(dataset, frames)
     except AttributeError as e:
         if allow_default_affine:
             transform = np.eye(4)
         else:
             raise AttributeError(str(e) + "\nTry using: allow_default_affine=True") from e
 
-    voxels = _unpack_pixel_array(dataset, rescale)
+    voxels = _unpack_pixel_array(dataset, rescale, frames)
     return voxels, transform
 
 
-def _unpack_pixel_array(dataset: pydicom.Dataset, rescale: bool | None = None) -> NDArray[np.generic]:
-    voxels = dataset.pixel_array.T
+def decode_frames(dataset: pydicom.Dataset, frames: Frames | None = None) -> NDArray[np.generic]:
+    """
+    Decode only the selected frames of a multiframe dataset into an array of shape (frames, rows, columns[, samples]),
+    as in dataset.pixel_array. Compressed frames are decoded in parallel by the codecs of medio.backends.pdcm_codecs.
+    Without pydicom's per-frame access (pydicom < 3) all the frames are decoded
+    """
+    n_frames = int(dataset.NumberOfFrames)
+    indices = frame_indices(n_frames, frames)
+    if iter_pixels is not None and is_compressed(dataset):
+        return CODECS.decode_frames(dataset, indices)
+    if frames is None or (indices.size == n_frames and np.array_equal(indices, np.arange(n_frames))):
+        return dataset.pixel_array
+    if iter_pixels is None:
+        return dataset.pixel_array[indices]
+    frames_iter = iter_pixels(dataset, indices=indices.tolist())
+    first = next(frames_iter)
+    pixels = np.empty((indices.size, *first.shape), dtype=first.dtype)
+    pixels[0] = first
+    for i, frame in enumerate(frames_iter, 1):
+        pixels[i] = frame
+    return pixels
+
+
+def _unpack_pixel_array(
+    dataset: pydicom.Dataset,
+    rescale: bool | None = None,
+    frames: Frames | None = None,
+) -> NDArray[np.generic]:
+    voxels = decode_frames(dataset, frames).T
 
     if rescale is None:
         rescale = _requires_rescaling(dataset)
 
     if rescale:
-        # TODO: it takes time! Consider view.
-        voxels = voxels.astype("int16", copy=False)
-        slope = getattr(dataset, "RescaleSlope", 1)
-        intercept = getattr(dataset, "RescaleIntercept", 0)
-        if int(slope) == slope and int(intercept) == intercept:
-            slope = int(slope)
-            intercept = int(intercept)
-        voxels = voxels * slope + intercept
+        slope, intercept = rescale_params(dataset)
+        dtype = dataset_rescaled_dtype(dataset, voxels.dtype)
+        if dtype == voxels.dtype:
+            # the rescale is done in-place, detach the array from the dataset's cache to keep the dataset intact
+            dataset._pixel_array = None
+        voxels = apply_rescale(voxels, slope, intercept, dtype)
 
     return voxels
 
 
-def _ijk_to_patient_xyz_transform_matrix(dataset: pydicom.Dataset) -> NDArray[np.float32]:
-    image_orientation = dataset.ImageOrientationPatient
-    row_cosine, column_cosine, _slice_cosine = _extract_cosines(image_orientation)
+def _ijk_to_patient_xyz_transform_matrix(dataset: pydicom.Dataset, frames: Frames | None = None) -> NDArray[np.float32]:
+    positions = dataset.frame_positions()
+    indices = frame_indices(len(positions), frames)
+
+    # the selected frames must share a single orientation (per-frame orientations may differ between frames)
+    orientations = dataset.frame_orientations()[indices]
+    if not np.allclose(orientations, orientations[0], atol=1e-5):
+        raise DicomImportException(
+            'All the selected frames must have the same value for "ImageOrientationPatient" within "1e-05"'
+        )
+    image_orientation = orientations[0]
+    row_cosine, column_cosine, slice_cosine = _extract_cosines(image_orientation)
 
     row_spacing, column_spacing = dataset.PixelSpacing
     # slice_spacing = dataset.get('SpacingBetweenSlices', 0)
 
+    if indices.size > 1:
+        # the affine has a single slice step, so the selected frames must be equally spaced along the slice normal
+        steps = np.diff(positions[indices] @ slice_cosine)
+        if np.isclose(steps[0], 0, rtol=0, atol=1e-4) or not np.allclose(
+            steps, steps[0], rtol=FRAMES_SPACING_RTOL, atol=1e-4
+        ):
+            raise DicomImportException(
+                f"The selected frames must be equally spaced along the slice normal, got the steps: {steps.tolist()}"
+            )
+        slice_vector = (positions[indices[-1]] - positions[indices[0]]) / (indices.size - 1)
+    elif len(positions) > 1:
+        # a single selected frame - use the spacing of the whole volume
+        slice_vector = (positions[-1] - positions[0]) / (len(positions) - 1)
+    else:
+        # a single frame file - the spacing between slices along the normal, as a single slice of a series
+        slice_vector = slice_cosine * float(getattr(dataset, "SpacingBetweenSlices", DEFAULT_SLICE_SPACING))
+
     transform = np.identity(4, dtype=np.float32)
 
     transform[:3, 0] = row_cosine * column_spacing
     transform[:3, 1] = column_cosine * row_spacing
-    transform[:3, 2] = (np.array(dataset.slice_position(-1)) - dataset.slice_position(0)) / (dataset.NumberOfFrames - 1)
+    transform[:3, 2] = slice_vector
     # transform[:3, 2] = slice_cosine * slice_spacing
 
-    transform[:3, 3] = dataset.ImagePositionPatient
+    transform[:3, 3] = positions[indices[0]]
 
     return transform
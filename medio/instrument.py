@@ -0,0 +1,246 @@
+"""
+Instrumentation of the read/save pipeline: per-stage timings and bytes of every read_img, read_meta, save_img and
+save_dir call, for all the backends (also when a backend is called directly, e.g. PdcmIO.read_img).
+It is disabled by default, and then it costs a single flag check per call and per stage.
+>>> import medio.instrument
+>>> medio.instrument.enable(log_level=logging.INFO)  # log a summary of every call
+>>> medio.instrument.enable(my_collector)  # call my_collector(record) with the CallRecord of every call
+>>> with medio.instrument.collect() as records:  # collect the records of the calls within the block
+...     medio.read_img(path)
+>>> records[0].stage_seconds()
+{'discover': 0.002, 'header': 0.041, 'decode': 0.153, 'reorient': 0.011, 'convert': 1.2e-05}
+The stages are:
+- discover: finding the files of a DICOM series
+- header: parsing the headers (and for pydicom, reading the files)
+- decode: decoding the pixel data into an array
+- reorient: reorienting the image (or only the metadata, for read_meta)
+- cast: casting the array to the requested dtype
+- convert: converting the metadata to the requested coordinate system
+- prepare: preparing the image for saving (orientation and packing)
+- write: encoding and writing the file(s)
+The records of collect() are collected per thread and per asyncio task (with a context variable): a block collects only
+the calls of its own thread or task (and of the tasks created within it), while the collectors of enable() get the
+records of all the calls.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+Collector = Callable[["CallRecord"], None]
+
+# the flag checked by every call and stage: enable() was called, or a collect() block is active in some thread
+_enabled = False
+_enabled_globally = False
+_collecting = 0
+_lock = threading.Lock()
+_collectors: list[Collector] = []
+_current: ContextVar[CallRecord | None] = ContextVar("medio_instrument_call", default=None)
+# the record lists of the collect() blocks of the current thread or task, innermost last
+_collected: ContextVar[tuple[list[CallRecord], ...]] = ContextVar("medio_instrument_collected", default=())
+
+
+class Stage(NamedTuple):
+    name: str
+    seconds: float
+    nbytes: int = 0
+
+
+class CallRecord:
+    """The record of a single read_img, read_meta, save_img or save_dir call"""
+
+    def __init__(self, operation: str, backend: str | None = None, path: object = None) -> None:
+        self.operation = operation
+        self.backend = backend
+        self.path = path
+        self.stages: list[Stage] = []
+        self.seconds = 0.0
+        self.error: str | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(stage.nbytes for stage in self.stages)
+
+    def stage_seconds(self) -> dict[str, float]:
+        """The total time of every stage name, in the order of the stages"""
+        seconds: dict[str, float] = {}
+        for stage in self.stages:
+            seconds[stage.name] = seconds.get(stage.name, 0.0) + stage.seconds
+        return seconds
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name}={seconds * 1e3:.2f}ms" for name, seconds in self.stage_seconds().items())
+        error = "" if self.error is None else f" error={self.error}"
+        return (
+            f"{self.operation}[{self.backend}] {self.path}: {self.seconds * 1e3:.2f}ms, {self.nbytes} bytes "
+            f"({stages}){error}"
+        )
+
+    def __repr__(self) -> str:
+        return f"CallRecord({self.summary()})"
+
+
+class _StageTimer:
+    __slots__ = ("_start", "name", "nbytes", "record")
+
+    def __init__(self, name: str, record: CallRecord, nbytes: int | Callable[[], int]) -> None:
+        self.name = name
+        self.record = record
+        self.nbytes = nbytes
+
+    def __enter__(self) -> _StageTimer:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        seconds = time.perf_counter() - self._start
+        nbytes = self.nbytes if isinstance(self.nbytes, int) else self.nbytes()
+        self.record.stages.append(Stage(self.name, seconds, int(nbytes)))
+
+
+class _NullStage:
+    """The stage when the instrumentation is off, setting nbytes is ignored"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> _NullStage:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+    @nbytes.setter
+    def nbytes(self, value: int | Callable[[], int]) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(collector: Collector | None = None, log_level: int | None = None) -> None:
+    """
+    Enable the instrumentation
+    :param collector: optional function which is called with the CallRecord of every call
+    :param log_level: if not None, log a summary of every call with this level to the 'medio.instrument' logger
+    """
+    global _enabled, _enabled_globally
+    with _lock:
+        if collector is not None:
+            _collectors.append(collector)
+        if log_level is not None:
+            _collectors.append(functools.partial(_log_record, log_level))
+        _enabled_globally = _enabled = True
+
+
+def disable() -> None:
+    """Disable the instrumentation and remove all the collectors (the active collect() blocks keep collecting)"""
+    global _enabled, _enabled_globally
+    with _lock:
+        _enabled_globally = False
+        _enabled = _collecting > 0
+        _collectors.clear()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def collect() -> Generator[list[CallRecord], None, None]:
+    """
+    Collect the records of the calls of the current thread or task within the block into the yielded list (in addition
+    to the collectors). The instrumentation is on while any block is active, in any thread
+    """
+    global _enabled, _collecting
+    records: list[CallRecord] = []
+    token = _collected.set((*_collected.get(), records))
+    with _lock:
+        _collecting += 1
+        _enabled = True
+    try:
+        yield records
+    finally:
+        with _lock:
+            _collecting -= 1
+            _enabled = _enabled_globally or _collecting > 0
+        _collected.reset(token)
+
+
+def stage(name: str, nbytes: int | Callable[[], int] = 0) -> _StageTimer | _NullStage:
+    """
+    Context manager which times a stage of the current call. The bytes can also be set on the returned object, as an
+    int or as a function which is called at the end of the stage (only when the instrumentation is on):
+    >>> with stage("decode") as s:
+    ...     img = decode()
+    ...     s.nbytes = img.nbytes
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    record = _current.get()
+    if record is None:
+        return _NULL_STAGE
+    return _StageTimer(name, record, nbytes)
+
+
+def instrumented(operation: str, backend: str | None = None) -> Callable[[F], F]:
+    """
+    Decorator for recording the calls of a read/save function, whose first argument is the path. A call within a
+    recorded call joins the outer record (and sets its backend), e.g. the backend's read_img within medio.read_img
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            record = _current.get()
+            if record is not None:
+                if record.backend is None:
+                    record.backend = backend
+                return func(*args, **kwargs)
+            record = CallRecord(operation, backend, args[0] if args else next(iter(kwargs.values()), None))
+            token = _current.set(record)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                record.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                record.seconds = time.perf_counter() - start
+                _current.reset(token)
+                _dispatch(record)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _dispatch(record: CallRecord) -> None:
+    for records in _collected.get():
+        records.append(record)
+    for collector in list(_collectors):
+        try:
+            collector(record)
+        except Exception:
+            logger.exception(f"Instrumentation collector {collector} failed")
+
+
+def _log_record(log_level: int, record: CallRecord) -> None:
+    logger.log(log_level, record.summary())
@@ -1,3 +1,4 @@
 from .medimg import MedImg
+from .patches import Patches, PatchSampler
 
-__all__ = ["MedImg"]
+__all__ = ["MedImg", "PatchSampler", "Patches"]
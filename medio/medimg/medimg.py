@@ -3,13 +3,17 @@ from __future__ import annotations
 import warnings
 from typing import TYPE_CHECKING, Any
 
+from medio.medimg.patches import PatchSampler
 from medio.metadata.affine import Affine
 from medio.metadata.metadata import MetaData
 from medio.read_save import read_img, save_img
+from medio.shared import SharedImg
 from medio.utils.explicit_slicing import explicit_inds
+from medio.utils.resample import downsample, resample_spacing, resample_to_grid
 
 if TYPE_CHECKING:
     import os
+    from collections.abc import Sequence
 
     import numpy as np
     from numpy.typing import NDArray
@@ -53,6 +57,73 @@ class MedImg:
         np_image, metadata = read_img(filename, **kwargs)
         return cls(np_image, metadata)
 
+    @classmethod
+    def from_shared(cls, shared: SharedImg) -> MedImg:
+        """
+        MedImg of an image in shared memory (see medio.shared), whose array is a zero-copy view of the block. The MedImg
+        must be dropped (or its np_image copied) before shared is closed
+        """
+        return cls(shared.np_image, shared.metadata)
+
+    def to_shared(self, header: bool = True) -> SharedImg:
+        """Copy the image into a new shared memory block owned by this process, see medio.shared.SharedImg.create"""
+        return SharedImg.create(self.np_image, self.metadata, header=header)
+
+    def resample(
+        self, spacing: float | Sequence[float | None], order: int = 1, max_workers: int | None = None
+    ) -> MedImg:
+        """
+        Resample the image to a new spacing (see medio.utils.resample.resample_spacing), e.g. isotropic 1mm voxels:
+        >>> new_mimg = mimg.resample(1.0)
+        :param spacing: a number for all the axes or a number per spatial axis, None to keep the spacing of an axis
+        :param order: the interpolation order, 0 (nearest neighbor, e.g. for labels) or 1 (linear)
+        :param max_workers: the maximal number of threads, the number of CPUs by default
+        """
+        return MedImg(*resample_spacing(self.np_image, self.metadata, spacing, order, max_workers))
+
+    def resample_like(
+        self, other: MedImg | MetaData[Any], order: int = 1, fill_value: float = 0, max_workers: int | None = None
+    ) -> MedImg:
+        """
+        Resample the image onto the voxel grid of another image (see medio.utils.resample.resample_to_grid), e.g. a
+        mask onto a CT:
+        >>> mask_on_ct = mask.resample_like(ct, order=0)
+        :param other: a MedImg, or a MetaData with a spatial_shape (e.g. of read_meta) for a grid without an image
+        :param order: the interpolation order, 0 (nearest neighbor, e.g. for labels) or 1 (linear)
+        :param fill_value: the value of the voxels outside of the image
+        :param max_workers: the maximal number of threads, the number of CPUs by default
+        """
+        if isinstance(other, MetaData):
+            if other.spatial_shape is None:
+                raise ValueError("The metadata of the target grid has no spatial_shape")
+            target_metadata, target_shape = other, other.spatial_shape
+        else:
+            target_metadata, target_shape = other.metadata, other.np_image.shape[: other.metadata.affine.dim]
+        return MedImg(
+            *resample_to_grid(
+                self.np_image, self.metadata, target_metadata, target_shape, order, fill_value, max_workers
+            )
+        )
+
+    def downsample(self, factors: int | Sequence[int], reduce: str = "mean") -> MedImg:
+        """
+        Downsample the image by reducing blocks of voxels (see medio.utils.resample.downsample), which unlike strided
+        slicing (mimg[::2, ::2, ::1]) does not alias:
+        >>> new_mimg = mimg.downsample((2, 2, 1))
+        :param factors: the block size, an integer for all the axes or an integer per spatial axis (1 keeps an axis)
+        :param reduce: 'mean', 'max' or 'mode' (the most frequent value, e.g. for labels)
+        """
+        return MedImg(*downsample(self.np_image, self.metadata, factors, reduce))
+
+    def patch_sampler(self, patch_shape: Sequence[int]) -> PatchSampler:
+        """
+        Sampler of patches of patch_shape of the image (see medio.medimg.patches), views or stacked batches with their
+        origins, without the indexing of __getitem__ per patch:
+        >>> patches = mimg.patch_sampler((64, 64, 32)).random(16)
+        >>> batch, origins = patches.batch(), patches.origins
+        """
+        return PatchSampler(self.np_image, self.metadata, patch_shape)
+
     def save(self, filename: str | os.PathLike[str], **kwargs: Any) -> None:
         save_img(filename, self.np_image, self.metadata, **kwargs)
 
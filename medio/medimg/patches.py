@@ -0,0 +1,189 @@
+"""
+Sampling of fixed-size patches of an image, e.g. for patch-based training. A sampler draws the start indices of many
+patches at once (on a grid, uniformly at random, or around voxels of chosen labels), and the Patches of the starts give
+zero-copy views of single patches, a stacked batch of all of them (gathered from a sliding_window_view of the image),
+and their origins, computed by a single Affine.index2coord of all the starts. The MetaData of a patch is created only
+when it is asked for.
+>>> sampler = PatchSampler(np_image, metadata, (64, 64, 32))
+>>> patches = sampler.random(16, rng=0)
+>>> batch = patches.batch()  # (16, 64, 64, 32)
+>>> patch, patch_metadata = patches[0], patches.metadata(0)
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from medio.metadata.metadata import MetaData
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Mapping, Sequence
+
+    from numpy.typing import NDArray
+
+
+class PatchSampler:
+    def __init__(self, np_image: NDArray[np.generic], metadata: MetaData[Any], patch_shape: Sequence[int]) -> None:
+        """
+        Sampler of patches of patch_shape of an image
+        :param np_image: the image, whose first metadata.affine.dim axes are spatial (other axes, e.g. channels, are
+        included whole in the patches)
+        :param metadata: the metadata of the image
+        :param patch_shape: the spatial shape of the patches
+        """
+        dim = metadata.affine.dim
+        patch_shape = tuple(int(p) for p in patch_shape)
+        if len(patch_shape) != dim:
+            raise ValueError(f"The patch shape {patch_shape} must be of {dim} dimensions like the image")
+        if any(p < 1 or p > n for p, n in zip(patch_shape, np_image.shape)):
+            raise ValueError(f"Invalid patch shape {patch_shape} for an image of shape {np_image.shape[:dim]}")
+        self.np_image = np_image
+        self.metadata = metadata
+        self.patch_shape = patch_shape
+        # the number of valid start indices along every spatial axis
+        self.start_shape = tuple(n - p + 1 for n, p in zip(np_image.shape, patch_shape))
+        self._label_key: tuple[Any, ...] | None = None
+        self._label_cache: tuple[NDArray[np.integer], NDArray[np.intp], NDArray[np.intp]] | None = None
+
+    def grid(self, stride: int | Sequence[int] | None = None) -> Patches:
+        """
+        Patches on a grid that covers the image, in C order of the starts
+        :param stride: the step between the patches, an integer for all the axes or an integer per axis, the patch
+        shape by default (non-overlapping patches). The last patch along every axis ends at the end of the image
+        """
+        strides = self.patch_shape if stride is None else np.broadcast_to(stride, len(self.patch_shape)).tolist()
+        if any(s < 1 for s in strides):
+            raise ValueError(f"The stride must be positive, got {stride}")
+        axes_starts = []
+        for n, s in zip(self.start_shape, strides):
+            starts = np.arange(0, n, s)
+            if starts[-1] != n - 1:
+                starts = np.append(starts, n - 1)
+            axes_starts.append(starts)
+        grid = np.meshgrid(*axes_starts, indexing="ij")
+        return Patches(self, np.stack([g.ravel() for g in grid], axis=1))
+
+    def random(self, n: int, rng: np.random.Generator | int | None = None) -> Patches:
+        """n patches at uniformly random positions in the image"""
+        rng = np.random.default_rng(rng)
+        return Patches(self, rng.integers(0, self.start_shape, size=(n, len(self.start_shape))))
+
+    def label_weighted(
+        self,
+        labels: NDArray[np.integer],
+        n: int,
+        weights: Mapping[int, float] | None = None,
+        rng: np.random.Generator | int | None = None,
+    ) -> Patches:
+        """
+        n patches centered (up to the edges of the image) at random voxels of random labels, e.g. to sample a small
+        structure as often as the background. The label of every patch is drawn by weights, and its center is drawn
+        uniformly from the voxels of the label
+        :param labels: the label map of the image, of its spatial shape
+        :param n: the number of patches, zero for no patches
+        :param weights: the relative frequency of the labels, all the labels of the label map equally by default. Labels
+        that are not in the label map are not sampled
+        :param rng: the random generator or seed
+        """
+        rng = np.random.default_rng(rng)
+        if labels.shape != self.np_image.shape[: len(self.patch_shape)]:
+            raise ValueError(f"The shape of the labels {labels.shape} is not the spatial shape of the image")
+        if n < 0:
+            raise ValueError(f"The number of patches must be non-negative, got {n}")
+        if n == 0:
+            return Patches(self, np.empty((0, len(self.start_shape)), dtype=np.intp))
+        values, counts, order = self._label_index(labels)
+        if weights is not None:
+            label_weights = np.array([weights.get(int(v), 0.0) for v in values], dtype=float)
+        else:
+            label_weights = np.ones(len(values))
+        if label_weights.sum() <= 0:
+            raise ValueError(f"None of the labels of the weights {weights} is in the label map")
+        label_counts = rng.multinomial(n, label_weights / label_weights.sum())
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        choices = np.concatenate(
+            [offsets[i] + rng.integers(0, counts[i], size=k) for i, k in enumerate(label_counts.tolist()) if k]
+        )
+        centers = np.stack(np.unravel_index(order[rng.permutation(choices)], labels.shape), axis=1)
+        starts = np.clip(centers - np.array(self.patch_shape) // 2, 0, np.array(self.start_shape) - 1)
+        return Patches(self, starts)
+
+    def _label_index(
+        self, labels: NDArray[np.integer]
+    ) -> tuple[NDArray[np.integer], NDArray[np.intp], NDArray[np.intp]]:
+        """
+        The labels of a label map, their voxel counts and the flat indices of the voxels sorted by label. It is cached
+        for the last label map, which is usually sampled repeatedly. The cache is keyed on the memory, the layout and a
+        checksum of the contents of the label map (much cheaper than the sort), so a label map modified in place is
+        indexed again
+        """
+        key = (
+            labels.__array_interface__["data"][0],
+            labels.shape,
+            labels.strides,
+            labels.dtype.str,
+            zlib.crc32(np.ascontiguousarray(labels).data),
+        )
+        cache = self._label_cache
+        if cache is None or self._label_key != key:
+            values, counts = np.unique(labels, return_counts=True)
+            cache = (values, counts, np.argsort(labels, axis=None, kind="stable"))
+            self._label_cache, self._label_key = cache, key
+        return cache
+
+
+class Patches:
+    def __init__(self, sampler: PatchSampler, starts: NDArray[np.integer]) -> None:
+        """
+        Patches of a sampler by their start indices
+        :param sampler: the PatchSampler of the image
+        :param starts: the start index of every patch, (N, dim)
+        """
+        self.sampler = sampler
+        self.starts = np.asarray(starts, dtype=np.intp)
+        self._origins: NDArray[np.floating] | None = None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> NDArray[np.generic]:
+        """A view of the i-th patch"""
+        return self.sampler.np_image[self.slices(i)]
+
+    def __iter__(self) -> Iterator[NDArray[np.generic]]:
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"Patches(n={len(self)}, patch_shape={self.sampler.patch_shape})"
+
+    def slices(self, i: int) -> tuple[slice, ...]:
+        """The index of the i-th patch in the image"""
+        return tuple(slice(s, s + p) for s, p in zip(self.starts[i].tolist(), self.sampler.patch_shape))
+
+    def batch(self) -> NDArray[np.generic]:
+        """All the patches stacked in a new array, (N, *patch_shape, *other_axes)"""
+        np_image = self.sampler.np_image
+        windows = sliding_window_view(
+            np_image, self.sampler.patch_shape + np_image.shape[len(self.sampler.patch_shape) :]
+        )
+        # the windows of the other axes are whole, so their start is 0
+        index = (*self.starts.T, *np.zeros((np_image.ndim - self.starts.shape[1], 1), dtype=np.intp))
+        return windows[index]
+
+    @property
+    def origins(self) -> NDArray[np.floating]:
+        """The world coordinates of the first voxel of every patch, (N, dim)"""
+        if self._origins is None:
+            self._origins = self.sampler.metadata.affine.index2coord(self.starts)
+        return self._origins
+
+    def metadata(self, i: int) -> MetaData[Any]:
+        """The metadata of the i-th patch"""
+        metadata = self.sampler.metadata
+        affine = metadata.affine.clone()
+        affine.origin = self.origins[i]
+        return MetaData(affine, metadata.orig_ornt, metadata.coord_sys)
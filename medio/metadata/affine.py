@@ -5,9 +5,14 @@ from typing import TYPE_CHECKING
 import numpy as np
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from typing import Any
+
     from numpy.typing import NDArray
     from typing_extensions import Self
 
+    from medio.metadata.metadata import MetaData
+
 
 class Affine(np.ndarray):
     """
@@ -19,6 +24,8 @@ class Affine(np.ndarray):
     >>> coord = affine2.index2coord(index)
     >>> print(coord)
     [-88.98  10.     4.41]
+    The spacing and direction are computed from the matrix when first accessed, and recomputed after the matrix is set
+    by item assignment or by the setters (but not after in-place arithmetic, e.g. affine *= 2)
     """
 
     # keys for the origin and M matrix parts in the affine matrix
@@ -57,18 +64,32 @@ class Affine(np.ndarray):
         spacing: NDArray[np.floating] | list[float] | None = None,
         origin: NDArray[np.floating] | list[float] | float | None = None,
     ) -> None:
-        self.dim = self.shape[0] - 1
         if affine is None:
             self._spacing = np.asarray(spacing)
             self._direction = np.asarray(direction)
-        else:
-            # TODO: reconsider calculating it here
-            self._spacing = self.affine2spacing(self)
-            self._direction = self.affine2direction(self, self.spacing)
 
-    def index2coord(self, index_vector: NDArray[np.floating] | list[int]) -> NDArray[np.floating]:
-        """Return y according to y = M*x + b"""
-        return self._m_matrix @ index_vector + self.origin
+    def __array_finalize__(self, obj: object) -> None:
+        # the spacing and direction are computed lazily from the matrix, and reset whenever it is set
+        self._spacing: NDArray[np.floating] | None = None
+        self._direction: NDArray[np.floating] | None = None
+
+    def index2coord(self, index_vector: NDArray[np.number] | list[int]) -> NDArray[np.floating]:
+        """Return y according to y = M*x + b, for an index vector of length d or an (N, d) array of index vectors"""
+        index_vector = np.asarray(index_vector)
+        if index_vector.ndim == 1:
+            return self._m_matrix @ index_vector + self.origin
+        return index_vector @ self._m_matrix.T + self.origin
+
+    def coord2index(self, coord_vector: NDArray[np.floating] | list[float]) -> NDArray[np.floating]:
+        """
+        Return x according to x = M^-1*(y - b), for a coordinates vector of length d or an (N, d) array of them. The
+        indices are continuous, round them for the nearest voxels
+        """
+        coord_vector = np.asarray(coord_vector)
+        inv_m_matrix = np.linalg.inv(self._m_matrix)
+        if coord_vector.ndim == 1:
+            return inv_m_matrix @ (coord_vector - self.origin)
+        return (coord_vector - self.origin) @ inv_m_matrix.T
 
     def __matmul__(self, other: NDArray[np.floating]) -> NDArray[np.floating]:
         return super().__matmul__(other).view(np.ndarray)
@@ -76,9 +97,45 @@ class Affine(np.ndarray):
     def __getitem__(self, item: object) -> NDArray[np.floating]:
         return super().__getitem__(item).view(np.ndarray)
 
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        self._spacing = None
+        self._direction = None
+
     def clone(self) -> Self:
         return Affine(self.copy())  # type: ignore[return-value]
 
+    def negate_xy(self) -> None:
+        """
+        Negate the x and y world axes (the first two rows) in place, which converts the affine between the itk and
+        nibabel conventions (see medio.metadata.convert_nib_itk). The spacing is unchanged and kept cached
+        """
+        spacing, direction = self._spacing, self._direction
+        rows = self.view(np.ndarray)[:2]
+        np.negative(rows, out=rows)
+        self._spacing = spacing
+        if direction is not None:
+            # the cached direction may be referenced outside, so it is not negated in place
+            direction = direction.copy()
+            direction[:2] *= -1
+        self._direction = direction
+
+    # Serialization: the default ndarray pickling drops the instance attributes (spacing, direction and dim)
+    def __reduce__(self) -> tuple[Callable[[bytes], Affine], tuple[bytes]]:
+        return Affine.from_bytes, (self.to_bytes(),)
+
+    def to_bytes(self) -> bytes:
+        """The matrix as float64 bytes in C order"""
+        return np.asarray(self, dtype=np.float64).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Affine:
+        """The Affine of bytes of a (d+1)x(d+1) float64 matrix (see to_bytes)"""
+        size = round((len(data) // 8) ** 0.5)
+        if size * size * 8 != len(data):
+            raise ValueError(f"Invalid affine bytes of length {len(data)}, should be of a square float64 matrix")
+        return cls(np.frombuffer(data, dtype=np.float64).reshape(size, size).copy())
+
     # Affine properties in addition to the numpy array
     @property
     def origin(self) -> NDArray[np.floating]:
@@ -86,27 +143,40 @@ class Affine(np.ndarray):
 
     @origin.setter
     def origin(self, value: NDArray[np.floating] | list[float] | list[int] | float) -> None:
-        self[self._origin_key] = value
+        # the origin does not affect the spacing and direction
+        super().__setitem__(self._origin_key, value)
+
+    @property
+    def dim(self) -> int:
+        return self.shape[0] - 1
 
     @property
     def spacing(self) -> NDArray[np.floating]:
+        if self._spacing is None:
+            self._spacing = self.affine2spacing(self)
         return self._spacing
 
     @spacing.setter
     def spacing(self, value: NDArray[np.floating] | list[float]) -> None:
         value = np.asarray(value)
-        self._m_matrix = self._m_matrix @ np.diag(value / self._spacing)
-        # the spacing must be positive (or at least nonnegative)
+        direction = self._direction
+        self._m_matrix = self._m_matrix @ np.diag(value / self.spacing)
+        # the spacing must be positive (or at least nonnegative), a negative spacing flips the direction
         self._spacing = np.abs(value)
+        self._direction = direction if (value >= 0).all() else None
 
     @property
     def direction(self) -> NDArray[np.floating]:
+        if self._direction is None:
+            self._direction = self.affine2direction(self, self.spacing)
         return self._direction
 
     @direction.setter
     def direction(self, value: NDArray[np.floating]) -> None:
         value = np.asarray(value)
-        self._m_matrix = value @ np.diag(self.spacing)
+        spacing = self.spacing
+        self._m_matrix = value @ np.diag(spacing)
+        self._spacing = spacing
         self._direction = value
 
     # Internal property - m matrix
@@ -160,3 +230,88 @@ class Affine(np.ndarray):
             spacing,
             Affine.affine2origin(affine),
         )
+
+
+class AffineStack:
+    """
+    A stack of K (d+1)x(d+1) affine matrices of the same dimension, for mapping indices and coordinates with many
+    affines at once, e.g. landmarks or patch centres across a dataset of scans:
+    >>> stack = AffineStack.from_metadata(metadata_list)
+    >>> coords = stack.index2coord(indices)  # indices (N, d) -> coords (K, N, d), each affine applied to all indices
+    >>> coords = stack.index2coord(indices[:, None])  # indices (K, 1, d) -> coords (K, 1, d), one index per affine
+    """
+
+    def __init__(self, affines: NDArray[np.floating] | Iterable[NDArray[np.floating]]) -> None:
+        """
+        :param affines: a (K, d+1, d+1) array or an iterable of (d+1)x(d+1) affine matrices (e.g. Affine objects)
+        """
+        matrices = np.asarray(affines if isinstance(affines, np.ndarray) else list(affines), dtype=np.float64)
+        if matrices.ndim != 3 or matrices.shape[1] != matrices.shape[2]:
+            raise ValueError(f"Invalid affines of shape {matrices.shape}, should be (K, d+1, d+1)")
+        self.matrices = matrices
+
+    @classmethod
+    def from_metadata(cls, metadata: Iterable[MetaData[Any]]) -> AffineStack:
+        """The stack of the affines of metadata objects (in their coordinate systems, which should be the same)"""
+        return cls([meta.affine for meta in metadata])
+
+    @property
+    def dim(self) -> int:
+        return self.matrices.shape[1] - 1
+
+    def __len__(self) -> int:
+        return len(self.matrices)
+
+    def __getitem__(self, item: int) -> Affine:
+        return Affine(self.matrices[item].copy())
+
+    def __iter__(self) -> Iterator[Affine]:
+        return (Affine(matrix.copy()) for matrix in self.matrices)
+
+    def __repr__(self) -> str:
+        return f"AffineStack({len(self)} affines of dimension {self.dim})"
+
+    @property
+    def origin(self) -> NDArray[np.floating]:
+        """(K, d) origins"""
+        return self.matrices[:, :-1, -1]
+
+    @property
+    def spacing(self) -> NDArray[np.floating]:
+        """(K, d) spacings"""
+        return np.linalg.norm(self.matrices[:, :-1, :-1], axis=1)
+
+    @property
+    def direction(self) -> NDArray[np.floating]:
+        """(K, d, d) direction matrices"""
+        return self.matrices[:, :-1, :-1] / self.spacing[:, None, :]
+
+    def inv(self) -> AffineStack:
+        """The stack of the inverse affines, which map coordinates to indices"""
+        return AffineStack(np.linalg.inv(self.matrices))
+
+    def __matmul__(self, other: AffineStack | NDArray[np.floating]) -> AffineStack:
+        """Compose with another stack of the same length or with a single (d+1)x(d+1) matrix"""
+        other_matrices = other.matrices if isinstance(other, AffineStack) else np.asarray(other)
+        return AffineStack(self.matrices @ other_matrices)
+
+    def index2coord(self, indices: NDArray[np.floating] | list[float]) -> NDArray[np.floating]:
+        """
+        Map indices with every affine: (d,) -> (K, d), (N, d) -> (K, N, d) (every affine with all the indices), and
+        (K, N, d) -> (K, N, d) (every affine with its own indices)
+        """
+        return self._apply(self.matrices, indices)
+
+    def coord2index(self, coords: NDArray[np.floating] | list[float]) -> NDArray[np.floating]:
+        """Map coordinates to continuous indices with every affine, with the shapes of index2coord"""
+        return self._apply(np.linalg.inv(self.matrices), coords)
+
+    @staticmethod
+    def _apply(matrices: NDArray[np.floating], points: NDArray[np.floating] | list[float]) -> NDArray[np.floating]:
+        points = np.asarray(points)
+        single = points.ndim == 1
+        if single:
+            points = points[None]
+        # (N, d) @ (K, d, d) and (K, N, d) @ (K, d, d) are both (K, N, d)
+        result = points @ matrices[:, :-1, :-1].transpose(0, 2, 1) + matrices[:, None, :-1, -1]
+        return result[:, 0] if single else result
@@ -30,6 +30,7 @@ Works both ways: itk -> nib and nib -> itk, the usage is the same:
 
 from __future__ import annotations
 
+import functools
 from typing import TYPE_CHECKING, overload
 
 import numpy as np
@@ -62,10 +63,12 @@ def inv_axcodes(axcodes: str | None) -> str | None:
     """Inverse axes codes chars, for example: SPL -> IAR"""
     if axcodes is None:
         return None
-    new_axcodes = ""
-    for code in axcodes:
-        new_axcodes += axes_inv[code]
-    return new_axcodes
+    return _inv_axcodes(axcodes)
+
+
+@functools.lru_cache(maxsize=1024)
+def _inv_axcodes(axcodes: str) -> str:
+    return "".join([axes_inv[code] for code in axcodes])
 
 
 AffineOrNdarray = TypeVar("AffineOrNdarray", Affine, NDArray[np.floating])
@@ -0,0 +1,66 @@
+"""
+The header of MetaData as read by the backends with header=True: a read-only mapping of the keys of the backend's
+header (NIfTI fields, DICOM tags, ITK metadata dictionary entries) whose values are decoded only when they are accessed,
+so reading a file with a header of hundreds of entries costs only its keys until a few of them are used. header_tags
+selects the keys to include.
+>>> _, metadata = read_img('scan.dcm', header=True, header_tags=['PatientID', 'SeriesDescription'])
+>>> metadata.header['(0010,0020)']
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+
+class LazyHeader(Mapping[str, object]):
+    __slots__ = ("_getter", "_keys", "_values")
+
+    def __init__(
+        self, keys: Iterable[str], getter: Callable[[str], object], header_tags: Iterable[str] | None = None
+    ) -> None:
+        """
+        A header whose values are decoded by getter when they are accessed, and cached. It is pickled and deep-copied
+        as a dict of all its values
+        :param keys: the keys of the header, in order
+        :param getter: the function that decodes the value of a key
+        :param header_tags: if not None, only these keys (of keys) are included
+        """
+        if header_tags is not None:
+            included = set(header_tags)
+            keys = (key for key in keys if key in included)
+        # an ordered set of the keys
+        self._keys = dict.fromkeys(keys)
+        self._getter = getter
+        self._values: dict[str, object] = {}
+
+    def __getitem__(self, key: str) -> object:
+        if key not in self._keys:
+            raise KeyError(key)
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = self._getter(key)
+            return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __repr__(self) -> str:
+        return f"LazyHeader({len(self)} keys, {len(self._values)} decoded)"
+
+    def to_dict(self) -> dict[str, object]:
+        """A dict of all the values of the header, which are decoded"""
+        return {key: self[key] for key in self._keys}
+
+    def __reduce__(self) -> tuple[type[dict[str, object]], tuple[dict[str, object]]]:
+        return dict, (self.to_dict(),)
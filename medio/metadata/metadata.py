@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+import pickle
 import pprint
+import struct
+from collections.abc import Mapping
 from copy import deepcopy
 from typing import TYPE_CHECKING, Any, Generic, Literal, cast
 
 import numpy as np
-from nibabel import aff2axcodes
 
 from medio.metadata.affine import Affine
-from medio.metadata.convert_nib_itk import convert_affine, convert_nib_itk, inv_axcodes
+from medio.metadata.convert_nib_itk import inv_axcodes
+from medio.metadata.ornt_tables import affine2axcodes
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from numpy.typing import NDArray
     from typing_extensions import Self, TypeVar
 
@@ -20,12 +25,27 @@ else:
 
     H = TypeVar("H")
 
-HeaderDict = dict[str, object]
+# the header of the backends (see medio.metadata.header.LazyHeader)
+HeaderDict = Mapping[str, object]
 CoordSys = Literal["itk", "nib"]
 
+# MetaData.to_bytes layout: magic, version, dim, coord_sys index, number of spatial_shape dims (255 for None), whether a
+# header follows, then the orientation and original orientation (dim ASCII letters each, zeros for None), the
+# (dim+1)x(dim+1) float64 affine, the int64 spatial_shape and the pickled header
+_BYTES_MAGIC = b"MDM"
+_BYTES_VERSION = 1
+_BYTES_PREFIX = struct.Struct("<3sBBBB?")
+_COORD_SYSTEMS: tuple[CoordSys, ...] = ("itk", "nib")
+_NO_SHAPE = 255
+_INV_Z_AXCODES = str.maketrans("SI", "IS")
+
 
 class MetaData(Generic[H]):
-    affine: Affine
+    __slots__ = ("_affine", "_ornt", "_owns_affine", "coord_sys", "header", "orig_ornt", "spatial_shape")
+
+    _affine: Affine
+    # whether the affine is referenced only by this metadata, and can be converted in place
+    _owns_affine: bool
     orig_ornt: str | None
     coord_sys: CoordSys
     header: H | None
@@ -42,21 +62,33 @@ class MetaData(Generic[H]):
     ) -> None:
         """
         Initialize medical image's metadata
-        :param affine: affine matrix of class Affine, numpy float array of shape (4, 4)
+        :param affine: affine matrix of class Affine, or numpy float array of shape (4, 4) which is copied
         :param orig_ornt: orientation string code, str of length 3 or None (was not computed because the image was not
         reoriented)
         :param coord_sys: 'itk' or 'nib', the coordinate system of the given affine and orientation: itk or nib (nifti)
         :param header: additional metadata dictionary with string keys
         """
-        if not isinstance(affine, Affine):
-            affine = Affine(affine)
-        self.affine = affine
+        if isinstance(affine, Affine):
+            self.affine = affine
+        else:
+            self._affine = Affine(np.array(affine))
+            self._owns_affine = True
         self.orig_ornt = orig_ornt
         self._ornt = None
         self.coord_sys = self.check_valid_coord_sys(coord_sys)
         self.header = header
         self.spatial_shape = spatial_shape
 
+    @property
+    def affine(self) -> Affine:
+        return self._affine
+
+    @affine.setter
+    def affine(self, affine: Affine) -> None:
+        # the affine may be referenced elsewhere (by the caller or by other metadata), so it is not converted in place
+        self._affine = affine
+        self._owns_affine = False
+
     @staticmethod
     def check_valid_coord_sys(coord_sys: str) -> CoordSys:
         if coord_sys not in ("itk", "nib"):
@@ -80,14 +112,36 @@ class MetaData(Generic[H]):
 
     def convert(self, dest_coord_sys: CoordSys) -> None:
         """
-        Converts the metadata coordinate system in-place to dest_coord_sys. Affects affine, ornt and orig_ornt
+        Converts the metadata coordinate system in-place to dest_coord_sys. Affects affine, ornt and orig_ornt.
+        An affine which was set by the caller is replaced by a converted copy, and afterwards the copy is converted in
+        place (negating its first two rows)
         :param dest_coord_sys: the destination coordinate system - 'itk' or 'nib' (nifti)
         """
         MetaData.check_valid_coord_sys(dest_coord_sys)  # runtime validation
         if dest_coord_sys != self.coord_sys:
-            self.affine, self._ornt, self.orig_ornt = convert_nib_itk(self.affine, self._ornt, self.orig_ornt)
+            if not self._owns_affine:
+                self._affine = self._affine.copy()
+                self._owns_affine = True
+            self._affine.negate_xy()
+            self._ornt = inv_axcodes(self._ornt)
+            self.orig_ornt = inv_axcodes(self.orig_ornt)
             self.coord_sys = dest_coord_sys
 
+    def in_coord_sys(self, coord_sys: CoordSys) -> Self:
+        """
+        The metadata in coord_sys without modifying it: self if it is already in coord_sys, otherwise a converted copy
+        with a copy of the affine and the same header object. Unlike converting there and back, it is safe when the
+        metadata is used concurrently
+        """
+        MetaData.check_valid_coord_sys(coord_sys)
+        if coord_sys == self.coord_sys:
+            return self
+        converted = type(self)(self.affine.copy(), self.orig_ornt, self.coord_sys, self.header, self.spatial_shape)
+        converted._ornt = self._ornt
+        converted._owns_affine = True
+        converted.convert(coord_sys)
+        return converted
+
     def clone(self) -> Self:
         cloned = MetaData(
             affine=self.affine.clone(),
@@ -98,12 +152,77 @@ class MetaData(Generic[H]):
         )
         return cloned  # type: ignore[return-value]
 
+    def without_header(self) -> Self:
+        """A copy without the header, which is cheap to pickle and send to workers"""
+        stripped = type(self)(self.affine.copy(), self.orig_ornt, self.coord_sys, spatial_shape=self.spatial_shape)
+        stripped._ornt = self._ornt
+        stripped._owns_affine = True
+        return stripped
+
+    # Serialization: compact bytes of the affine, orientations, coord_sys and spatial_shape, with the pickled header
+    def __reduce__(self) -> tuple[Callable[[bytes], MetaData[Any]], tuple[bytes]]:
+        return MetaData.from_bytes, (self.to_bytes(),)
+
+    def to_bytes(self, header: bool = True) -> bytes:
+        """
+        Serialize the metadata, see from_bytes
+        :param header: whether to include the header (pickled), otherwise it is restored as None
+        """
+        dim = self.affine.dim
+        spatial_shape = () if self.spatial_shape is None else tuple(self.spatial_shape)
+        include_header = header and self.header is not None
+        return b"".join(
+            (
+                _BYTES_PREFIX.pack(
+                    _BYTES_MAGIC,
+                    _BYTES_VERSION,
+                    dim,
+                    _COORD_SYSTEMS.index(self.coord_sys),
+                    _NO_SHAPE if self.spatial_shape is None else len(spatial_shape),
+                    include_header,
+                ),
+                _encode_ornt(self._ornt, dim),
+                _encode_ornt(self.orig_ornt, dim),
+                self.affine.to_bytes(),
+                struct.pack(f"<{len(spatial_shape)}q", *spatial_shape),
+                pickle.dumps(self.header, protocol=pickle.HIGHEST_PROTOCOL) if include_header else b"",
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> MetaData[Any]:
+        """Deserialize metadata of MetaData.to_bytes"""
+        magic, version, dim, coord_sys, n_shape, has_header = _BYTES_PREFIX.unpack_from(data)
+        if magic != _BYTES_MAGIC or version != _BYTES_VERSION:
+            raise ValueError(f"Invalid MetaData bytes (magic {magic!r}, version {version})")
+        offset = _BYTES_PREFIX.size
+        ornt, orig_ornt = _decode_ornt(data[offset : offset + dim]), _decode_ornt(data[offset + dim : offset + 2 * dim])
+        offset += 2 * dim
+        affine_end = offset + 8 * (dim + 1) ** 2
+        affine = Affine.from_bytes(data[offset:affine_end])
+        spatial_shape = None
+        if n_shape != _NO_SHAPE:
+            spatial_shape = struct.unpack_from(f"<{n_shape}q", data, affine_end)
+        offset = affine_end + 8 * (0 if n_shape == _NO_SHAPE else n_shape)
+        metadata = cls(
+            affine,
+            orig_ornt=orig_ornt,
+            coord_sys=_COORD_SYSTEMS[coord_sys],
+            header=pickle.loads(data[offset:]) if has_header else None,
+            spatial_shape=spatial_shape,
+        )
+        metadata._ornt = ornt
+        metadata._owns_affine = True
+        return metadata
+
     def get_ornt(self) -> str:
         """Returns current orientation based on the affine and coordinate system"""
+        axcodes = affine2axcodes(self.affine)
         if self.coord_sys == "nib":
-            return "".join(aff2axcodes(self.affine))
-        else:  # "itk"
-            return inv_axcodes("".join(aff2axcodes(convert_affine(self.affine))))
+            return axcodes
+        # itk: converting the affine flips the x and y axes codes and inverting the codes flips them back, so only the
+        # z axis code is inverted
+        return axcodes.translate(_INV_Z_AXCODES)
 
     @property
     def ornt(self) -> str:
@@ -128,6 +247,18 @@ class MetaData(Generic[H]):
         return np.linalg.det(self.affine.direction) > 0
 
 
+def _encode_ornt(ornt: str | None, dim: int) -> bytes:
+    if ornt is None:
+        return bytes(dim)
+    if len(ornt) != dim:
+        raise ValueError(f'Invalid orientation "{ornt}" of a {dim}d affine')
+    return ornt.encode("ascii")
+
+
+def _decode_ornt(data: bytes) -> str | None:
+    return None if not data.strip(b"\0") else data.decode("ascii")
+
+
 def is_right_handed_axcodes(axcodes: str) -> bool:
     if len(axcodes) == 2:
         return True
@@ -0,0 +1,127 @@
+"""
+Precomputed lookup tables of the reorientations between the 48 orientations (axis codes) of a 3d image, replacing
+the per-call orientation math of nibabel (io_orientation, ornt_transform and inv_ornt_aff).
+The tables are in nibabel's orientation convention (see medio.metadata.convert_nib_itk), and are indexed by
+[start, end] orientation indices (AXCODES_INDEX):
+- TRANSFORMS: the nibabel ornt_transform of the reorientation (3x2)
+- TRANSPOSES: the axes of the start array in the order of the reoriented array, after flipping FLIPS
+- FLIPS: whether the start array axes are flipped
+- REORIENT_AFFINES: the affine of the reoriented indices in the start indices (nibabel's inv_ornt_aff), without the
+  translation of the flipped axes, which depends on the image shape
+>>> new_affine, new_shape = reorient_affine(affine, shape, "RAS")
+>>> new_array = reorient_array(array, affine2axcodes(affine), "RAS")
+"""
+
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING
+
+import numpy as np
+from nibabel.orientations import aff2axcodes
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+# the letters of the positive and negative ends of the world axes, and the letter of every axis end
+_AXIS_LETTERS = (("R", "L"), ("A", "P"), ("S", "I"))
+_LETTER_ORNT = {
+    letter: (axis, 1 - 2 * negative)
+    for axis, letters in enumerate(_AXIS_LETTERS)
+    for negative, letter in enumerate(letters)
+}
+# the minimal dominance of an axis in a direction column (cosine with the world axis) for the fast orientation, below
+# it (oblique affines) nibabel's io_orientation is used
+_MIN_AXIS_COSINE = 0.8
+
+AXCODES: tuple[str, ...] = tuple(
+    "".join(axcodes)
+    for axcodes in itertools.chain(*map(itertools.permutations, itertools.product(("R", "L"), ("A", "P"), ("I", "S"))))
+)
+AXCODES_INDEX: dict[str, int] = {axcodes: i for i, axcodes in enumerate(AXCODES)}
+# nibabel ornt arrays (world axis and flip of every array axis) of the orientations, (48, 3, 2)
+ORNTS = np.array([[_LETTER_ORNT[letter] for letter in axcodes] for axcodes in AXCODES])
+
+
+def _build_tables() -> tuple[NDArray[np.int64], NDArray[np.intp], NDArray[np.bool_], NDArray[np.float64]]:
+    n = len(AXCODES)
+    start_axes, start_flips = ORNTS[:, None, :, 0], ORNTS[:, None, :, 1]
+    # the array axis of every world axis in the end orientations, (48, 3)
+    end_axis_of_world = np.argsort(ORNTS[:, :, 0], axis=1)
+    end_axes = np.take_along_axis(
+        np.broadcast_to(end_axis_of_world[None], (n, n, 3)), np.broadcast_to(start_axes, (n, n, 3)), axis=2
+    )
+    end_flips = np.take_along_axis(np.broadcast_to(ORNTS[None, :, :, 1], (n, n, 3)), end_axes, axis=2)
+    transforms = np.stack([end_axes, start_flips * end_flips], axis=-1)
+    flips = transforms[..., 1] == -1
+    transposes = np.argsort(transforms[..., 0], axis=-1)
+    # inv_ornt_aff: the flips (diagonal) after the reordering of the rows of the identity
+    affines = np.zeros((n, n, 4, 4))
+    affines[..., :3, :3] = np.eye(3)[transforms[..., 0]] * transforms[..., 1, None]
+    affines[..., 3, 3] = 1
+    return transforms, transposes, flips, affines
+
+
+TRANSFORMS, TRANSPOSES, FLIPS, REORIENT_AFFINES = _build_tables()
+
+
+def ornt_index(axcodes: str | tuple[str, ...]) -> int:
+    """The index of a 3d orientation in the tables, e.g. 'RAS' or ('R', 'A', 'S')"""
+    try:
+        return AXCODES_INDEX["".join(axcodes)]
+    except KeyError:
+        raise ValueError(f'Invalid orientation: "{"".join(axcodes)}"') from None
+
+
+def affine2axcodes(affine: NDArray[np.floating]) -> str:
+    """
+    The orientation of an affine in nibabel's convention, like nibabel.aff2axcodes. For a 3d affine whose every axis
+    is close to a world axis it is computed directly, otherwise with nibabel
+    """
+    affine = np.asarray(affine)
+    if affine.shape != (4, 4):
+        return "".join(aff2axcodes(affine))
+    m_matrix = affine[:3, :3]
+    norms = np.sqrt((m_matrix * m_matrix).sum(axis=0))
+    if not norms.all():
+        return "".join(aff2axcodes(affine))
+    cosines = m_matrix / norms
+    world_axes = np.abs(cosines).argmax(axis=0)
+    dominant = cosines[world_axes, (0, 1, 2)]
+    if np.abs(dominant).min() < _MIN_AXIS_COSINE or len(set(world_axes.tolist())) != 3:
+        return "".join(aff2axcodes(affine))
+    return "".join(_AXIS_LETTERS[axis][int(cosine < 0)] for axis, cosine in zip(world_axes.tolist(), dominant))
+
+
+def ornt_transform(start: str | tuple[str, ...], end: str | tuple[str, ...]) -> NDArray[np.int64]:
+    """The nibabel ornt_transform from the start to the end orientation"""
+    return TRANSFORMS[ornt_index(start), ornt_index(end)]
+
+
+def reorient_affine(
+    affine: NDArray[np.floating], shape: tuple[int, ...], end: str | tuple[str, ...]
+) -> tuple[NDArray[np.floating], tuple[int, ...]]:
+    """
+    Reorient a 3d affine (nibabel convention) and the spatial shape of its image to the end orientation
+    :param affine: 4x4 affine matrix
+    :param shape: the spatial shape of the image in the affine's orientation (x, y, z)
+    :param end: the destination orientation, e.g. 'LPI' or ('L', 'P', 'I')
+    :return: the reoriented affine and spatial shape
+    """
+    i, j = ornt_index(affine2axcodes(affine)), ornt_index(end)
+    reorient = REORIENT_AFFINES[i, j].copy()
+    reorient[:3, 3] = (np.asarray(shape[:3]) - 1) * FLIPS[i, j]
+    return affine @ reorient, tuple(shape[axis] for axis in TRANSPOSES[i, j])
+
+
+def reorient_array(
+    array: NDArray[np.generic], start: str | tuple[str, ...], end: str | tuple[str, ...]
+) -> NDArray[np.generic]:
+    """
+    Reorient the first 3 axes of array from the start to the end orientation (like nibabel's apply_orientation), as a
+    view of array
+    """
+    i, j = ornt_index(start), ornt_index(end)
+    flips = tuple(slice(None, None, -1) if flip else slice(None) for flip in FLIPS[i, j])
+    transpose = (*TRANSPOSES[i, j].tolist(), *range(3, array.ndim))
+    return array[flips].transpose(transpose)
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+import numpy as np
 from pydicom.dataset import FileDataset
 
 if TYPE_CHECKING:
+    from numpy.typing import NDArray
     from pydicom.valuerep import DSfloat
 
 
@@ -59,6 +61,41 @@ class MultiFrameFileDataset(FileDataset):
         """Return a list of the slices' position"""
         return [seq.PlanePositionSequence[0].ImagePositionPatient for seq in self.PerFrameFunctionalGroupsSequence]
 
+    def frame_positions(self) -> NDArray[np.float64]:
+        """
+        Return the positions (ImagePositionPatient) of all the frames as a (NumberOfFrames, 3) array.
+        The per-frame functional groups are traversed once, and the result is cached on the dataset
+        """
+        positions = self.__dict__.get("_frame_positions")
+        if positions is None:
+            positions = np.array(
+                [seq.PlanePositionSequence[0].ImagePositionPatient for seq in self.PerFrameFunctionalGroupsSequence],
+                dtype=np.float64,
+            ).reshape(-1, 3)
+            positions.flags.writeable = False
+            self.__dict__["_frame_positions"] = positions
+        return positions
+
+    def frame_orientations(self) -> NDArray[np.float64]:
+        """
+        Return the orientations (ImageOrientationPatient) of all the frames as a (NumberOfFrames, 6) array.
+        Frames without a per-frame plane orientation get the shared one. The result is cached on the dataset
+        """
+        orientations = self.__dict__.get("_frame_orientations")
+        if orientations is None:
+            orientations = np.array(
+                [
+                    seq.PlaneOrientationSequence[0].ImageOrientationPatient
+                    if "PlaneOrientationSequence" in seq
+                    else self.ImageOrientationPatient
+                    for seq in self.PerFrameFunctionalGroupsSequence
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 6)
+            orientations.flags.writeable = False
+            self.__dict__["_frame_orientations"] = orientations
+        return orientations
+
     def slice_position(self, index: int) -> list[DSfloat]:
         """Return the slice position according to the slice index"""
         return self.PerFrameFunctionalGroupsSequence[index].PlanePositionSequence[0].ImagePositionPatient
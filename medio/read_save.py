@@ -1,29 +1,44 @@
 from __future__ import annotations
 
+import logging
+from functools import partial
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Literal, overload
+from typing import TYPE_CHECKING, Any, Callable, Literal, TypeVar, overload
 
+from medio.backends.chunk_io import ChunkIO
+from medio.backends.cost_model import AUTO_FAST, select_backends
 from medio.backends.itk_io import ItkIO
 from medio.backends.nib_io import NibIO
 from medio.backends.pdcm_io import PdcmIO
+from medio.instrument import instrumented, stage
 from medio.metadata.convert_nib_itk import inv_axcodes
-from medio.utils.files import is_nifti
+from medio.utils.channels import move_channels
+from medio.utils.files import is_chunked, is_file_sequence, is_nifti, is_path
+from medio.utils.resample import downsample as downsample_img
+from medio.utils.resample import resample_spacing
 
 if TYPE_CHECKING:
     import os
+    from collections.abc import Sequence
 
     import numpy as np
     from numpy.typing import NDArray
 
     from medio.metadata.metadata import CoordSys, HeaderDict, MetaData
 
-ReadBackend = Literal["itk", "nib", "pdcm", "pydicom"]
-WriteBackend = Literal["itk", "nib"]
+logger = logging.getLogger(__name__)
+
+ReadBackend = Literal["itk", "nib", "pdcm", "pydicom", "chunk", "auto-fast"]
+WriteBackend = Literal["itk", "nib", "chunk"]
+T = TypeVar("T")
+
+FILE_SEQUENCE_ERROR = 'A sequence of files (the slices of a DICOM series) is read by the "itk" and "pdcm" backends'
+EMPTY_FILE_SEQUENCE_ERROR = "The sequence of files is empty, it must contain the slices of a DICOM series"
 
 
 @overload
 def read_img(
-    input_path: str | os.PathLike[str],
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
     desired_ornt: str | None = ...,
     backend: ReadBackend | None = ...,
     dtype: np.dtype[np.generic] | type | None = ...,
@@ -31,39 +46,54 @@ def read_img(
     header: Literal[True],
     channels_axis: int | None = ...,
     coord_sys: CoordSys | None = ...,
+    target_spacing: float | Sequence[float | None] | None = ...,
+    downsample: int | Sequence[int] | None = ...,
+    downsample_reduce: str = ...,
     **kwargs: Any,
 ) -> tuple[NDArray[np.generic], MetaData[HeaderDict]]: ...
 
 
 @overload
 def read_img(
-    input_path: str | os.PathLike[str],
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
     desired_ornt: str | None = ...,
     backend: ReadBackend | None = ...,
     dtype: np.dtype[np.generic] | type | None = ...,
     header: bool = ...,
     channels_axis: int | None = ...,
     coord_sys: CoordSys | None = ...,
+    target_spacing: float | Sequence[float | None] | None = ...,
+    downsample: int | Sequence[int] | None = ...,
+    downsample_reduce: str = ...,
     **kwargs: Any,
 ) -> tuple[NDArray[np.generic], MetaData[object]]: ...
 
 
+@instrumented("read_img")
 def read_img(
-    input_path: str | os.PathLike[str],
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
     desired_ornt: str | None = None,
     backend: ReadBackend | None = None,
     dtype: np.dtype[np.generic] | type | None = None,
     header: bool = False,
     channels_axis: int | None = -1,
     coord_sys: CoordSys | None = "itk",
+    target_spacing: float | Sequence[float | None] | None = None,
+    downsample: int | Sequence[int] | None = None,
+    downsample_reduce: str = "mean",
     **kwargs: Any,
 ) -> tuple[NDArray[np.generic], MetaData[object] | MetaData[HeaderDict]]:
     """
     Read medical image with nibabel or itk
-    :param input_path: str or os.PathLike, the input path of image file or a directory containing dicom series
+    :param input_path: str or os.PathLike, the input path of image file or a directory containing dicom series, or a
+    sequence of the files of a dicom series (read by the itk and pdcm backends, with a presorted=True kwarg if they are
+    sorted), which are read without discovering, grouping and sorting the files of a directory
     :param desired_ornt: optional parameter for reorienting the image to a desired orientation, e.g. 'RAS'.
     The desired_ornt string is in the convention of `coord_sys` argument (itk by default).
-    :param backend: optional parameter for setting the reader backend: 'itk', 'nib', 'pdcm' (also 'pydicom') or None
+    :param backend: optional parameter for setting the reader backend: 'itk', 'nib', 'pdcm' (also 'pydicom'), 'chunk'
+    (medio chunked volume files, see medio.backends.chunk_io), None (nib for NIfTI, chunk for .mvc, itk otherwise) or
+    'auto-fast' - the backend with the lowest estimated cost for the input and the options, falling back to the next
+    backend on failure (see medio.backends.cost_model)
     :param dtype: equivalent to np_image.astype(dtype) if dtype is not None
     :param header: if True, the returned metadata will include a header attribute with additional metadata dictionary as
     read by the backend. Note: currently, this is supported for files only
@@ -72,14 +102,45 @@ def read_img(
     :param coord_sys: the coordinate system (or convention) of the `desired_ornt` parameter and the returned metadata.
     It can be 'itk', 'nib' or None, and is 'itk' by default.
     None means that the backend will determine coord_sys, but it can lead to a backend-dependent array and metadata
+    :param target_spacing: if not None, resample the (reoriented) image to this spacing with linear interpolation, a
+    number for all the axes or a number per axis (None keeps the axis), see medio.utils.resample.resample_spacing
+    :param downsample: if not None, downsample the (reoriented) image by reducing blocks of these factors, an integer
+    for all the axes or an integer per axis, see medio.utils.resample.downsample. The nib backend downsamples the slabs
+    of the image while decoding them, without holding the full resolution image
+    :param downsample_reduce: the reduction of the downsampling blocks: 'mean', 'max' or 'mode' (e.g. for labels)
     :return: numpy image and metadata object
     """
+    if is_file_sequence(input_path) and len(input_path) == 0:
+        raise ValueError(EMPTY_FILE_SEQUENCE_ERROR)
+    if backend == AUTO_FAST:
+        readers = {"nib": NibIO.read_img, "itk": ItkIO.read_img, "pdcm": PdcmIO.read_img, "chunk": ChunkIO.read_img}
+        return _read_with_fallback(
+            lambda fallback_backend: read_img(
+                input_path,
+                desired_ornt,
+                fallback_backend,
+                dtype,
+                header=header,
+                channels_axis=channels_axis,
+                coord_sys=coord_sys,
+                target_spacing=target_spacing,
+                downsample=downsample,
+                downsample_reduce=downsample_reduce,
+                **kwargs,
+            ),
+            select_backends(input_path, "read_img", readers, header, kwargs),
+        )
     nib_reader_data = (NibIO.read_img, NibIO.coord_sys)
     itk_reader_data = (ItkIO.read_img, ItkIO.coord_sys)
     pdcm_reader_data = (PdcmIO.read_img, PdcmIO.coord_sys)
+    chunk_reader_data = (ChunkIO.read_img, ChunkIO.coord_sys)
     if backend is None:
-        if is_nifti(input_path):
+        if not is_path(input_path):
+            reader, reader_sys = itk_reader_data
+        elif is_nifti(input_path):
             reader, reader_sys = nib_reader_data
+        elif is_chunked(input_path):
+            reader, reader_sys = chunk_reader_data
         else:
             reader, reader_sys = itk_reader_data
     else:
@@ -89,23 +150,64 @@ def read_img(
             reader, reader_sys = itk_reader_data
         elif backend in ("pdcm", "pydicom"):
             reader, reader_sys = pdcm_reader_data
+        elif backend == "chunk":
+            reader, reader_sys = chunk_reader_data
         else:
-            raise ValueError('The backend argument must be one of: "itk", "nib", "pdcm" (or "pydicom"), None')
+            raise ValueError(
+                'The backend argument must be one of: "itk", "nib", "pdcm" (or "pydicom"), "chunk", "auto-fast", None'
+            )
 
+    if is_file_sequence(input_path) and reader not in (ItkIO.read_img, PdcmIO.read_img):
+        raise ValueError(FILE_SEQUENCE_ERROR)
     if (coord_sys is not None) and (coord_sys != reader_sys):
         desired_ornt = inv_axcodes(desired_ornt)
 
-    np_image, metadata = reader(input_path, desired_ornt, header, channels_axis, **kwargs)
+    # the nib reader downsamples while decoding, the image of the other readers is downsampled after reading it
+    decode_downsample = downsample is not None and reader is NibIO.read_img
+    if decode_downsample:
+        kwargs = {**kwargs, "downsample": downsample, "downsample_reduce": downsample_reduce}
+    # a sequence of files is read only by the readers which accept it (checked above)
+    np_image, metadata = reader(input_path, desired_ornt, header, channels_axis, **kwargs)  # type: ignore[arg-type]
 
+    if downsample is not None and not decode_downsample:
+        with stage("downsample") as s:
+            func = partial(downsample_img, factors=downsample, reduce=downsample_reduce)
+            np_image, metadata = _spatial_op(np_image, metadata, channels_axis, func)
+            s.nbytes = np_image.nbytes
+    if target_spacing is not None:
+        with stage("resample") as s:
+            func = partial(resample_spacing, spacing=target_spacing)
+            np_image, metadata = _spatial_op(np_image, metadata, channels_axis, func)
+            s.nbytes = np_image.nbytes
     if dtype is not None:
-        np_image = np_image.astype(dtype, copy=False)
+        with stage("cast") as s:
+            np_image = np_image.astype(dtype, copy=False)
+            s.nbytes = np_image.nbytes
     if coord_sys is not None:
-        metadata.convert(coord_sys)
+        with stage("convert"):
+            metadata.convert(coord_sys)
+    return np_image, metadata
+
+
+def _spatial_op(
+    np_image: NDArray[np.generic],
+    metadata: MetaData[Any],
+    channels_axis: int | None,
+    func: Callable[[NDArray[np.generic], MetaData[Any]], tuple[NDArray[np.generic], MetaData[Any]]],
+) -> tuple[NDArray[np.generic], MetaData[Any]]:
+    """Apply func to an image whose spatial axes are first, with the channels (if any) moved to the end meanwhile"""
+    channeled = channels_axis is not None and np_image.ndim > metadata.affine.dim
+    if channeled:
+        np_image = move_channels(np_image, channels_axis, -1)
+    np_image, metadata = func(np_image, metadata)
+    if channeled:
+        np_image = move_channels(np_image, -1, channels_axis)
     return np_image, metadata
 
 
+@instrumented("read_meta")
 def read_meta(
-    input_path: str | os.PathLike[str],
+    input_path: str | os.PathLike[str] | Sequence[str | os.PathLike[str]],
     desired_ornt: str | None = None,
     backend: ReadBackend | None = None,
     header: bool = False,
@@ -114,21 +216,38 @@ def read_meta(
 ) -> MetaData[object]:
     """
     Read only the metadata of a medical image (affine, orientation, spatial shape) without loading pixel data.
-    :param input_path: str or os.PathLike, the input path of an image file or a DICOM directory
+    :param input_path: str or os.PathLike, the input path of an image file or a DICOM directory, or a sequence of the
+    files of a DICOM series (see read_img)
     :param desired_ornt: optional orientation to reorient the returned metadata, e.g. 'RAS'. Uses the `coord_sys`
     convention (itk by default).
-    :param backend: optional backend to use: 'itk', 'nib', 'pdcm' (also 'pydicom') or None (auto-detected)
+    :param backend: optional backend to use: 'itk', 'nib', 'pdcm' (also 'pydicom'), 'chunk', None (auto-detected) or
+    'auto-fast' (see read_img)
     :param header: if True, the returned metadata will include a header attribute with the raw backend metadata
     dictionary. Currently supported for single files only (not DICOM series).
     :param coord_sys: coordinate system of `desired_ornt` and of the returned metadata: 'itk', 'nib' or None.
     :return: MetaData object with spatial_shape set to the image dimensions
     """
+    if is_file_sequence(input_path) and len(input_path) == 0:
+        raise ValueError(EMPTY_FILE_SEQUENCE_ERROR)
+    if backend == AUTO_FAST:
+        readers = {"nib": NibIO.read_meta, "itk": ItkIO.read_meta, "pdcm": PdcmIO.read_meta, "chunk": ChunkIO.read_meta}
+        return _read_with_fallback(
+            lambda fallback_backend: read_meta(
+                input_path, desired_ornt, fallback_backend, header=header, coord_sys=coord_sys, **kwargs
+            ),
+            select_backends(input_path, "read_meta", readers, header, kwargs),
+        )
     nib_reader_data = (NibIO.read_meta, NibIO.coord_sys)
     itk_reader_data = (ItkIO.read_meta, ItkIO.coord_sys)
     pdcm_reader_data = (PdcmIO.read_meta, PdcmIO.coord_sys)
+    chunk_reader_data = (ChunkIO.read_meta, ChunkIO.coord_sys)
     if backend is None:
-        if is_nifti(input_path):
+        if not is_path(input_path):
+            reader_meta, reader_sys = itk_reader_data
+        elif is_nifti(input_path):
             reader_meta, reader_sys = nib_reader_data
+        elif is_chunked(input_path):
+            reader_meta, reader_sys = chunk_reader_data
         else:
             reader_meta, reader_sys = itk_reader_data
     else:
@@ -138,19 +257,42 @@ def read_meta(
             reader_meta, reader_sys = itk_reader_data
         elif backend in ("pdcm", "pydicom"):
             reader_meta, reader_sys = pdcm_reader_data
+        elif backend == "chunk":
+            reader_meta, reader_sys = chunk_reader_data
         else:
-            raise ValueError('The backend argument must be one of: "itk", "nib", "pdcm" (or "pydicom"), None')
+            raise ValueError(
+                'The backend argument must be one of: "itk", "nib", "pdcm" (or "pydicom"), "chunk", "auto-fast", None'
+            )
 
+    if is_file_sequence(input_path) and reader_meta not in (ItkIO.read_meta, PdcmIO.read_meta):
+        raise ValueError(FILE_SEQUENCE_ERROR)
     if (coord_sys is not None) and (coord_sys != reader_sys):
         desired_ornt = inv_axcodes(desired_ornt)
 
-    metadata = reader_meta(input_path, desired_ornt, header, **kwargs)
+    # a sequence of files is read only by the readers which accept it (checked above)
+    metadata = reader_meta(input_path, desired_ornt, header, **kwargs)  # type: ignore[arg-type]
 
     if coord_sys is not None:
-        metadata.convert(coord_sys)
+        with stage("convert"):
+            metadata.convert(coord_sys)
     return metadata
 
 
+def _read_with_fallback(read: Callable[[ReadBackend], T], backends: list[str]) -> T:
+    """Read with the backends in order until one succeeds, raise the error of the first backend if all fail"""
+    first_error: Exception | None = None
+    for backend in backends:
+        try:
+            return read(backend)  # type: ignore[arg-type]
+        except Exception as e:
+            logger.info(f'Reading with the "{backend}" backend failed, trying the next backend: {e}')
+            if first_error is None:
+                first_error = e
+    assert first_error is not None
+    raise first_error
+
+
+@instrumented("save_img")
 def save_img(
     filename: str | os.PathLike[str],
     np_image: NDArray[np.generic],
@@ -169,7 +311,7 @@ def save_img(
     :param np_image: the numpy image
     :param metadata: the metadata of the image
     :param use_original_ornt: whether to save in the original orientation stored in metadata.orig_ornt or not
-    :param backend: optional - 'itk', 'nib' or None
+    :param backend: optional - 'itk', 'nib', 'chunk' or None (nib for NIfTI, chunk for .mvc, itk otherwise)
     :param dtype: equivalent to np_image.astype(dtype) if dtype is not None
     :param channels_axis: if not None - the image is channeled (e.g. RGB) and the channels are in channels_axis
     :param mkdir: if True, creates the directory of `filename`
@@ -177,22 +319,33 @@ def save_img(
     """
     nib_writer = NibIO.save_img
     itk_writer = ItkIO.save_img
+    chunk_writer = ChunkIO.save_img
     if backend is None:
-        writer = nib_writer if is_nifti(filename, check_exist=False) else itk_writer
+        if is_nifti(filename, check_exist=False):
+            writer = nib_writer
+        elif is_chunked(filename, check_exist=False):
+            writer = chunk_writer
+        else:
+            writer = itk_writer
     else:
         if backend == "nib":
             writer = nib_writer
         elif backend == "itk":
             writer = itk_writer
+        elif backend == "chunk":
+            writer = chunk_writer
         else:
-            raise ValueError('The backend argument must be one of: "itk", "nib", None')
+            raise ValueError('The backend argument must be one of: "itk", "nib", "chunk", None')
     if mkdir:
         Path(filename).parent.mkdir(parents=parents, exist_ok=True)
     if dtype is not None:
-        np_image = np_image.astype(dtype, copy=False)
+        with stage("cast") as s:
+            np_image = np_image.astype(dtype, copy=False)
+            s.nbytes = np_image.nbytes
     writer(filename, np_image, metadata, use_original_ornt, channels_axis, **kwargs)
 
 
+@instrumented("save_dir")
 def save_dir(
     dirname: str | os.PathLike[str],
     np_image: NDArray[np.generic],
@@ -210,7 +363,9 @@ def save_dir(
     dtype is equivalent to passing image_np.astype(dtype) if dtype is not None
     """
     if dtype is not None:
-        np_image = np_image.astype(dtype, copy=False)
+        with stage("cast") as s:
+            np_image = np_image.astype(dtype, copy=False)
+            s.nbytes = np_image.nbytes
     ItkIO.save_dcm_dir(
         dirname, np_image, metadata, use_original_ornt, channels_axis, parents, exist_ok, allow_dcm_reorient, **kwargs
     )
@@ -0,0 +1,173 @@
+"""
+Shared-memory transport of an image (array and metadata) between processes, e.g. reading in worker processes and
+running inference in the main process without pickling the array.
+The producer copies the image into a shared memory block and sends the small, picklable SharedImgRef of the block (its
+name, the array's shape and dtype, and the compact bytes of the metadata). The consumer attaches to the block and gets a
+zero-copy array view and the metadata.
+
+Lifetime contract:
+- Exactly one process owns the block and unlinks it. SharedImg.create returns an owning SharedImg; transfer() passes
+  the ownership with the returned ref to the process that attaches to it, which must unlink the block (which
+  attach(ref) and the context manager do by default).
+- Every process that created or attached to the block must close it, after dropping its array views (close raises
+  BufferError while views of the block exist - copy the array to keep it).
+- The memory is freed when the block is unlinked and all the processes closed it. A block which is transferred and
+  never attached is leaked until reboot (on Linux it is a file in /dev/shm).
+>>> # worker process
+>>> ref = medio.shared.read_img_shared(path, "RAS")  # read, copy to shared memory and transfer the ownership
+>>> queue.put(ref)
+>>> # main process
+>>> with SharedImg.attach(queue.get()) as shared:
+...     prediction = model(shared.np_image)  # zero-copy view, valid within the block
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import numpy as np
+
+from medio.metadata.metadata import MetaData
+from medio.read_save import read_img
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+    from typing_extensions import Self
+
+
+class SharedImgRef(NamedTuple):
+    """The picklable reference to an image in a shared memory block, sent between processes"""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+    metadata: bytes  # MetaData.to_bytes
+
+
+class SharedImg:
+    """An image whose array is in a shared memory block. See the module documentation for the lifetime contract"""
+
+    def __init__(self, shm: SharedMemory, ref: SharedImgRef, owner: bool) -> None:
+        self._shm: SharedMemory | None = shm
+        self.ref = ref
+        self.owner = owner
+        self._np_image: NDArray[np.generic] | None = np.ndarray(ref.shape, dtype=np.dtype(ref.dtype), buffer=shm.buf)
+        # numpy does not lock the block's buffer, and an array view of a closed block crashes the process on access,
+        # so the views are detected by their references to the array (the base of its views) and to the block's mmap
+        self._base_refs = sys.getrefcount(shm._mmap)  # type: ignore[attr-defined]
+        self._image_refs = sys.getrefcount(self._np_image)
+        self.metadata = MetaData.from_bytes(ref.metadata)
+
+    @property
+    def np_image(self) -> NDArray[np.generic]:
+        """The zero-copy array view of the block, until it is closed"""
+        if self._np_image is None:
+            raise ValueError(f"{self} is closed")
+        return self._np_image
+
+    @classmethod
+    def create(cls, np_image: NDArray[np.generic], metadata: MetaData[Any], header: bool = True) -> Self:
+        """
+        Copy the image into a new shared memory block, owned by this process
+        :param np_image: the image array, copied in C order
+        :param metadata: the image metadata
+        :param header: whether to send the metadata header (which is pickled with the ref)
+        """
+        np_image = np.asarray(np_image)
+        # a block cannot be empty
+        shm = SharedMemory(create=True, size=max(np_image.nbytes, 1))
+        ref = SharedImgRef(shm.name, np_image.shape, np_image.dtype.str, metadata.to_bytes(header))
+        shared = cls(shm, ref, owner=True)
+        shared.np_image[...] = np_image
+        return shared
+
+    @classmethod
+    def attach(cls, ref: SharedImgRef, owner: bool = True) -> Self:
+        """
+        Attach to the block of ref, created in another process
+        :param ref: the reference of the block
+        :param owner: whether this process owns the block and unlinks it on exiting the context manager (the receiver
+        of transfer()), or only reads it while another process owns it
+        """
+        shm = SharedMemory(name=ref.name)
+        if not owner:
+            _untrack(shm)
+        return cls(shm, ref, owner)
+
+    def transfer(self) -> SharedImgRef:
+        """
+        Pass the ownership of the block to the process which attaches to the returned ref, and close it here (after
+        the array views of this process are dropped). The block outlives this process until it is unlinked
+        """
+        if not self.owner:
+            raise ValueError("Only the owner of a shared image can transfer it")
+        if self._shm is None:
+            raise ValueError(f"{self} is closed")
+        # before giving up the ownership, so the block is not left without an owner if it cannot be closed
+        self._check_no_views()
+        _untrack(self._shm)
+        self.owner = False
+        self.close()
+        return self.ref
+
+    def close(self) -> None:
+        """Close the block in this process. The array views must be dropped before, otherwise it raises BufferError"""
+        if self._shm is not None:
+            self._check_no_views()
+            self._np_image = None
+            self._shm.close()
+            self._shm = None
+
+    def _check_no_views(self) -> None:
+        assert self._shm is not None
+        mmap_refs = sys.getrefcount(self._shm._mmap)  # type: ignore[attr-defined]
+        if sys.getrefcount(self._np_image) > self._image_refs or mmap_refs > self._base_refs:
+            raise BufferError(f"{self} cannot be closed while array views of it exist")
+
+    def unlink(self) -> None:
+        """Free the block (once all the processes closed it). Only the owner unlinks"""
+        if not self.owner:
+            raise ValueError("Only the owner of a shared image can unlink it")
+        if self._shm is None:
+            shm = SharedMemory(name=self.ref.name)
+            shm.unlink()
+            shm.close()
+        else:
+            self._shm.unlink()
+        self.owner = False
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self.owner:
+            self.unlink()
+        self.close()
+
+    def __repr__(self) -> str:
+        state = "closed" if self._shm is None else ("owner" if self.owner else "attached")
+        return f"SharedImg({self.ref.name}, shape={self.ref.shape}, dtype={self.ref.dtype}, {state})"
+
+
+def read_img_shared(
+    input_path: str | os.PathLike[str], *args: Any, header: bool = False, **kwargs: Any
+) -> SharedImgRef:
+    """
+    Read an image with medio.read_img into a shared memory block and transfer the block to the process which attaches
+    to the returned ref, which must unlink it (see SharedImg.attach)
+    """
+    np_image, metadata = read_img(input_path, *args, header=header, **kwargs)
+    return SharedImg.create(np_image, metadata, header=header).transfer()
+
+
+def _untrack(shm: SharedMemory) -> None:
+    """
+    Stop the resource tracker of this process from unlinking the block when the process exits. SharedMemory registers
+    both created and attached blocks to the tracker, which unlinks them at exit
+    """
+    if os.name == "posix":
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
@@ -0,0 +1,100 @@
+"""
+The channels (components) of multichannel images, e.g. RGB: the conversion between a structured dtype (as nibabel reads
+RGB NIfTI) and a channels axis, and moving the channels axis. The conversions reinterpret the memory of the array by a
+dtype view where its layout allows it - a structured array whose fields are packed channels of a single dtype is a view
+of a channels axis, and a channels axis whose channels are adjacent in memory is a view of a structured array - and
+moving the channels axis is a view, so reading or writing a large RGB volume does not copy it.
+>>> rgb = structured_to_channels(np_image, channels_axis=-1)  # (x, y, z) RGB24 -> (x, y, z, 3) uint8 view
+>>> np_image = channels_to_structured(rgb, channels_axis=-1, dtype=RGB_DTYPE)
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from numpy.typing import DTypeLike, NDArray
+
+RGB_DTYPE = np.dtype([("R", np.uint8), ("G", np.uint8), ("B", np.uint8)])
+RGBA_DTYPE = np.dtype([("R", np.uint8), ("G", np.uint8), ("B", np.uint8), ("A", np.uint8)])
+
+
+def is_structured(dtype: np.dtype[np.generic]) -> bool:
+    """Whether dtype is a structured dtype of several fields, e.g. RGB"""
+    return len(_field_names(dtype)) > 1
+
+
+def _field_names(dtype: np.dtype[np.generic]) -> tuple[str, ...]:
+    """The names of the fields of a structured dtype, empty for other dtypes"""
+    return dtype.names or ()
+
+
+def channels_dtype(dtype: np.dtype[np.generic]) -> np.dtype[np.generic] | None:
+    """
+    The dtype of the channels of a structured dtype whose fields are packed channels - fields of a single dtype, in
+    order and without gaps - or None if the fields are not packed channels
+    """
+    fields_by_name = dtype.fields
+    if not is_structured(dtype) or fields_by_name is None:
+        return None
+    fields = [fields_by_name[name] for name in _field_names(dtype)]
+    base = fields[0][0]
+    packed = all(
+        field_dtype == base and offset == i * base.itemsize for i, (field_dtype, offset, *_) in enumerate(fields)
+    )
+    if not packed or base.subdtype is not None or dtype.itemsize != len(fields) * base.itemsize:
+        return None
+    return base
+
+
+def move_channels(array: NDArray[np.generic], source: int | None, destination: int | None) -> NDArray[np.generic]:
+    """Move the channels axis from source to destination, as a view. None for either of them keeps the array"""
+    if source is None or destination is None:
+        return array
+    if source % array.ndim == destination % array.ndim:
+        return array
+    return np.moveaxis(array, source, destination)
+
+
+def structured_to_channels(array: NDArray[np.generic], channels_axis: int = -1) -> NDArray[np.generic]:
+    """
+    An array of a structured dtype (e.g. RGB) as an array with the fields in a new channels_axis, a view if the fields
+    are packed channels (see channels_dtype) and a copy of the fields otherwise. Other arrays are returned as they are
+    """
+    if not is_structured(array.dtype):
+        return array
+    base = channels_dtype(array.dtype)
+    if base is None:
+        return np.stack([array[name] for name in _field_names(array.dtype)], axis=channels_axis)
+    # the itemsize of the subarray dtype is of the structured dtype, so the view is valid for any strides
+    channels = array.view(np.dtype((base, (len(_field_names(array.dtype)),))))
+    return move_channels(channels, -1, channels_axis)
+
+
+def channels_to_structured(array: NDArray[np.generic], channels_axis: int, dtype: DTypeLike) -> NDArray[np.generic]:
+    """
+    An array with a channels axis as an array of a structured dtype with a field per channel (the inverse of
+    structured_to_channels). It is a view if the channels of a voxel are adjacent in memory, e.g. the channels axis of
+    a C-contiguous array is last, and a single copy otherwise
+    :param array: the array, of the dtype of the fields
+    :param channels_axis: the channels axis of the array
+    :param dtype: a structured dtype of packed channels (see channels_dtype), e.g. RGB_DTYPE
+    """
+    dtype = np.dtype(dtype)
+    base = channels_dtype(dtype)
+    if base is None:
+        raise ValueError(f"The dtype {dtype} is not a structured dtype of packed channels")
+    if array.dtype != base:
+        raise ValueError(f'The channels of the dtype {dtype} must have dtype "{base}", got: "{array.dtype}"')
+    n_channels = array.shape[channels_axis]
+    n_fields = len(_field_names(dtype))
+    if n_channels != n_fields:
+        raise ValueError(f"Invalid number of channels: {n_channels}, should be {n_fields} for {dtype}")
+    channels_last = move_channels(array, channels_axis, -1)
+    if channels_last.strides[-1] == base.itemsize:
+        return channels_last.view(dtype)[..., 0]
+    structured = np.empty(channels_last.shape[:-1], dtype=dtype)
+    structured.view(np.dtype((base, (n_channels,))))[...] = channels_last
+    return structured
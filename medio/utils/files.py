@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import pprint
+from collections.abc import Sequence
 from pathlib import Path
 from typing import TYPE_CHECKING, Union
 
@@ -10,6 +11,8 @@ from typing_extensions import TypeGuard
 if TYPE_CHECKING:
     from collections.abc import Iterable
 
+    from typing_extensions import TypeIs
+
 PathLike = Union[os.PathLike[str], str]
 
 
@@ -38,6 +41,24 @@ def is_dicom(filename: PathLike, check_exist: bool = True) -> TypeGuard[PathLike
     return is_file_suffix(filename, (".dcm", ".dicom", ".DCM", ".DICOM"), check_exist=check_exist)
 
 
+def is_chunked(filename: PathLike, check_exist: bool = True) -> TypeGuard[PathLike]:
+    """Whether filename is a medio chunked volume file, see medio.backends.chunk_io"""
+    return is_file_suffix(filename, (".mvc",), check_exist=check_exist)
+
+
+def is_file_sequence(input_path: object) -> TypeGuard[Sequence[PathLike]]:
+    """Whether input_path is a sequence of files (e.g. the slices of a DICOM series) rather than a single path"""
+    return isinstance(input_path, Sequence) and not isinstance(input_path, (str, bytes))
+
+
+def is_path(input_path: object) -> TypeIs[PathLike]:
+    """
+    Whether input_path is a single path rather than a sequence of files, the complement of is_file_sequence. Unlike
+    is_file_sequence, it narrows an input of either kind in both branches (a str is itself a sequence of str)
+    """
+    return not is_file_sequence(input_path)
+
+
 def make_empty_dir(dir_path: PathLike, parents: bool = False) -> None:
     """Make an empty directory. If it exists - check that it is empty"""
     dir_path = Path(dir_path)
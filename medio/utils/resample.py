@@ -0,0 +1,431 @@
+"""
+Resampling of image arrays, to a new spacing or onto the grid of another image, and downsampling by blocks.
+Grids that are separable in the array indices - the sampled position along every spatial axis depends only on the
+index along one axis, as in a change of spacing - are interpolated one axis at a time, in chunks of another axis that
+are processed by a thread pool (numpy releases the GIL in the gathers and the arithmetic), so the memory beyond the
+input and the output is one intermediate array and a chunk per thread. Other (oblique) grids are interpolated in tiles
+of the output that are processed by the thread pool.
+>>> positions, shape = spacing_grid(np_image.shape, metadata.spacing, [1.0, 1.0, 1.0])
+>>> new_image = resample_separable(np_image, positions, order=1)
+>>> new_image, new_metadata = resample_to_grid(np_image, metadata, other_metadata, other_image.shape)
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from medio.metadata.metadata import MetaData
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    from numpy.typing import NDArray
+
+    from medio.metadata.affine import Affine
+
+# interpolation orders: 0 - nearest neighbor, 1 - linear
+ORDERS = (0, 1)
+# the reductions of the blocks of block_reduce
+REDUCTIONS = ("mean", "max", "mode")
+# the approximate size of the output chunk of a single task
+DEFAULT_CHUNK_BYTES = 16 * 2**20
+# the tolerance (in voxels) of the voxel-to-voxel mapping of two grids for identifying shifted and separable grids
+_GRID_ATOL = 1e-6
+
+
+def spacing_grid(
+    shape: Sequence[int],
+    spacing: Sequence[float] | NDArray[np.floating],
+    new_spacing: Sequence[float] | NDArray[np.floating],
+) -> tuple[list[NDArray[np.float64]], tuple[int, ...]]:
+    """
+    The sampling grid of new_spacing over the extent of an image of shape and spacing. Along every axis the new number
+    of voxels is the closest to the extent divided by the new spacing, and the new grid is centered in the extent, so
+    that for an integer ratio of the spacings that divides the shape the new voxels are the centers of the blocks of
+    the original voxels
+    :param shape: the spatial shape of the image
+    :param spacing: the spacing of the image
+    :param new_spacing: the spacing of the grid
+    :return: the positions of the grid along every axis in the (continuous) indices of the image, and its shape
+    """
+    positions = []
+    for n, s, new_s in zip(shape, spacing, new_spacing):
+        ratio = new_s / s
+        m = max(round(n / ratio), 1)
+        positions.append((np.arange(m, dtype=np.float64) - (m - 1) / 2) * ratio + (n - 1) / 2)
+    return positions, tuple(len(p) for p in positions)
+
+
+def resample_spacing(
+    np_image: NDArray[np.generic],
+    metadata: MetaData[Any],
+    spacing: float | Sequence[float | None],
+    order: int = 1,
+    max_workers: int | None = None,
+) -> tuple[NDArray[np.generic], MetaData[Any]]:
+    """
+    Resample an image to a spacing (see spacing_grid), with an exact update of its affine: the direction is kept, the
+    spacing is set and the origin is moved to the center of the first new voxel
+    :param np_image: the image, whose first metadata.affine.dim axes are spatial (other axes, e.g. channels, follow)
+    :param metadata: the metadata of the image
+    :param spacing: the new spacing, a number for all the axes or a number per spatial axis, None to keep an axis
+    :param order: the interpolation order, 0 (nearest neighbor) or 1 (linear)
+    :param max_workers: the maximal number of threads, the number of CPUs by default
+    :return: the resampled image and its metadata
+    """
+    affine = metadata.affine
+    dim = affine.dim
+    old_spacing = affine.spacing
+    spacings = _per_axis(spacing, dim, "spacing")
+    new_spacing = np.array([old if s is None else s for s, old in zip(spacings, old_spacing)], dtype=float)
+    if (new_spacing <= 0).any():
+        raise ValueError(f"The spacing must be positive, got {spacing}")
+    positions, shape = spacing_grid(np_image.shape[:dim], old_spacing, new_spacing)
+    new_image = resample_separable(np_image, positions, order, max_workers)
+    new_affine = affine.clone()
+    new_affine.origin = affine.index2coord([p[0] for p in positions])
+    new_affine.spacing = new_spacing
+    spatial_shape = None if metadata.spatial_shape is None else shape
+    new_metadata = MetaData(new_affine, metadata.orig_ornt, metadata.coord_sys, metadata.header, spatial_shape)
+    return new_image, new_metadata
+
+
+def resample_to_grid(
+    np_image: NDArray[np.generic],
+    metadata: MetaData[Any],
+    target_metadata: MetaData[Any],
+    target_shape: Sequence[int],
+    order: int = 1,
+    fill_value: float = 0,
+    max_workers: int | None = None,
+) -> tuple[NDArray[np.generic], MetaData[Any]]:
+    """
+    Resample an image onto the grid of another image, by the voxel-to-voxel mapping of their affines (in either
+    coordinate system). An identical grid is not resampled, a grid shifted by whole voxels is copied, a grid whose axes
+    are parallel to the axes of the image (up to their order and direction) is resampled separably, and any other grid
+    is interpolated in parallel tiles
+    :param np_image: the image, whose first metadata.affine.dim axes are spatial (other axes, e.g. channels, follow)
+    :param metadata: the metadata of the image
+    :param target_metadata: the metadata of the grid
+    :param target_shape: the spatial shape of the grid
+    :param order: the interpolation order, 0 (nearest neighbor, keeps the dtype, e.g. for labels) or 1 (linear, the
+    result is float64 for a float64 image and float32 otherwise)
+    :param fill_value: the value of the grid points outside of the image (farther than half a voxel from its edges)
+    :param max_workers: the maximal number of threads, the number of CPUs by default
+    :return: the resampled image and the metadata of the grid, in the coordinate system of metadata
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Invalid interpolation order {order}, it must be one of {ORDERS}")
+    target_metadata = target_metadata.in_coord_sys(metadata.coord_sys)
+    dim = metadata.affine.dim
+    target_shape = tuple(target_shape)
+    if target_metadata.affine.dim != dim or len(target_shape) != dim:
+        raise ValueError(f"The target grid must be of dimension {dim} like the image")
+    new_metadata = MetaData(
+        target_metadata.affine.clone(), target_metadata.orig_ornt, metadata.coord_sys, spatial_shape=target_shape
+    )
+    dtype = np_image.dtype if order == 0 else (np.float64 if np_image.dtype == np.float64 else np.float32)
+    # the source (continuous) index of every target index: src = m_matrix @ dst + shift
+    voxel_map = np.linalg.solve(np.asarray(metadata.affine), np.asarray(target_metadata.affine))
+    m_matrix, shift = voxel_map[:dim, :dim], voxel_map[:dim, dim]
+    shape = np_image.shape[:dim]
+    if np.allclose(m_matrix, np.eye(dim), rtol=0, atol=_GRID_ATOL):
+        int_shift = np.round(shift)
+        if np.allclose(shift, int_shift, rtol=0, atol=_GRID_ATOL):
+            if target_shape == shape and not int_shift.any():
+                return np_image.astype(dtype, copy=False), new_metadata
+            return _shift(np_image, int_shift.astype(int).tolist(), target_shape, dtype, fill_value), new_metadata
+    # the source axis of every target axis, for separable grids
+    src_axes = np.abs(m_matrix).argmax(axis=0)
+    dst_axes = np.arange(dim)
+    off_axes = m_matrix.copy()
+    off_axes[src_axes, dst_axes] = 0
+    if len(set(src_axes.tolist())) == dim and np.allclose(off_axes, 0, rtol=0, atol=_GRID_ATOL / max(target_shape)):
+        src_image = np_image.transpose((*src_axes.tolist(), *range(dim, np_image.ndim)))
+        positions = [m_matrix[a, b] * np.arange(target_shape[b]) + shift[a] for b, a in enumerate(src_axes.tolist())]
+        new_image = resample_separable(src_image, positions, order, max_workers).astype(dtype, copy=False)
+        for b, (a, p) in enumerate(zip(src_axes.tolist(), positions)):
+            outside = ~_inside(p, shape[a])
+            if outside.any():
+                new_image[(slice(None),) * b + (outside,)] = fill_value
+        return new_image, new_metadata
+    new_image = _resample_oblique(np_image, m_matrix, shift, target_shape, order, dtype, fill_value, max_workers)
+    return new_image, new_metadata
+
+
+def block_reduce(array: NDArray[np.generic], factors: Sequence[int], reduce: str = "mean") -> NDArray[np.generic]:
+    """
+    Reduce the blocks of factors of the first len(factors) axes of array, e.g. the mean of every 2x2x2 block, by
+    reshaping every axis into (blocks, factor). The voxels at the end of an axis that do not fill a block are dropped
+    :param array: the array, the other axes (e.g. channels) are kept
+    :param factors: the block size along every axis, positive integers
+    :param reduce: 'mean' (float64 for a float64 array and float32 otherwise), 'max' or 'mode' (the most frequent value
+    in the block, the smallest of a tie, e.g. for labels), the latter two keep the dtype
+    :return: the reduced array
+    """
+    if reduce not in REDUCTIONS:
+        raise ValueError(f'Invalid reduce "{reduce}", it must be one of {REDUCTIONS}')
+    dim = len(factors)
+    shape = tuple(n // f for n, f in zip(array.shape, factors))
+    if not all(shape):
+        raise ValueError(f"The downsampling factors {tuple(factors)} are larger than the shape {array.shape[:dim]}")
+    cropped = array[tuple(slice(m * f) for m, f in zip(shape, factors))]
+    blocks = cropped.reshape((*itertools.chain.from_iterable(zip(shape, factors)), *array.shape[dim:]))
+    block_axes = tuple(range(1, 2 * dim, 2))
+    if reduce == "mean":
+        return blocks.mean(axis=block_axes, dtype=np.float64 if array.dtype == np.float64 else np.float32)
+    if reduce == "max":
+        return blocks.max(axis=block_axes)
+    blocks = np.moveaxis(blocks, block_axes, range(-dim, 0)).reshape((*shape, *array.shape[dim:], -1))
+    return _mode(blocks)
+
+
+def downsample_affine(affine: Affine, factors: Sequence[int]) -> Affine:
+    """The affine of block_reduce of factors: the origin is the center of the first block, the spacing is scaled"""
+    new_affine = affine.clone()
+    new_affine.origin = affine.index2coord((np.asarray(factors) - 1) / 2)
+    new_affine.spacing = affine.spacing * factors
+    return new_affine
+
+
+def downsample(
+    np_image: NDArray[np.generic], metadata: MetaData[Any], factors: int | Sequence[int], reduce: str = "mean"
+) -> tuple[NDArray[np.generic], MetaData[Any]]:
+    """
+    Downsample an image by reducing blocks of voxels (see block_reduce), which unlike strided slicing does not alias
+    :param np_image: the image, whose first metadata.affine.dim axes are spatial (other axes, e.g. channels, follow)
+    :param metadata: the metadata of the image
+    :param factors: the block size, an integer for all the axes or an integer per spatial axis (1 keeps an axis)
+    :param reduce: 'mean', 'max' or 'mode'
+    :return: the downsampled image and its metadata
+    """
+    factors = block_factors(factors, metadata.affine.dim)
+    new_image = block_reduce(np_image, factors, reduce)
+    spatial_shape = None if metadata.spatial_shape is None else new_image.shape[: len(factors)]
+    new_affine = downsample_affine(metadata.affine, factors)
+    new_metadata = MetaData(new_affine, metadata.orig_ornt, metadata.coord_sys, metadata.header, spatial_shape)
+    return new_image, new_metadata
+
+
+def block_factors(factors: int | Sequence[int], dim: int) -> tuple[int, ...]:
+    """The downsampling factors of every axis, validated"""
+    factors = tuple(_per_axis(factors, dim, "downsampling factors"))
+    if not all(isinstance(f, (int, np.integer)) and f >= 1 for f in factors):
+        raise ValueError(f"The downsampling factors must be positive integers, got {factors}")
+    return tuple(int(f) for f in factors)
+
+
+def resample_separable(
+    array: NDArray[np.generic],
+    positions: Sequence[NDArray[np.floating]],
+    order: int = 1,
+    max_workers: int | None = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> NDArray[np.generic]:
+    """
+    Sample array on the grid of the outer product of positions, with edge values outside of the array
+    :param array: the array, the positions are of its first len(positions) axes and the other axes are kept
+    :param positions: the positions along every axis in the (continuous) indices of the array, 1d arrays
+    :param order: the interpolation order, 0 (nearest neighbor, keeps the dtype) or 1 (linear, the result is float64
+    for a float64 array and float32 otherwise)
+    :param max_workers: the maximal number of threads, the number of CPUs by default
+    :param chunk_bytes: the approximate size of the output chunk of a single task
+    :return: the sampled array
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Invalid interpolation order {order}, it must be one of {ORDERS}")
+    if len(positions) > array.ndim:
+        raise ValueError(f"Got positions of {len(positions)} axes for an array of {array.ndim} dimensions")
+    positions = [np.asarray(p, dtype=np.float64) for p in positions]
+    # identical axes are not resampled
+    axes = [axis for axis, p in enumerate(positions) if not _is_identity(p, array.shape[axis])]
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers) as executor:
+        if order == 0:
+            indices = [np.clip(np.floor(p + 0.5), 0, n - 1).astype(np.intp) for p, n in zip(positions, array.shape)]
+            if not axes:
+                return array
+            return _gather(array, indices, executor, max_workers, chunk_bytes)
+        dtype = np.float64 if array.dtype == np.float64 else np.float32
+        # the most downsampled axes are first, to keep the intermediate arrays small
+        axes.sort(key=lambda axis: len(positions[axis]) / array.shape[axis])
+        for axis in axes:
+            array = _interp_axis(array, positions[axis], axis, dtype, executor, max_workers, chunk_bytes)
+        return array.astype(dtype, copy=False)
+
+
+def _is_identity(positions: NDArray[np.float64], n: int) -> bool:
+    return len(positions) == n and np.array_equal(positions, np.arange(n))
+
+
+def _per_axis(value: Any, dim: int, name: str) -> list[Any]:
+    """A value for all the axes or a sequence of a value per axis, as a list of dim values"""
+    values = [value] * dim if np.ndim(value) == 0 else list(value)
+    if len(values) != dim:
+        raise ValueError(f"The {name} {value} must be a number or a sequence of {dim} numbers")
+    return values
+
+
+def _mode(blocks: NDArray[np.generic]) -> NDArray[np.generic]:
+    """The most frequent value along the last axis (the smallest of a tie), by the run lengths of the sorted values"""
+    sorted_blocks = np.sort(blocks, axis=-1)
+    k = blocks.shape[-1]
+    run_starts = np.ones(blocks.shape, dtype=bool)
+    run_starts[..., 1:] = sorted_blocks[..., 1:] != sorted_blocks[..., :-1]
+    # the start index of the run of every element, and the length of the run up to it
+    starts = np.maximum.accumulate(np.where(run_starts, np.arange(k), 0), axis=-1)
+    lengths = np.arange(k) - starts
+    return np.take_along_axis(sorted_blocks, lengths.argmax(axis=-1)[..., None], axis=-1)[..., 0]
+
+
+def _inside(positions: NDArray[np.floating], n: int) -> NDArray[np.bool_]:
+    """Whether positions (continuous indices) are in the image, i.e. at most half a voxel from its edge voxels"""
+    return (positions >= -0.5 - _GRID_ATOL) & (positions <= n - 0.5 + _GRID_ATOL)
+
+
+def _shift(
+    array: NDArray[np.generic], shift: list[int], shape: tuple[int, ...], dtype: np.dtype[Any] | type, fill_value: float
+) -> NDArray[np.generic]:
+    """The grid of shape whose index 0 is the index shift of array, a copy of their overlap"""
+    out = np.full(shape + array.shape[len(shape) :], fill_value, dtype=dtype)
+    src_key, dst_key = [], []
+    for start, n, m in zip(shift, array.shape, shape):
+        lo, hi = max(start, 0), min(start + m, n)
+        if lo >= hi:
+            return out
+        src_key.append(slice(lo, hi))
+        dst_key.append(slice(lo - start, hi - start))
+    out[tuple(dst_key)] = array[tuple(src_key)]
+    return out
+
+
+def _resample_oblique(
+    array: NDArray[np.generic],
+    m_matrix: NDArray[np.float64],
+    shift: NDArray[np.float64],
+    shape: tuple[int, ...],
+    order: int,
+    dtype: np.dtype[Any] | type,
+    fill_value: float,
+    max_workers: int | None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> NDArray[np.generic]:
+    """Sample array at m_matrix @ index + shift for every index of a grid of shape, in tiles of its first axis"""
+    dim = len(shape)
+    src_shape = np.array(array.shape[:dim])
+    # the spatial axes are flattened for gathering the voxels with their channels
+    flat = array.reshape((-1, *array.shape[dim:]))
+    channels = (None,) * (array.ndim - dim)
+    out = np.empty(shape + array.shape[dim:], dtype=dtype)
+    grid = [np.arange(n) for n in shape]
+
+    def resample_tile(tile: slice) -> None:
+        axes = [grid[0][tile], *grid[1:]]
+        index = np.meshgrid(*axes, indexing="ij", sparse=True)
+        coords = [sum(m_matrix[a, b] * index[b] for b in range(dim)) + shift[a] for a in range(dim)]
+        inside = np.logical_and.reduce([_inside(c, n) for c, n in zip(coords, src_shape)])
+        coords = [np.clip(c, 0, n - 1) for c, n in zip(coords, src_shape)]
+        if order == 0:
+            values = flat[np.ravel_multi_index([np.floor(c + 0.5).astype(np.intp) for c in coords], src_shape)]
+        else:
+            lower = [np.minimum(np.floor(c), max(n - 2, 0)).astype(np.intp) for c, n in zip(coords, src_shape)]
+            weights = [(c - low).astype(dtype) for c, low in zip(coords, lower)]
+            values = np.zeros(inside.shape + array.shape[dim:], dtype=dtype)
+            for corner in itertools.product((0, 1), repeat=dim):
+                corner_index = [np.minimum(low + c, n - 1) for low, c, n in zip(lower, corner, src_shape)]
+                corner_weight = np.prod([w if c else 1 - w for w, c in zip(weights, corner)], axis=0)
+                values += flat[np.ravel_multi_index(corner_index, src_shape)] * corner_weight[(..., *channels)]
+        values[~inside] = fill_value
+        out[tile] = values
+
+    # the intermediate arrays of a tile are about 64 bytes per voxel
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers) as executor:
+        _map_chunks(resample_tile, out, 0, executor, max_workers, chunk_bytes * out.itemsize // 64)
+    return out
+
+
+def _gather(
+    array: NDArray[np.generic],
+    indices: list[NDArray[np.intp]],
+    executor: ThreadPoolExecutor,
+    max_workers: int,
+    chunk_bytes: int,
+) -> NDArray[np.generic]:
+    """array[np.ix_(*indices)], in chunks of the first axis"""
+    out = np.empty((*map(len, indices), *array.shape[len(indices) :]), dtype=array.dtype)
+
+    def gather(chunk: slice) -> None:
+        out[chunk] = array[np.ix_(indices[0][chunk], *indices[1:])]
+
+    _map_chunks(gather, out, 0, executor, max_workers, chunk_bytes)
+    return out
+
+
+def _interp_axis(
+    array: NDArray[np.generic],
+    positions: NDArray[np.float64],
+    axis: int,
+    dtype: type[np.floating],
+    executor: ThreadPoolExecutor,
+    max_workers: int,
+    chunk_bytes: int,
+) -> NDArray[np.floating]:
+    """Linear interpolation of array at positions along axis, in chunks of another axis"""
+    n = array.shape[axis]
+    positions = np.clip(positions, 0, n - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, n - 1)
+    weights = (positions - lower).astype(dtype).reshape((-1,) + (1,) * (array.ndim - axis - 1))
+    out = np.empty((*array.shape[:axis], len(positions), *array.shape[axis + 1 :]), dtype=dtype)
+    other_axes = [i for i in range(array.ndim) if i != axis]
+    chunk_axis = max(other_axes, key=lambda i: array.shape[i]) if other_axes else None
+
+    def interp(chunk: slice) -> None:
+        key = (slice(None),) * (chunk_axis or 0) + (chunk,)
+        src = array[key] if chunk_axis is not None else array
+        low = np.take(src, lower, axis=axis).astype(dtype, copy=False)
+        high = np.take(src, upper, axis=axis).astype(dtype, copy=False)
+        high -= low
+        high *= weights
+        high += low
+        if chunk_axis is None:
+            out[...] = high
+        else:
+            out[key] = high
+
+    if chunk_axis is None:
+        interp(slice(None))
+    else:
+        _map_chunks(interp, out, chunk_axis, executor, max_workers, chunk_bytes)
+    return out
+
+
+def _map_chunks(
+    func: Callable[[slice], None],
+    out: NDArray[np.generic],
+    axis: int,
+    executor: ThreadPoolExecutor,
+    max_workers: int,
+    chunk_bytes: int,
+) -> None:
+    """
+    Call func with the chunks of out along axis, in parallel. The chunks are at most chunk_bytes (but not smaller than
+    a single index), and there is at least one chunk per worker
+    """
+    size = out.shape[axis]
+    index_bytes = out.nbytes // size if size else 0
+    chunk = min(max(chunk_bytes // max(index_bytes, 1), 1), math.ceil(size / max_workers))
+    chunks = [slice(start, start + chunk) for start in range(0, size, max(chunk, 1))]
+    if len(chunks) <= 1:
+        for c in chunks:
+            func(c)
+        return
+    for future in [executor.submit(func, c) for c in chunks]:
+        future.result()
@@ -2,7 +2,11 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import numpy as np
 import pytest
+from pydicom.uid import UID, ExplicitVRLittleEndian
+
+from benchmarks.fixtures import write_multiframe
 
 DATA_DIR = Path(__file__).parent / "data"
 TEST_NII = DATA_DIR / "test.nii.gz"
@@ -22,3 +26,34 @@ def dcm_dir() -> Path:
 @pytest.fixture
 def tmp_dir(tmp_path: Path) -> Path:
     return tmp_path
+
+
+def write_multiframe_dcm(
+    filename: Path,
+    n_frames: int = 6,
+    rows: int = 5,
+    columns: int = 4,
+    slope: float = 1.0,
+    intercept: float = 0.0,
+    transfer_syntax: UID = ExplicitVRLittleEndian,
+) -> np.ndarray:
+    """Write a minimal enhanced (multiframe) DICOM file with axial frames 2.5mm apart and return its pixel array"""
+    pixels = np.arange(n_frames * rows * columns, dtype=np.uint16).reshape(n_frames, rows, columns)
+    write_multiframe(
+        filename,
+        pixels,
+        spacing=(0.75, 0.5, 2.5),
+        origin=(-10.0, 20.0, 0.0),
+        slope=slope,
+        intercept=intercept,
+        bits_stored=12,
+        transfer_syntax=transfer_syntax,
+    )
+    return pixels
+
+
+@pytest.fixture
+def multiframe_dcm(tmp_path: Path) -> Path:
+    filename = tmp_path / "multiframe.dcm"
+    write_multiframe_dcm(filename)
+    return filename
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import pickle
+
 import numpy as np
+import pytest
 
-from medio.metadata.affine import Affine
+from medio.metadata.affine import Affine, AffineStack
+from medio.metadata.metadata import MetaData
 
 
 class TestAffineConstruction:
@@ -119,3 +123,88 @@ class TestGetitem:
         result = aff[0]
         assert type(result) is np.ndarray
         np.testing.assert_array_equal(result, [1.0, 0.0, 0.0, 0.0])
+
+
+class TestSerialization:
+    def test_pickle_keeps_components(self) -> None:
+        aff = Affine(direction=np.eye(3)[[1, 0, 2]], spacing=[0.5, 1.0, 2.0], origin=[1, 2, 3])
+        loaded = pickle.loads(pickle.dumps(aff))
+        assert type(loaded) is Affine
+        assert loaded.dim == 3
+        np.testing.assert_array_equal(loaded, aff)
+        np.testing.assert_array_almost_equal(loaded.spacing, [0.5, 1.0, 2.0])
+        np.testing.assert_array_almost_equal(loaded.direction, aff.direction)
+
+    def test_bytes_roundtrip(self) -> None:
+        aff = Affine(direction=np.eye(2), spacing=[0.5, 2.0], origin=[1, 2])
+        data = aff.to_bytes()
+        assert len(data) == 9 * 8
+        loaded = Affine.from_bytes(data)
+        assert loaded.dim == 2
+        np.testing.assert_array_equal(loaded, aff)
+
+    def test_invalid_bytes(self) -> None:
+        with pytest.raises(ValueError, match="square"):
+            Affine.from_bytes(bytes(40))
+
+
+class TestLazyComponents:
+    def test_setitem_resets(self) -> None:
+        aff = Affine(direction=np.eye(3), spacing=[1.0, 2.0, 3.0], origin=[0, 0, 0])
+        aff[0, 0] = 4.0
+        np.testing.assert_array_almost_equal(aff.spacing, [4.0, 2.0, 3.0])
+        aff[:3, :3] = np.diag([-1.0, 1.0, 1.0])
+        np.testing.assert_array_almost_equal(aff.direction, np.diag([-1.0, 1.0, 1.0]))
+
+    def test_negative_spacing_flips_direction(self) -> None:
+        aff = Affine(direction=np.eye(3), spacing=[1.0, 2.0, 3.0], origin=[0, 0, 0])
+        aff.spacing = [1.0, -2.0, 3.0]
+        np.testing.assert_array_almost_equal(aff.spacing, [1.0, 2.0, 3.0])
+        np.testing.assert_array_almost_equal(aff.direction, np.diag([1.0, -1.0, 1.0]))
+
+    def test_copy(self) -> None:
+        aff = Affine(direction=np.eye(3), spacing=[1.0, 2.0, 3.0], origin=[0, 0, 0])
+        copied = aff.copy()
+        assert type(copied) is Affine
+        np.testing.assert_array_almost_equal(copied.spacing, [1.0, 2.0, 3.0])
+        assert copied.dim == 3
+
+
+def random_affine(rng: np.random.Generator) -> Affine:
+    direction, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+    return Affine(direction=direction, spacing=rng.uniform(0.2, 3, 3), origin=rng.normal(size=3) * 100)
+
+
+class TestBatched:
+    def test_index2coord_batch(self) -> None:
+        aff = random_affine(np.random.default_rng(0))
+        indices = np.random.default_rng(1).uniform(0, 100, (50, 3))
+        coords = aff.index2coord(indices)
+        assert coords.shape == (50, 3)
+        np.testing.assert_allclose(coords[7], aff.index2coord(indices[7]))
+        np.testing.assert_allclose(aff.coord2index(coords), indices)
+        np.testing.assert_allclose(aff.coord2index(coords[7]), indices[7])
+
+    def test_stack(self) -> None:
+        rng = np.random.default_rng(2)
+        affines = [random_affine(rng) for _ in range(6)]
+        stack = AffineStack.from_metadata(MetaData(aff) for aff in affines)
+        assert len(stack) == 6 and stack.dim == 3
+        indices = rng.uniform(0, 100, (10, 3))
+        coords = stack.index2coord(indices)
+        assert coords.shape == (6, 10, 3)
+        for aff, aff_coords in zip(affines, coords):
+            np.testing.assert_allclose(aff_coords, aff.index2coord(indices))
+        np.testing.assert_allclose(stack.coord2index(coords), np.broadcast_to(indices, (6, 10, 3)))
+        np.testing.assert_allclose(stack.index2coord(indices[0]), coords[:, 0])
+        np.testing.assert_allclose(stack.inv().index2coord(coords), stack.coord2index(coords))
+        np.testing.assert_allclose(stack.spacing, [aff.spacing for aff in affines])
+        np.testing.assert_allclose(stack.direction, [aff.direction for aff in affines], atol=1e-12)
+        np.testing.assert_allclose(stack.origin, [aff.origin for aff in affines])
+        np.testing.assert_allclose((stack @ stack.inv()).matrices, np.broadcast_to(np.eye(4), (6, 4, 4)), atol=1e-9)
+        assert type(stack[2]) is Affine
+        np.testing.assert_array_equal(stack[2], affines[2])
+
+    def test_invalid_stack(self) -> None:
+        with pytest.raises(ValueError, match="K, d"):
+            AffineStack(np.eye(4))
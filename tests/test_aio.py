@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from medio import aio, instrument, read_save
+from medio.read_save import read_img, read_meta
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def blocked_save(monkeypatch):
+    """save_img which waits for the returned event before saving"""
+    release = threading.Event()
+    save_img = read_save.save_img
+
+    def slow_save_img(*args, **kwargs):
+        release.wait(10)
+        save_img(*args, **kwargs)
+
+    monkeypatch.setattr(read_save, "save_img", slow_save_img)
+    return release
+
+
+class TestAio:
+    def test_read(self, nii_path) -> None:
+        async def main():
+            return await asyncio.gather(aio.read_img(nii_path, "RAS"), aio.read_meta(nii_path), aio.read_img(nii_path))
+
+        (img_ras, metadata_ras), metadata, (img, _) = asyncio.run(main())
+        expected, expected_metadata = read_img(nii_path, "RAS")
+        assert np.array_equal(img_ras, expected)
+        np.testing.assert_allclose(metadata_ras.affine, expected_metadata.affine)
+        np.testing.assert_allclose(metadata.affine, read_meta(nii_path).affine)
+        assert img.shape == expected.shape
+
+    def test_save_img(self, nii_path, tmp_dir) -> None:
+        img, metadata = read_img(nii_path)
+        filename = tmp_dir / "out.nii.gz"
+        asyncio.run(aio.save_img(filename, img, metadata, backend="itk"))
+        assert [path.name for path in tmp_dir.iterdir()] == ["out.nii.gz"]
+        img2, metadata2 = read_img(filename)
+        assert np.array_equal(img, img2)
+        np.testing.assert_allclose(metadata.affine, metadata2.affine, atol=1e-5)
+
+    def test_save_img_multi_file(self, nii_path, tmp_dir) -> None:
+        img, metadata = read_img(nii_path)
+        asyncio.run(aio.save_img(tmp_dir / "out.mhd", img, metadata))
+        assert sorted(path.name for path in tmp_dir.iterdir()) == ["out.mhd", "out.raw"]
+        assert np.array_equal(read_img(tmp_dir / "out.mhd")[0], img)
+
+    def test_timeout(self, nii_path, monkeypatch, executor) -> None:
+        release = threading.Event()
+        calls = []
+
+        def slow_read_img(*args, **kwargs):
+            calls.append(args)
+            release.wait(10)
+            return read_img(*args, **kwargs)
+
+        monkeypatch.setattr(read_save, "read_img", slow_read_img)
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await aio.read_img(nii_path, timeout=0.05, executor=executor)
+            # queued behind the blocked call, so it is removed from the queue and never runs
+            with pytest.raises(asyncio.TimeoutError):
+                await aio.read_img(nii_path, "RAS", timeout=0.05, executor=executor)
+
+        asyncio.run(main())
+        release.set()
+        executor.shutdown(wait=True)
+        assert calls == [(nii_path,)]
+
+    def test_cancelled_save_img(self, nii_path, tmp_dir, blocked_save, executor) -> None:
+        img, metadata = read_img(nii_path)
+        filename = tmp_dir / "out.nii.gz"
+
+        async def main():
+            task = asyncio.ensure_future(aio.save_img(filename, img, metadata, executor=executor))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        blocked_save.set()
+        executor.shutdown(wait=True)
+        assert list(tmp_dir.iterdir()) == []
+
+    def test_timeout_keeps_existing_file(self, nii_path, tmp_dir, blocked_save, executor) -> None:
+        img, metadata = read_img(nii_path)
+        filename = tmp_dir / "out.nii"
+        filename.write_bytes(b"previous")
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(aio.save_img(filename, img, metadata, timeout=0.05, executor=executor))
+        blocked_save.set()
+        executor.shutdown(wait=True)
+        assert [path.name for path in tmp_dir.iterdir()] == ["out.nii"]
+        assert filename.read_bytes() == b"previous"
+
+    def test_executor(self, nii_path, executor) -> None:
+        aio.set_executor(executor)
+        try:
+            assert aio.get_executor() is executor
+            asyncio.run(aio.read_meta(nii_path))
+        finally:
+            aio.set_executor(None)
+        managed = aio.get_executor()
+        assert managed is not executor
+        aio.shutdown()
+        assert aio.get_executor() is not managed
+        # a user executor is not shut down by medio
+        assert executor.submit(int).result() == 0
+
+    def test_instrument(self, nii_path) -> None:
+        async def main():
+            with instrument.collect() as records:
+                await aio.read_meta(nii_path)
+            return records
+
+        try:
+            [record] = asyncio.run(main())
+        finally:
+            instrument.disable()
+        assert (record.operation, record.backend) == ("read_meta", "nib")
+        assert "header" in record.stage_seconds()
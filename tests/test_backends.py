@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import logging
 import os
+import shutil
 import tempfile
+from collections.abc import Mapping
 
 import numpy as np
 import pytest
 
+from medio.backends.itk_io import ItkIO
 from medio.read_save import read_img, read_meta, save_dir, save_img
 
 TEST_NII = os.path.join(os.path.dirname(__file__), "data", "test.nii.gz")
@@ -125,7 +129,7 @@ class TestReadMetaOnly:
     def test_nii_header_populated(self) -> None:
         meta = read_meta(TEST_NII, header=True)
         assert meta.header is not None
-        assert isinstance(meta.header, dict)
+        assert isinstance(meta.header, Mapping)
         assert len(meta.header) > 0
 
     def test_nii_nib_backend_spatial_shape(self) -> None:
@@ -160,6 +164,60 @@ class TestReadMetaOnly:
         meta_pdcm = read_meta(TEST_DCM_DIR, backend="pdcm")
         np.testing.assert_allclose(meta_itk.affine, meta_pdcm.affine, atol=1e-3)
 
+    def test_dcm_dir_fast_matches_full(self) -> None:
+        meta = read_meta(TEST_DCM_DIR, backend="itk")
+        fast_meta = read_meta(TEST_DCM_DIR, backend="itk", fast=True)
+        assert fast_meta.spatial_shape == meta.spatial_shape
+        np.testing.assert_allclose(fast_meta.affine, meta.affine)
+
+    def test_dcm_dir_fast_unsafe(self, tmp_path, caplog) -> None:
+        filenames = ItkIO.extract_series(TEST_DCM_DIR)
+        assert not isinstance(filenames, str)
+        # missing slices
+        for filename in filenames[:50] + filenames[60:]:
+            shutil.copy(filename, tmp_path)
+        with caplog.at_level(logging.WARNING, logger="medio.backends.itk_io"):
+            meta = read_meta(tmp_path, backend="itk", fast=True)
+            assert "non-uniform" in caplog.text
+            assert meta.spatial_shape == (150, 150, 140)
+            caplog.clear()
+            # only the boundary slices of a list of presorted files are read
+            read_meta(filenames[:50] + filenames[60:], backend="itk", fast=True, presorted=True)
+            assert "SpacingBetweenSlices" in caplog.text
+            caplog.clear()
+            read_meta(filenames[::-1], backend="itk", fast=True, presorted=True)
+            assert "ascending order" in caplog.text
+
     def test_invalid_backend(self) -> None:
         with pytest.raises(ValueError):
             read_meta(TEST_NII, backend="invalid")  # type: ignore[arg-type]
+
+
+class TestReadFileSequence:
+    @pytest.mark.parametrize("backend", ["itk", "pdcm"])
+    def test_matches_dir(self, backend) -> None:
+        arr, meta = read_img(TEST_DCM_DIR, backend=backend)
+        filenames = list(ItkIO.extract_series(TEST_DCM_DIR))
+        shuffled = filenames[::2] + filenames[1::2]
+        for files, presorted in ((filenames, True), (shuffled, False)):
+            seq_arr, seq_meta = read_img(files, backend=backend, presorted=presorted)
+            np.testing.assert_array_equal(seq_arr, arr)
+            np.testing.assert_allclose(seq_meta.affine, meta.affine, atol=1e-3)
+            seq_meta = read_meta(files, backend=backend, presorted=presorted)
+            assert seq_meta.spatial_shape == arr.shape
+            np.testing.assert_allclose(seq_meta.affine, meta.affine, atol=1e-3)
+
+    def test_default_backend(self) -> None:
+        filenames = ItkIO.extract_series(TEST_DCM_DIR)
+        assert read_meta(filenames).spatial_shape == (150, 150, 150)
+        assert read_meta(filenames, backend="auto-fast", presorted=True).spatial_shape == (150, 150, 150)
+        with pytest.raises(ValueError, match="sequence of files"):
+            read_img(filenames, backend="nib")
+
+    @pytest.mark.parametrize("backend", ["itk", "pdcm", "auto-fast", None])
+    @pytest.mark.parametrize("presorted", [True, False])
+    def test_empty_sequence(self, backend, presorted) -> None:
+        with pytest.raises(ValueError, match="sequence of files is empty"):
+            read_img([], backend=backend, presorted=presorted)
+        with pytest.raises(ValueError, match="sequence of files is empty"):
+            read_meta((), backend=backend, presorted=presorted)
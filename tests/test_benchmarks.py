@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import json
+
+from benchmarks import metadata
+from benchmarks.fixtures import FORMATS
+from benchmarks.run import main
+from benchmarks.suite import cases, run_suite
+
+
+class TestBenchmarks:
+    def test_cases(self) -> None:
+        suite_cases = cases(sizes=["tiny"])
+        assert {case.fmt for case in suite_cases} == set(FORMATS)
+        assert all(case.backend == "itk" for case in suite_cases if case.operation == "save_dir")
+        assert not cases(operations=["save_img"], formats=["dcm_multiframe"], sizes=["tiny"])
+
+    def test_run_suite(self, tmp_path) -> None:
+        suite_cases = cases(operations=["read_img", "save_img"], formats=["nii", "dcm_multiframe"], sizes=["tiny"])
+        records = run_suite(suite_cases, tmp_path, repeat=2, warmup=0, isolate=False)
+        assert len(records) == len(suite_cases)
+        for record in records:
+            assert "error" not in record
+            assert len(record["times"]) == 2
+            assert record["min"] <= record["median"]
+
+    def test_main(self, tmp_path) -> None:
+        output = tmp_path / "results.json"
+        argv = ["--operations", "read_meta", "--formats", "mhd", "--sizes", "tiny", "--repeat", "1", "--no-isolate"]
+        main([*argv, "--data-dir", str(tmp_path / "data"), "--output", str(output)])
+        results = json.loads(output.read_text())
+        assert results["environment"]["medio"]
+        assert [record["name"] for record in results["results"]] == ["read_meta[mhd-tiny-itk]"]
+
+    def test_metadata(self, tmp_path) -> None:
+        results = metadata.main(["--number", "100", "--repeat", "1", "--data-dir", str(tmp_path)])
+        assert set(results) == set(metadata.benchmarks(tmp_path))
+        assert all(microseconds > 0 for microseconds in results.values())
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from medio import read_img, save_img
+from medio.backends.nib_io import NibIO
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+from medio.utils.channels import (
+    RGB_DTYPE,
+    RGBA_DTYPE,
+    channels_dtype,
+    channels_to_structured,
+    move_channels,
+    structured_to_channels,
+)
+
+
+def make_rgb(shape=(6, 5, 4)) -> np.ndarray:
+    return np.random.default_rng(0).integers(0, 256, (*shape, 3), dtype=np.uint8)
+
+
+class TestChannels:
+    def test_structured_views(self) -> None:
+        rgb = make_rgb()
+        structured = channels_to_structured(rgb, -1, RGB_DTYPE)
+        assert structured.shape == rgb.shape[:-1] and structured.dtype == RGB_DTYPE
+        assert np.shares_memory(structured, rgb)
+        np.testing.assert_array_equal(structured["G"], rgb[..., 1])
+        # a reoriented (strided) structured array is still viewed without a copy
+        flipped = structured[::-1, :, ::2]
+        channels = structured_to_channels(flipped, channels_axis=0)
+        assert channels.shape == (3, 6, 5, 2)
+        assert np.shares_memory(channels, rgb)
+        np.testing.assert_array_equal(channels, np.moveaxis(rgb[::-1, :, ::2], -1, 0))
+
+    def test_copies(self) -> None:
+        rgba = np.random.default_rng(1).integers(0, 256, (4, 6, 5, 3), dtype=np.uint8)
+        # the channels of a voxel are not adjacent, so it is copied once
+        structured = channels_to_structured(rgba, 0, RGBA_DTYPE)
+        assert not np.shares_memory(structured, rgba)
+        np.testing.assert_array_equal(structured_to_channels(structured, 0), rgba)
+        mixed = np.zeros(3, dtype=[("a", np.uint8), ("b", np.int16)])
+        assert channels_dtype(mixed.dtype) is None
+        assert structured_to_channels(mixed).shape == (3, 2)
+        with pytest.raises(ValueError, match="number of channels"):
+            channels_to_structured(rgba[:3], 0, RGBA_DTYPE)
+        with pytest.raises(ValueError, match="must have dtype"):
+            channels_to_structured(rgba.astype(np.int16), 0, RGBA_DTYPE)
+
+    def test_move_channels(self) -> None:
+        array = np.zeros((2, 3, 4, 5))
+        assert move_channels(array, None, 0) is array
+        assert move_channels(array, -1, 3) is array
+        assert move_channels(array, -1, 0).shape == (5, 2, 3, 4)
+
+    def test_nib_roundtrip(self, tmp_path) -> None:
+        rgb = make_rgb()
+        packed = NibIO.pack_channeled_img(rgb, -1)
+        assert np.shares_memory(packed, rgb)
+        metadata = MetaData(Affine(direction=np.eye(3), spacing=[1.0, 1.0, 2.0], origin=[0.0, 0.0, 0.0]))
+        save_img(tmp_path / "rgb.nii.gz", np.moveaxis(rgb, -1, 0), metadata, channels_axis=0)
+        read_rgb, _ = read_img(tmp_path / "rgb.nii.gz", channels_axis=-1, coord_sys="itk")
+        np.testing.assert_array_equal(read_rgb, rgb)
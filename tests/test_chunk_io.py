@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import zlib
+
+import numpy as np
+import pytest
+
+from medio import read_img, read_meta, save_img
+from medio.backends.chunk_io import COMPRESSIONS, ChunkIO
+from medio.backends.cost_model import inspect_input
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+from medio.utils.resample import downsample
+
+
+def make_metadata() -> MetaData:
+    return MetaData(Affine(direction=np.eye(3), spacing=[0.5, 1.0, 2.0], origin=[3.0, -2.0, 1.0]), coord_sys="itk")
+
+
+class TestChunkIO:
+    @pytest.mark.parametrize("compression", list(COMPRESSIONS))
+    def test_roundtrip(self, nii_path, tmp_path, compression) -> None:
+        img, metadata = read_img(nii_path)
+        filename = tmp_path / "img.mvc"
+        save_img(filename, img, metadata, chunk_shape=(16, 16, 8), compression=compression)
+        for desired_ornt in (None, "RAS", "SLP"):
+            expected_img, expected_metadata = read_img(nii_path, desired_ornt)
+            chunk_img, chunk_metadata = read_img(filename, desired_ornt)
+            np.testing.assert_array_equal(chunk_img, expected_img)
+            np.testing.assert_allclose(chunk_metadata.affine, expected_metadata.affine)
+            assert chunk_metadata.orig_ornt == expected_metadata.orig_ornt
+            meta = read_meta(filename, desired_ornt)
+            assert meta.spatial_shape == chunk_img.shape
+            np.testing.assert_allclose(meta.affine, chunk_metadata.affine)
+
+    def test_roi(self, nii_path, tmp_path) -> None:
+        img, metadata = read_img(nii_path)
+        filename = tmp_path / "img.mvc"
+        save_img(filename, img, metadata, chunk_shape=(10, 10, 10))
+        roi = (slice(3, 17), slice(5, None), slice(-4, None))
+        for desired_ornt in (None, "LPS", "IRA"):
+            full_img, full_metadata = read_img(filename, desired_ornt)
+            roi_img, roi_metadata = read_img(filename, desired_ornt, roi=roi)
+            np.testing.assert_array_equal(roi_img, full_img[roi])
+            starts = [key.indices(n)[0] for key, n in zip(roi, full_img.shape)]
+            np.testing.assert_allclose(roi_metadata.affine.origin, full_metadata.affine.index2coord(starts))
+        with pytest.raises(ValueError, match="step of 1"):
+            read_img(filename, roi=(slice(0, 10, 2), slice(None), slice(None)))
+
+    def test_roi_reads_overlapping_chunks(self, tmp_path) -> None:
+        img = np.arange(20 * 20 * 4, dtype=np.int16).reshape(20, 20, 4)
+        filename = tmp_path / "img.mvc"
+        ChunkIO.save_img(filename, img, make_metadata(), use_original_ornt=False, chunk_shape=(10, 10, 4))
+        with open(filename, "rb") as f:
+            _, index = ChunkIO._read_header(f)
+        assert index is not None
+        # corrupt the last chunk, which is not read for a roi in the first chunk
+        offset, nbytes = index[-1].tolist()
+        with open(filename, "r+b") as f:
+            f.seek(offset)
+            f.write(b"\0" * nbytes)
+        roi_img, _ = ChunkIO.read_img(filename, roi=(slice(2, 8), slice(0, 10), slice(None)))
+        np.testing.assert_array_equal(roi_img, img[2:8, :10])
+        with pytest.raises(zlib.error):
+            ChunkIO.read_img(filename)
+
+    def test_channels_and_header(self, tmp_path) -> None:
+        img = np.random.default_rng(0).integers(0, 255, (9, 7, 5, 3), dtype=np.uint8)
+        filename = tmp_path / "rgb.mvc"
+        save_img(filename, img, make_metadata(), channels_axis=3, chunk_shape=(4, 4, 4))
+        chunk_img, chunk_metadata = read_img(filename, header=True, channels_axis=0)
+        np.testing.assert_array_equal(chunk_img, np.moveaxis(img, 3, 0))
+        assert chunk_metadata.header is not None
+        assert chunk_metadata.header["shape"] == [9, 7, 5, 3]
+        assert chunk_metadata.header["dtype"] == "|u1"
+        assert inspect_input(filename).fmt == "mvc"
+        np.testing.assert_array_equal(read_img(filename, backend="auto-fast", channels_axis=0)[0], chunk_img)
+
+    def test_invalid(self, tmp_path) -> None:
+        img = np.zeros((4, 4, 4))
+        with pytest.raises(ValueError, match="compression"):
+            save_img(tmp_path / "img.mvc", img, make_metadata(), compression="unknown")
+        with pytest.raises(ValueError, match="chunk shape"):
+            save_img(tmp_path / "img.mvc", img, make_metadata(), chunk_shape=(4, 4))
+        (tmp_path / "other.mvc").write_bytes(b"\0" * 64)
+        with pytest.raises(ValueError, match="not a medio chunked volume"):
+            read_img(tmp_path / "other.mvc")
+
+    @pytest.mark.parametrize("reduce", ["mean", "max", "mode"])
+    def test_pyramid(self, tmp_path, reduce) -> None:
+        img = np.random.default_rng(1).integers(0, 4, (37, 29, 23), dtype=np.int16)
+        metadata = make_metadata()
+        filename = tmp_path / "img.mvc"
+        save_img(filename, img, metadata, chunk_shape=(5, 7, 3), levels=3, levels_reduce=reduce)
+        expected_img, expected_metadata = img, metadata
+        for level in range(4):
+            level_img, level_metadata = read_img(filename, level=level)
+            # every level is the previous level downsampled by 2
+            np.testing.assert_array_equal(level_img, expected_img)
+            assert level_img.dtype == expected_img.dtype
+            np.testing.assert_allclose(level_metadata.affine, expected_metadata.affine)
+            assert read_meta(filename, level=level).spatial_shape == level_img.shape
+            roi_img, _ = read_img(filename, "RAS", level=level, roi=(slice(1, 3), slice(None), slice(0, 2)))
+            np.testing.assert_array_equal(roi_img, read_img(filename, "RAS", level=level)[0][1:3, :, 0:2])
+            expected_img, expected_metadata = downsample(expected_img, expected_metadata, 2, reduce)
+        with pytest.raises(ValueError, match="Invalid level 4"):
+            read_img(filename, level=4)
+        with pytest.raises(ValueError, match="Too many levels"):
+            save_img(filename, img, metadata, levels=5)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import numpy as np
+import pytest
 
 from medio.metadata.affine import Affine
 from medio.metadata.convert_nib_itk import convert_affine, convert_nib_itk, inv_axcodes
@@ -22,6 +23,10 @@ class TestInvAxcodes:
     def test_roundtrip(self) -> None:
         assert inv_axcodes(inv_axcodes("RAS")) == "RAS"
 
+    def test_invalid(self) -> None:
+        with pytest.raises(KeyError):
+            inv_axcodes("RAX")
+
 
 class TestConvertAffine:
     def test_identity_3d(self) -> None:
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import shutil
+
+import numpy as np
+import pytest
+
+from medio.backends.cost_model import (
+    DEFAULT_COST_TABLE,
+    calibrate,
+    get_cost_table,
+    inspect_input,
+    load_cost_table,
+    save_cost_table,
+    select_backends,
+    set_cost_table,
+)
+from medio.backends.itk_io import ItkIO
+from medio.backends.nib_io import NibIO
+from medio.backends.pdcm_io import PdcmIO
+from medio.read_save import read_img, read_meta, save_img
+from tests.conftest import write_multiframe_dcm
+
+READERS = {"nib": NibIO.read_img, "itk": ItkIO.read_img, "pdcm": PdcmIO.read_img}
+
+
+@pytest.fixture(autouse=True)
+def _reset_cost_table():
+    yield
+    set_cost_table(None)
+
+
+class TestInspectInput:
+    def test_nifti(self, nii_path) -> None:
+        info = inspect_input(nii_path)
+        assert (info.fmt, info.compressed) == ("nii.gz", True)
+        assert info.size_mb > 0
+
+    def test_mhd(self, nii_path, tmp_path) -> None:
+        img, metadata = read_img(nii_path)
+        save_img(tmp_path / "img.mhd", img, metadata)
+        info = inspect_input(tmp_path / "img.mhd")
+        assert info.fmt == "mhd"
+        assert info.size_mb >= img.nbytes / 2**20  # including the raw data file
+
+    def test_dicom(self, dcm_dir, multiframe_dcm) -> None:
+        info = inspect_input(dcm_dir)
+        assert (info.fmt, info.compressed, info.pdcm_decodable) == ("dcm_series", False, True)
+        assert inspect_input(multiframe_dcm).fmt == "dcm_multiframe"
+
+    def test_missing(self, tmp_path) -> None:
+        with pytest.raises(FileNotFoundError):
+            inspect_input(tmp_path / "missing.nii")
+
+
+class TestSelectBackends:
+    def test_default_table(self, nii_path, dcm_dir, multiframe_dcm) -> None:
+        assert sorted(select_backends(nii_path, "read_img", READERS)) == ["itk", "nib"]
+        assert sorted(select_backends(dcm_dir, "read_meta", READERS)) == ["itk", "pdcm"]
+        assert sorted(select_backends(multiframe_dcm, "read_img", READERS)) == ["itk", "pdcm"]
+
+    def test_no_estimate(self, nii_path) -> None:
+        # the backends without an estimate keep the order of preference
+        set_cost_table({})
+        assert select_backends(nii_path, "read_img", READERS) == ["nib", "itk"]
+
+    def test_options(self, dcm_dir) -> None:
+        assert select_backends(dcm_dir, "read_img", READERS, kwargs=["spacing_policy"]) == ["pdcm"]
+        assert select_backends(dcm_dir, "read_img", READERS, kwargs=["pixel_type"]) == ["itk"]
+        assert select_backends(dcm_dir, "read_img", READERS, header=True) == ["itk"]
+        with pytest.raises(ValueError):
+            select_backends(dcm_dir, "read_img", READERS, kwargs=["unknown"])
+
+    def test_cost_table(self, dcm_dir) -> None:
+        set_cost_table({"read_img": {"dcm_series": {"itk": (1.0, 0.0), "pdcm": (0.0, 0.1)}}})
+        assert select_backends(dcm_dir, "read_img", READERS) == ["pdcm", "itk"]
+
+
+class TestCalibrate:
+    def test_fit(self) -> None:
+        records = [
+            {"operation": "read_img", "fmt": "nii", "backend": "nib", "file_mb": size, "min": 0.01 + 0.002 * size}
+            for size in (1.0, 10.0, 100.0)
+        ]
+        records.append({"operation": "read_img", "fmt": "nii", "backend": "itk", "error": "failed"})
+        table = calibrate(records)
+        np.testing.assert_allclose(table["read_img"]["nii"]["nib"], (0.01, 0.002), atol=1e-6)
+        assert "itk" not in table["read_img"]["nii"]
+
+    def test_save_load(self, tmp_path) -> None:
+        path = tmp_path / "cost_table.json"
+        save_cost_table(path, {"read_img": {"nii": {"itk": (0.0, 0.0)}}})
+        table = load_cost_table(path)
+        assert table["read_img"]["nii"] == {**DEFAULT_COST_TABLE["read_img"]["nii"], "itk": (0.0, 0.0)}
+        assert table["read_meta"] == DEFAULT_COST_TABLE["read_meta"]
+
+    def test_environment(self, tmp_path, monkeypatch) -> None:
+        path = tmp_path / "cost_table.json"
+        save_cost_table(path, {"read_meta": {"nii.gz": {"itk": (0.0, 0.0)}}})
+        monkeypatch.setenv("MEDIO_COST_TABLE", str(path))
+        set_cost_table(None)
+        assert get_cost_table()["read_meta"]["nii.gz"]["itk"] == (0.0, 0.0)
+
+
+class TestAutoFast:
+    def test_read(self, nii_path, dcm_dir, tmp_path) -> None:
+        for path in (nii_path, dcm_dir):
+            img, metadata = read_img(path, backend="auto-fast")
+            expected_img, expected_metadata = read_img(path)
+            np.testing.assert_array_equal(img, expected_img)
+            np.testing.assert_allclose(metadata.affine, expected_metadata.affine, atol=1e-5)
+            assert read_meta(path, backend="auto-fast").spatial_shape == img.shape
+
+    def test_multiframe_frames(self, tmp_path) -> None:
+        pixels = write_multiframe_dcm(tmp_path / "multiframe.dcm")
+        img, _ = read_img(tmp_path / "multiframe.dcm", backend="auto-fast", frames=[1, 2])
+        np.testing.assert_array_equal(img, pixels[1:3].T)
+
+    def test_fallback(self, dcm_dir, tmp_path) -> None:
+        # pydicom rejects a series with a missing slice, while ITK reads it
+        for filename in dcm_dir.iterdir():
+            if filename.name != "IM50.dcm":
+                shutil.copy(filename, tmp_path)
+        set_cost_table({"read_img": {"dcm_series": {"itk": (1.0, 0.0), "pdcm": (0.0, 0.0)}}})
+        img, _ = read_img(tmp_path, backend="auto-fast")
+        assert img.shape[-1] == 149
@@ -4,12 +4,20 @@ from typing import TYPE_CHECKING
 
 import pytest
 
-from medio.utils.files import is_dicom, is_nifti, make_dir, make_empty_dir
+from medio.utils.files import is_dicom, is_file_sequence, is_nifti, is_path, make_dir, make_empty_dir
 
 if TYPE_CHECKING:
     from pathlib import Path
 
 
+class TestIsPath:
+    def test_single_path_and_sequence(self, tmp_path: Path) -> None:
+        for path in (tmp_path, str(tmp_path)):
+            assert is_path(path) and not is_file_sequence(path)
+        for files in ([tmp_path / "a.dcm", tmp_path / "b.dcm"], ("a.dcm",), []):
+            assert is_file_sequence(files) and not is_path(files)
+
+
 class TestIsNifti:
     def test_nii_gz(self, tmp_path: Path) -> None:
         f = tmp_path / "test.nii.gz"
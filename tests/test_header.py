@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import copy
+import pickle
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import pytest
+
+from medio import read_img, read_meta, save_img
+from medio.metadata.header import LazyHeader
+
+if TYPE_CHECKING:
+    from medio.metadata.metadata import MetaData
+
+
+def get_header(metadata: MetaData[Any]) -> Mapping[str, Any]:
+    assert isinstance(metadata.header, Mapping)
+    return metadata.header
+
+
+class TestLazyHeader:
+    def test_lazy_values(self) -> None:
+        decoded = []
+
+        def getter(key: str) -> object:
+            decoded.append(key)
+            return key.upper()
+
+        header = LazyHeader(["a", "b", "c"], getter)
+        assert list(header) == ["a", "b", "c"] and len(header) == 3
+        assert "b" in header and "d" not in header
+        assert decoded == []
+        assert header["b"] == "B" and header["b"] == "B"
+        assert decoded == ["b"]
+        with pytest.raises(KeyError):
+            header["d"]
+        assert header.get("d") is None
+
+    def test_header_tags(self) -> None:
+        header = LazyHeader(["a", "b", "c"], str.upper, header_tags=["c", "a", "x"])
+        assert list(header) == ["a", "c"]
+
+    def test_copies_are_dicts(self) -> None:
+        header = LazyHeader(["a", "b"], str.upper)
+        assert pickle.loads(pickle.dumps(header)) == {"a": "A", "b": "B"}
+        assert type(copy.deepcopy(header)) is dict
+
+
+class TestBackendHeaders:
+    def test_nifti(self, nii_path) -> None:
+        for backend in ("nib", "itk"):
+            _, metadata = read_img(nii_path, backend=backend, header=True)
+            assert isinstance(metadata.header, LazyHeader) and len(metadata.header) > 1
+        metadata = read_meta(nii_path, backend="nib", header=True, header_tags=["pixdim", "descrip"])
+        assert list(get_header(metadata)) == ["pixdim", "descrip"]
+        np.testing.assert_allclose(get_header(metadata)["pixdim"][1:4], metadata.affine.spacing)
+
+    def test_dicom(self, dcm_dir) -> None:
+        filename = sorted(dcm_dir.iterdir())[0]
+        _, metadata = read_img(filename, backend="pdcm", header=True)
+        header = get_header(metadata)
+        assert "(0010,0010)" in header and "(7FE0,0010)" not in header
+        metadata = read_meta(filename, backend="pdcm", header=True, header_tags=["PatientName", 0x00080016])
+        assert list(get_header(metadata)) == ["(0008,0016)", "(0010,0010)"]
+        assert get_header(metadata)["(0008,0016)"].keyword == "SOPClassUID"
+        metadata = read_meta(filename, backend="itk", header=True, header_tags=["0008|0016"])
+        assert list(get_header(metadata)) == ["0008|0016"]
+
+    def test_chunked(self, nii_path, tmp_path) -> None:
+        img, metadata = read_img(nii_path)
+        save_img(tmp_path / "img.mvc", img, metadata)
+        metadata = read_meta(tmp_path / "img.mvc", header=True, header_tags=["shape", "dtype"])
+        assert dict(get_header(metadata)) == {"shape": list(img.shape), "dtype": img.dtype.str}
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+
+import numpy as np
+import pytest
+
+from medio import instrument
+from medio.backends.pdcm_io import PdcmIO
+from medio.read_save import read_img, read_meta, save_dir, save_img
+
+
+@pytest.fixture(autouse=True)
+def _disable():
+    yield
+    instrument.disable()
+
+
+class TestInstrument:
+    def test_disabled(self, nii_path) -> None:
+        records = []
+        instrument.enable(records.append)
+        instrument.disable()
+        read_img(nii_path)
+        assert not instrument.is_enabled()
+        with instrument.stage("decode") as s:
+            s.nbytes = 10
+        assert s.nbytes == 0
+        assert records == []
+
+    def test_read_img(self, nii_path) -> None:
+        with instrument.collect() as records:
+            img, _ = read_img(nii_path, "RAS", dtype=np.float32)
+        assert not instrument.is_enabled()
+        [record] = records
+        assert (record.operation, record.backend, record.path) == ("read_img", "nib", nii_path)
+        assert list(record.stage_seconds()) == ["header", "reorient", "decode", "cast", "convert"]
+        assert record.nbytes >= img.nbytes
+        assert record.seconds >= sum(stage.seconds for stage in record.stages)
+
+    @pytest.mark.parametrize("backend", ["itk", "pdcm"])
+    def test_dicom_series(self, dcm_dir, backend) -> None:
+        with instrument.collect() as records:
+            img, _ = read_img(dcm_dir, backend=backend)
+            read_meta(dcm_dir, backend=backend)
+        assert [record.operation for record in records] == ["read_img", "read_meta"]
+        assert all(record.backend == backend for record in records)
+        stages = records[0].stage_seconds()
+        assert {"discover", "decode"} <= set(stages)
+        assert records[0].nbytes >= img.nbytes
+        assert "discover" in records[1].stage_seconds()
+
+    def test_save(self, nii_path, tmp_path) -> None:
+        img, metadata = read_img(nii_path)
+        with instrument.collect() as records:
+            save_img(tmp_path / "img.mhd", img, metadata)
+            save_dir(tmp_path / "dcm", img.astype(np.uint8), metadata)
+        assert [(record.operation, record.backend) for record in records] == [("save_img", "itk"), ("save_dir", "itk")]
+        for record in records:
+            assert list(record.stage_seconds()) == ["prepare", "write"]
+
+    def test_backend_call(self, dcm_dir) -> None:
+        with instrument.collect() as records:
+            PdcmIO.read_meta(dcm_dir)
+        assert records[0].backend == "pdcm"
+
+    def test_collector_and_logging(self, nii_path, caplog) -> None:
+        collected = []
+        instrument.enable(collected.append, log_level=logging.INFO)
+        with caplog.at_level(logging.INFO, logger="medio.instrument"):
+            read_meta(nii_path)
+        assert len(collected) == 1
+        assert "read_meta[nib]" in caplog.text
+
+    def test_error(self, tmp_path) -> None:
+        with instrument.collect() as records, pytest.raises(FileNotFoundError):
+            read_img(tmp_path / "missing.mhd")
+        assert records[0].error is not None
+        assert records[0].error.startswith("FileNotFoundError")
+
+    def test_collect_per_thread(self, nii_path) -> None:
+        started, done = threading.Event(), threading.Event()
+        thread_records = []
+
+        def collect_in_thread() -> None:
+            with instrument.collect() as records:
+                started.set()
+                done.wait(timeout=60)
+            thread_records.extend(records)
+
+        thread = threading.Thread(target=collect_in_thread)
+        thread.start()
+        started.wait(timeout=60)
+        with instrument.collect() as outer, instrument.collect() as inner:
+            read_meta(nii_path)
+        # the thread's block is still active
+        assert instrument.is_enabled()
+        done.set()
+        thread.join()
+        assert not instrument.is_enabled()
+        assert thread_records == []
+        assert outer == inner
+        assert len(inner) == 1
+
+    def test_collect_per_task(self, nii_path) -> None:
+        async def read(n: int) -> list[instrument.CallRecord]:
+            with instrument.collect() as records:
+                for _ in range(n):
+                    read_meta(nii_path)
+                    # let the other tasks run within this block
+                    await asyncio.sleep(0)
+            return records
+
+        async def main() -> list[int]:
+            return [len(records) for records in await asyncio.gather(read(1), read(2), read(3))]
+
+        assert asyncio.run(main()) == [1, 2, 3]
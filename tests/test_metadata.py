@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import pickle
+
 import numpy as np
 import pytest
 
 from medio.metadata.affine import Affine
+from medio.metadata.convert_nib_itk import convert_affine, inv_axcodes
 from medio.metadata.metadata import (
     MetaData,
     check_dcm_ornt,
     flip_last_axcodes,
     is_right_handed_axcodes,
 )
+from medio.read_save import save_img
 
 
 class TestMetaDataConstruction:
@@ -35,6 +39,12 @@ class TestMetaDataConstruction:
         with pytest.raises(ValueError):
             MetaData(aff, coord_sys="invalid")  # type: ignore[arg-type]
 
+    def test_slots(self) -> None:
+        meta = MetaData(Affine(np.eye(4)))
+        with pytest.raises(AttributeError):
+            meta.ornt_cache = "RAI"  # type: ignore[attr-defined]
+        assert not hasattr(meta, "__dict__")
+
     def test_accepts_ndarray(self) -> None:
         meta = MetaData(np.eye(4), coord_sys="itk")
         assert isinstance(meta.affine, Affine)
@@ -63,6 +73,58 @@ class TestMetaDataConvert:
         np.testing.assert_array_almost_equal(meta.affine, orig_affine)
 
 
+class TestMetaDataConvertInPlace:
+    def test_in_place(self) -> None:
+        direction = np.array([[0.0, 1, 0], [1, 0, 0], [0, 0, -1]])
+        aff = Affine(direction=direction, spacing=[0.5, 0.7, 2.0], origin=[10, 20, 30])
+        expected = convert_affine(np.asarray(aff))
+        meta = MetaData(aff.copy(), coord_sys="itk")
+        ornt = meta.ornt
+        meta.convert("nib")
+        converted = meta.affine
+        spacing = converted.spacing
+        meta.convert("itk")
+        meta.convert("nib")
+        assert meta.affine is converted
+        np.testing.assert_array_equal(meta.affine, expected)
+        assert meta.affine.spacing is spacing
+        np.testing.assert_array_almost_equal(meta.affine.direction, Affine(expected).direction)
+        # the direction which was passed to the Affine is not modified
+        np.testing.assert_array_equal(direction, [[0.0, 1, 0], [1, 0, 0], [0, 0, -1]])
+        assert meta.ornt == MetaData(Affine(expected), coord_sys="nib").get_ornt() == inv_axcodes(ornt)
+
+    def test_caller_affine_unchanged(self) -> None:
+        array = np.diag([0.5, 0.7, 2.0, 1.0])
+        meta = MetaData(array, coord_sys="itk")
+        meta.convert("nib")
+        np.testing.assert_array_equal(array, np.diag([0.5, 0.7, 2.0, 1.0]))
+        np.testing.assert_array_equal(meta.affine, np.diag([-0.5, -0.7, 2.0, 1.0]))
+        # metadata which share an affine do not convert each other
+        aff = Affine(array)
+        meta1, meta2 = MetaData(aff, coord_sys="itk"), MetaData(aff, coord_sys="itk")
+        meta1.convert("nib")
+        assert meta2.affine is aff
+        np.testing.assert_array_equal(meta2.affine, array)
+        np.testing.assert_array_equal(meta1.affine, np.diag([-0.5, -0.7, 2.0, 1.0]))
+
+    def test_in_coord_sys(self) -> None:
+        meta = MetaData(Affine(np.eye(4)), orig_ornt="RAI", coord_sys="itk", header={"a": 1})
+        assert meta.in_coord_sys("itk") is meta
+        nib_meta = meta.in_coord_sys("nib")
+        assert (nib_meta.coord_sys, nib_meta.orig_ornt, nib_meta.header) == ("nib", "LPS", {"a": 1})
+        np.testing.assert_array_equal(nib_meta.affine, np.diag([-1.0, -1, 1, 1]))
+        assert meta.coord_sys == "itk"
+        np.testing.assert_array_equal(meta.affine, np.eye(4))
+
+    def test_save_does_not_modify(self, tmp_dir) -> None:
+        meta = MetaData(Affine(np.diag([-1.0, 1, 2, 1])), coord_sys="nib")
+        affine = meta.affine
+        for filename, backend in (("img.nii.gz", "nib"), ("img.mhd", "itk")):
+            save_img(tmp_dir / filename, np.zeros((2, 3, 4), np.uint8), meta, backend=backend)
+            assert meta.affine is affine and meta.coord_sys == "nib"
+            np.testing.assert_array_equal(affine, np.diag([-1.0, 1, 2, 1]))
+
+
 class TestMetaDataClone:
     def test_clone_independent(self) -> None:
         aff = Affine(np.eye(4))
@@ -78,6 +140,46 @@ class TestMetaDataClone:
         assert meta.header["a"] == [1, 2]  # type: ignore[index]
 
 
+class TestMetaDataSerialization:
+    @staticmethod
+    def assert_same(loaded, meta) -> None:
+        assert type(loaded) is MetaData
+        assert type(loaded.affine) is Affine
+        np.testing.assert_array_equal(loaded.affine, meta.affine)
+        np.testing.assert_array_almost_equal(loaded.spacing, meta.spacing)
+        assert (loaded.orig_ornt, loaded._ornt, loaded.coord_sys) == (meta.orig_ornt, meta._ornt, meta.coord_sys)
+        assert loaded.spatial_shape == meta.spatial_shape
+
+    def test_pickle(self) -> None:
+        aff = Affine(direction=np.eye(3), spacing=[0.5, 1.0, 2.0], origin=[1, 2, 3])
+        meta = MetaData(aff, coord_sys="nib", header={"a": np.arange(3)}, spatial_shape=(4, 5, 6))
+        assert meta.ornt == "RAS"
+        loaded = pickle.loads(pickle.dumps(meta))
+        self.assert_same(loaded, meta)
+        np.testing.assert_array_equal(loaded.header["a"], np.arange(3))
+
+    def test_bytes_without_header(self) -> None:
+        meta = MetaData(Affine(np.eye(4)), orig_ornt="LPS", header={"a": 1})
+        data = meta.to_bytes(header=False)
+        assert len(data) < 200
+        loaded = MetaData.from_bytes(data)
+        self.assert_same(loaded, meta)
+        assert loaded.header is None
+        assert loaded.ornt == "RAI"
+
+    def test_without_header(self) -> None:
+        meta = MetaData(Affine(np.eye(3)), spatial_shape=(), header={"a": 1})
+        stripped = meta.without_header()
+        assert stripped.header is None
+        assert meta.header == {"a": 1}
+        assert stripped.affine is not meta.affine
+        self.assert_same(pickle.loads(pickle.dumps(stripped)), meta)
+
+    def test_invalid_bytes(self) -> None:
+        with pytest.raises(ValueError, match="Invalid MetaData bytes"):
+            MetaData.from_bytes(b"NOTMETADATA")
+
+
 class TestMetaDataSpacing:
     def test_spacing(self) -> None:
         aff = Affine(direction=np.eye(3), spacing=[0.5, 1.0, 2.0], origin=[0, 0, 0])
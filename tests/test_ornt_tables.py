@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import nibabel as nib
+import numpy as np
+import pytest
+from nibabel.orientations import apply_orientation, axcodes2ornt, inv_ornt_aff
+
+from medio.metadata import ornt_tables
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+from medio.metadata.ornt_tables import AXCODES, affine2axcodes, ornt_transform, reorient_affine, reorient_array
+from medio.read_save import read_img, read_meta, save_img
+
+
+def axcodes_affine(axcodes: str) -> np.ndarray:
+    """An affine of the orientation axcodes (nibabel convention) with anisotropic spacing and a shift"""
+    ornt = axcodes2ornt(axcodes)
+    affine = np.eye(4)
+    affine[:3, :3] = np.eye(3)[:, ornt[:, 0].astype(int)] * ornt[:, 1] * [0.9, 1.1, 2.0]
+    affine[:3, 3] = [5, 6, 7]
+    return affine
+
+
+class TestOrntTables:
+    def test_tables(self) -> None:
+        assert len(AXCODES) == 48
+        assert ornt_tables.TRANSFORMS.shape == (48, 48, 3, 2)
+        shape = (3, 4, 5)
+        array = np.arange(60).reshape(shape)
+        for start in AXCODES:
+            affine = axcodes_affine(start)
+            assert affine2axcodes(affine) == start
+            for end in AXCODES:
+                transform = nib.orientations.ornt_transform(axcodes2ornt(start), axcodes2ornt(end))
+                np.testing.assert_array_equal(ornt_transform(start, end), transform)
+                new_affine, new_shape = reorient_affine(affine, shape, end)
+                np.testing.assert_allclose(new_affine, affine @ inv_ornt_aff(transform, shape))
+                expected = apply_orientation(array, transform)
+                assert new_shape == expected.shape
+                np.testing.assert_array_equal(reorient_array(array, start, end), expected)
+
+    def test_affine2axcodes(self) -> None:
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            # rotations from small to large angles, and shears
+            affine = axcodes_affine(AXCODES[rng.integers(48)])
+            affine[:3, :3] += rng.normal(0, rng.uniform(0, 1), (3, 3))
+            assert affine2axcodes(affine) == "".join(nib.aff2axcodes(affine))
+        assert affine2axcodes(np.diag([1.0, 2.0, 1.0])) == "".join(nib.aff2axcodes(np.diag([1.0, 2.0, 1.0])))
+
+    def test_invalid(self) -> None:
+        with pytest.raises(ValueError, match="Invalid orientation"):
+            ornt_transform("RAS", "RRS")
+
+    def test_metadata_ornt(self) -> None:
+        for axcodes in AXCODES:
+            metadata = MetaData(Affine(axcodes_affine(axcodes)), coord_sys="nib")
+            assert metadata.ornt == axcodes
+            metadata.convert("itk")
+            assert MetaData(metadata.affine, coord_sys="itk").ornt == metadata.ornt
+
+    def test_nibabel_reoriented(self) -> None:
+        shape = (3, 4, 5)
+        for start in AXCODES:
+            img_struct = nib.Nifti1Image(np.zeros(shape, np.int16), axcodes_affine(start))
+            for end in ("RAS", "ASR", "ILP"):
+                expected = img_struct.as_reoriented(
+                    nib.orientations.ornt_transform(axcodes2ornt(start), axcodes2ornt(end))
+                )
+                new_affine, new_shape = reorient_affine(img_struct.affine, shape, end)
+                np.testing.assert_allclose(new_affine, expected.affine)
+                assert new_shape == expected.shape
+
+    @pytest.mark.parametrize("backend", ["nib", "itk"])
+    def test_read_meta(self, tmp_path, backend) -> None:
+        filename = tmp_path / "img.nii.gz"
+        save_img(filename, np.zeros((3, 4, 5), np.int16), MetaData(Affine(axcodes_affine("LPS"))))
+        for desired_ornt in ("ASR", "ILP", "RAS"):
+            img, metadata = read_img(filename, desired_ornt, backend=backend)
+            meta = read_meta(filename, desired_ornt, backend=backend)
+            assert meta.spatial_shape == img.shape
+            np.testing.assert_allclose(meta.affine, metadata.affine)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from medio.medimg import MedImg, PatchSampler
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+
+
+def make_mimg(shape=(20, 16, 12), channels: tuple[int, ...] = ()) -> MedImg:
+    angle = np.deg2rad(25)
+    rotation = np.array([[np.cos(angle), 0, -np.sin(angle)], [0, 1, 0], [np.sin(angle), 0, np.cos(angle)]])
+    affine = Affine(direction=rotation, spacing=[0.7, 1.1, 2.0], origin=[4.0, -3.0, 8.0])
+    np_image = np.arange(np.prod(shape + channels), dtype=np.float32).reshape(shape + channels)
+    return MedImg(np_image, MetaData(affine, orig_ornt="LPS", coord_sys="itk"))
+
+
+class TestPatchSampler:
+    def test_grid(self) -> None:
+        sampler = make_mimg().patch_sampler((8, 8, 5))
+        patches = sampler.grid()
+        # the last patch along every axis ends at the end of the image
+        assert {tuple(s) for s in patches.starts[:, 0:1]} == {(0,), (8,), (12,)}
+        assert set(patches.starts[:, 2].tolist()) == {0, 5, 7}
+        assert len(patches) == 3 * 2 * 3
+        covered = np.zeros(sampler.np_image.shape, bool)
+        for i in range(len(patches)):
+            covered[patches.slices(i)] = True
+        assert covered.all()
+        assert len(sampler.grid(stride=(4, 8, 7))) == 4 * 2 * 2
+
+    def test_views_and_batch(self) -> None:
+        mimg = make_mimg(channels=(3,))
+        patches = mimg.patch_sampler((6, 5, 4)).random(10, rng=0)
+        assert (patches.starts >= 0).all() and (patches.starts <= [14, 11, 8]).all()
+        batch = patches.batch()
+        assert batch.shape == (10, 6, 5, 4, 3)
+        for i, patch in enumerate(patches):
+            assert np.shares_memory(patch, mimg.np_image)
+            np.testing.assert_array_equal(batch[i], patch)
+            np.testing.assert_array_equal(patch, mimg.np_image[patches.slices(i)])
+
+    def test_metadata(self) -> None:
+        mimg = make_mimg()
+        patches = mimg.patch_sampler((4, 4, 4)).random(5, rng=1)
+        np.testing.assert_allclose(patches.origins, mimg.metadata.affine.index2coord(patches.starts))
+        for i in range(len(patches)):
+            expected = mimg[patches.slices(i)].metadata
+            metadata = patches.metadata(i)
+            np.testing.assert_allclose(metadata.affine, expected.affine)
+            assert metadata.coord_sys == expected.coord_sys
+            assert metadata.orig_ornt == "LPS"
+
+    def test_label_weighted(self) -> None:
+        mimg = make_mimg()
+        labels = np.zeros(mimg.np_image.shape, np.uint8)
+        labels[10, 7, 6] = 1
+        labels[:2, :2, :2] = 2
+        sampler = mimg.patch_sampler((5, 5, 3))
+        patches = sampler.label_weighted(labels, 1000, rng=2)
+        centered = (patches.starts == [8, 5, 5]).all(axis=1)
+        # every label is drawn about a third of the times
+        assert 250 < centered.sum() < 420
+        # the patches of the corner are clipped to the image
+        assert 250 < (patches.starts == 0).all(axis=1).sum() < 420
+        patches = sampler.label_weighted(labels, 50, weights={1: 1.0, 3: 5.0}, rng=3)
+        assert (patches.starts == [8, 5, 5]).all()
+        with pytest.raises(ValueError, match="None of the labels"):
+            sampler.label_weighted(labels, 5, weights={3: 1.0})
+
+    def test_label_weighted_edge_cases(self) -> None:
+        mimg = make_mimg()
+        sampler = mimg.patch_sampler((5, 5, 3))
+        labels = np.zeros(mimg.np_image.shape, np.uint8)
+        patches = sampler.label_weighted(labels, 0)
+        assert len(patches) == 0
+        assert patches.starts.shape == (0, 3)
+        with pytest.raises(ValueError, match="non-negative"):
+            sampler.label_weighted(labels, -1)
+        with pytest.raises(ValueError, match="None of the labels"):
+            sampler.label_weighted(labels, 5, weights={0: 0.0, 1: 1.0})
+
+    def test_label_weighted_modified_labels(self) -> None:
+        mimg = make_mimg()
+        sampler = mimg.patch_sampler((5, 5, 3))
+        labels = np.zeros(mimg.np_image.shape, np.uint8)
+        labels[10, 7, 6] = 1
+        patches = sampler.label_weighted(labels, 20, weights={1: 1.0}, rng=0)
+        assert (patches.starts == [8, 5, 5]).all()
+        # the label map is indexed again after an in-place modification
+        labels[10, 7, 6] = 0
+        labels[4, 4, 4] = 1
+        patches = sampler.label_weighted(labels, 20, weights={1: 1.0}, rng=0)
+        assert (patches.starts == [2, 2, 3]).all()
+
+    def test_invalid(self) -> None:
+        mimg = make_mimg()
+        with pytest.raises(ValueError, match="3 dimensions"):
+            PatchSampler(mimg.np_image, mimg.metadata, (4, 4))
+        with pytest.raises(ValueError, match="Invalid patch shape"):
+            mimg.patch_sampler((4, 20, 4))
+        with pytest.raises(ValueError, match="spatial shape"):
+            mimg.patch_sampler((4, 4, 4)).label_weighted(np.zeros((3, 3, 3), int), 5)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import numpy as np
+import pydicom
+import pytest
+from pydicom.uid import RLELossless
+
+from medio.backends.pdcm_codecs import CodecRegistry, ItkCodec, PydicomCodec
+from medio.backends.pdcm_io import PdcmIO
+from tests.conftest import write_multiframe_dcm
+
+
+@pytest.fixture
+def rle_multiframe(tmp_path):
+    filename = tmp_path / "rle.dcm"
+    pixels = write_multiframe_dcm(filename, n_frames=8, transfer_syntax=RLELossless)
+    return filename, pixels
+
+
+@pytest.fixture
+def rle_dir(dcm_dir, tmp_path):
+    for filename in dcm_dir.iterdir():
+        ds = pydicom.dcmread(filename)
+        ds.compress(RLELossless)
+        ds.save_as(tmp_path / filename.name)
+    return tmp_path
+
+
+class FailingCodec(PydicomCodec):
+    def decode(self, dataset, indices):
+        raise ValueError("corrupted")
+
+
+class TestCodecRegistry:
+    def test_parallel_frames(self, rle_multiframe) -> None:
+        filename, pixels = rle_multiframe
+        registry = CodecRegistry([PydicomCodec("pydicom")], max_workers=3)
+        decoded = registry.decode_frames(pydicom.dcmread(filename))
+        np.testing.assert_array_equal(decoded, pixels)
+        stats = registry.stats()["pydicom"]
+        assert stats.frames == 8
+        assert stats.calls == 4  # the first frame and 3 chunks
+        assert stats.seconds_per_frame > 0
+        registry.reset_stats()
+        assert registry.stats() == {}
+
+    def test_frame_subset(self, rle_multiframe) -> None:
+        filename, pixels = rle_multiframe
+        registry = CodecRegistry([PydicomCodec("pydicom")])
+        decoded = registry.decode_frames(pydicom.dcmread(filename), [5, 1, 2])
+        np.testing.assert_array_equal(decoded, pixels[[5, 1, 2]])
+
+    def test_itk(self, dcm_dir, rle_dir) -> None:
+        registry = CodecRegistry([ItkCodec()])
+        decoded = registry.decode_frames(pydicom.dcmread(rle_dir / "IM1.dcm"))
+        np.testing.assert_array_equal(decoded[0], pydicom.dcmread(dcm_dir / "IM1.dcm").pixel_array)
+        assert registry.stats()["itk"].frames == 1
+
+    def test_fallback(self, rle_multiframe) -> None:
+        filename, pixels = rle_multiframe
+        registry = CodecRegistry([FailingCodec("pydicom")])
+        registry.register(PydicomCodec("pydicom"), index=0)
+        assert registry.names == ["pydicom"]
+        registry.register(FailingCodec("failing"), index=0)
+        assert registry.names == ["failing", "pydicom"]
+        np.testing.assert_array_equal(registry.decode_frames(pydicom.dcmread(filename)), pixels)
+        assert "failing" not in registry.stats()
+
+    def test_unavailable(self, rle_multiframe) -> None:
+        filename, _ = rle_multiframe
+        registry = CodecRegistry([PydicomCodec("pylibjpeg-missing")])
+        with pytest.raises(RuntimeError):
+            registry.decode_frames(pydicom.dcmread(filename))
+
+
+class TestCompressedRead:
+    def test_multiframe(self, rle_multiframe) -> None:
+        filename, pixels = rle_multiframe
+        PdcmIO.codecs.reset_stats()
+        img, _ = PdcmIO.read_img(filename, frames=slice(2, 6))
+        np.testing.assert_array_equal(img, pixels[2:6].T)
+        assert PdcmIO.codecs.stats()["pydicom"].frames == 4
+
+    def test_series(self, dcm_dir, rle_dir) -> None:
+        PdcmIO.codecs.reset_stats()
+        img, metadata = PdcmIO.read_img(rle_dir)
+        expected_img, expected_metadata = PdcmIO.read_img(dcm_dir)
+        assert PdcmIO.codecs.stats()["pydicom"].frames == img.shape[-1]
+        np.testing.assert_array_equal(img, expected_img)
+        np.testing.assert_allclose(metadata.affine, expected_metadata.affine)
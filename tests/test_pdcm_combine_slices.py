@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from dicom_numpy import combine_slices
+
+from medio.backends.pdcm_combine_slices import assemble_slices, slices_array_spec
+from medio.backends.pdcm_io import PdcmIO
+
+
+class TestAssembleSlices:
+    def test_matches_combine_slices(self, dcm_dir) -> None:
+        expected_img, expected_affine = combine_slices(PdcmIO.extract_slices(dcm_dir))
+        img, affine = assemble_slices(PdcmIO.extract_slices(dcm_dir))
+        # the identity rescale of the test series is skipped, so the stored dtype is kept
+        assert img.dtype == np.uint8
+        assert img.flags.f_contiguous
+        np.testing.assert_array_equal(img, expected_img)
+        np.testing.assert_allclose(affine, expected_affine)
+
+    def test_out_is_filled(self, dcm_dir) -> None:
+        slices = PdcmIO.extract_slices(dcm_dir)
+        shape, dtype = slices_array_spec(slices)
+        out = np.zeros(shape, dtype=dtype)
+        img, _ = assemble_slices(slices, out=out)
+        assert img is out
+        np.testing.assert_array_equal(out, combine_slices(slices)[0])
+
+    def test_out_mismatch(self, dcm_dir) -> None:
+        slices = PdcmIO.extract_slices(dcm_dir)
+        with pytest.raises(ValueError):
+            assemble_slices(slices, out=np.empty((2, 2, 2), dtype=np.float64))
+
+    def test_release_pixels(self, dcm_dir) -> None:
+        slices = PdcmIO.extract_slices(dcm_dir)
+        assemble_slices(slices, release_pixels=True)
+        assert all("PixelData" not in ds for ds in slices)
+
+    def test_read_img_out(self, dcm_dir) -> None:
+        img, _ = PdcmIO.read_img(dcm_dir)
+        out = np.empty_like(img)
+        img2, _ = PdcmIO.read_img(dcm_dir, out=out)
+        assert np.shares_memory(img2, out)
+        np.testing.assert_array_equal(img2, img)
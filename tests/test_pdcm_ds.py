@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import numpy as np
 import pydicom
 import pydicom.dataset
 
@@ -24,3 +25,18 @@ class TestConvertDs:
         fds = _make_file_dataset(5)
         result = convert_ds(fds)
         assert isinstance(result, MultiFrameFileDataset)
+
+
+class TestFramePositions:
+    def test_positions_array(self, multiframe_dcm) -> None:
+        ds = convert_ds(pydicom.dcmread(multiframe_dcm))
+        positions = ds.frame_positions()
+        assert positions.shape == (6, 3)
+        np.testing.assert_allclose(positions[:, 2], 2.5 * np.arange(6))
+        assert ds.frame_positions() is positions  # cached
+
+    def test_orientations_fall_back_to_shared(self, multiframe_dcm) -> None:
+        ds = convert_ds(pydicom.dcmread(multiframe_dcm))
+        orientations = ds.frame_orientations()
+        assert orientations.shape == (6, 6)
+        np.testing.assert_allclose(orientations, np.tile([1, 0, 0, 0, 1, 0], (6, 1)))
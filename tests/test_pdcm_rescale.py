@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import numpy as np
+import pydicom
+
+from medio.backends.pdcm_rescale import apply_rescale, rescale_params, rescaled_dtype, stored_value_range
+
+
+class TestRescaledDtype:
+    def test_identity_keeps_dtype(self) -> None:
+        assert rescaled_dtype(np.dtype(np.uint16), 1, 0) == np.uint16
+
+    def test_ct_bits_stored(self) -> None:
+        # 12 bits stored: 0..4095 -> -1024..3071
+        assert rescaled_dtype(np.dtype(np.uint16), 1, -1024, bits_stored=12) == np.int16
+
+    def test_full_range_widens(self) -> None:
+        assert rescaled_dtype(np.dtype(np.uint16), 1, -1024) == np.int32
+
+    def test_non_integer(self) -> None:
+        assert rescaled_dtype(np.dtype(np.uint16), 0.5, 0) == np.float32
+        assert rescaled_dtype(np.dtype(np.int32), 0.5, 0) == np.float64
+
+    def test_stored_value_range(self) -> None:
+        assert stored_value_range(np.dtype(np.int16), 12) == (-2048, 2047)
+        assert stored_value_range(np.dtype(np.uint8)) == (0, 255)
+
+
+class TestApplyRescale:
+    def test_values(self) -> None:
+        voxels = np.arange(10, dtype=np.uint16)
+        result = apply_rescale(voxels, 2, -5)
+        np.testing.assert_array_equal(result, np.arange(10) * 2 - 5)
+
+    def test_in_place(self) -> None:
+        voxels = np.arange(10, dtype=np.int32)
+        result = apply_rescale(voxels, 2, 1, dtype=np.dtype(np.int32))
+        assert result is voxels
+        np.testing.assert_array_equal(voxels, np.arange(10) * 2 + 1)
+
+    def test_identity_skipped(self) -> None:
+        voxels = np.arange(10, dtype=np.uint8)
+        assert apply_rescale(voxels, 1, 0) is voxels
+
+    def test_float(self) -> None:
+        voxels = np.arange(4, dtype=np.uint16)
+        result = apply_rescale(voxels, 0.5, 1.25)
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result.astype(np.float64), np.arange(4) * 0.5 + 1.25)
+
+
+class TestRescaleParams:
+    def test_integral(self) -> None:
+        ds = pydicom.Dataset()
+        ds.RescaleSlope = "1.0"
+        ds.RescaleIntercept = "-1024"
+        slope, intercept = rescale_params(ds)
+        assert (slope, intercept) == (1, -1024)
+        assert isinstance(slope, int)
+
+    def test_defaults(self) -> None:
+        assert rescale_params(pydicom.Dataset()) == (1, 0)
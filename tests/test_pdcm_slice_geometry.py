@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import shutil
+
+import numpy as np
+import pydicom
+import pytest
+from dicom_numpy import DicomImportException
+
+from medio.backends.pdcm_io import PdcmIO
+from medio.backends.pdcm_slice_geometry import (
+    analyze_slices,
+    apply_spacing_policy,
+    resample_slices,
+    sort_slices,
+    split_slices,
+    uniform_positions,
+)
+
+
+def _make_slices(z_positions: list[float]) -> list[pydicom.Dataset]:
+    slices = []
+    for z in z_positions:
+        ds = pydicom.Dataset()
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.ImagePositionPatient = [0.0, 0.0, z]
+        ds.PixelSpacing = [1.0, 1.0]
+        ds.Rows = ds.Columns = 2
+        slices.append(ds)
+    return slices
+
+
+class TestSortSlices:
+    def test_sort_by_position(self) -> None:
+        slices = _make_slices([2.0, 0.0, 1.0])
+        sorted_slices, positions = sort_slices(slices)
+        np.testing.assert_array_equal(positions, [0.0, 1.0, 2.0])
+        assert sorted_slices[0] is slices[1]
+
+    def test_reversed_normal(self) -> None:
+        slices = _make_slices([0.0, 1.0, 2.0])
+        for ds in slices:
+            ds.ImageOrientationPatient = [0, 1, 0, 1, 0, 0]  # normal is -z
+        sorted_slices, _ = sort_slices(slices)
+        assert sorted_slices[0] is slices[2]
+
+    def test_presorted(self) -> None:
+        slices = _make_slices([0.0, 1.0, 2.0])
+        sorted_slices, _ = sort_slices(slices, presorted=True)
+        assert sorted_slices is slices
+        # presorted slices which are not in ascending order are sorted
+        sorted_slices, positions = sort_slices(slices[::-1], presorted=True)
+        np.testing.assert_array_equal(positions, [0.0, 1.0, 2.0])
+
+
+class TestAnalyzeSlices:
+    def test_uniform(self) -> None:
+        geometry = analyze_slices(_make_slices([0.0, 2.0, 4.0, 6.0]))
+        assert geometry.is_uniform
+        assert geometry.spacing == 2.0
+
+    def test_duplicates_dropped(self) -> None:
+        geometry = analyze_slices(_make_slices([0.0, 1.0, 1.0, 2.0]))
+        assert geometry.n_duplicates == 1
+        assert len(geometry.datasets) == 3
+        assert geometry.is_uniform
+
+    def test_gap(self) -> None:
+        geometry = analyze_slices(_make_slices([0.0, 1.0, 2.0, 4.0, 5.0, 6.0, 7.0]))
+        assert not geometry.is_uniform
+        np.testing.assert_array_equal(geometry.gaps, [2])
+        with pytest.raises(DicomImportException):
+            apply_spacing_policy(geometry, "reject")
+
+    def test_split(self) -> None:
+        geometry = analyze_slices(_make_slices([0.0, 1.0, 2.0, 4.0, 5.0, 6.0, 7.0]))
+        assert [len(g.datasets) for g in split_slices(geometry)] == [3, 4]
+        assert len(apply_spacing_policy(geometry, "split").datasets) == 4
+
+    def test_uniform_positions(self) -> None:
+        geometry = analyze_slices(_make_slices([0.0, 1.0, 2.0, 4.0]))
+        np.testing.assert_array_equal(uniform_positions(geometry), [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_invalid_policy(self) -> None:
+        with pytest.raises(ValueError):
+            apply_spacing_policy(analyze_slices(_make_slices([0.0, 1.0])), "invalid")  # type: ignore[arg-type]
+
+
+class TestResampleSlices:
+    def test_linear(self) -> None:
+        volume = np.stack([np.full((2, 2), v) for v in (0, 10, 20, 40)], axis=-1).astype(np.int16)
+        resampled = resample_slices(volume, np.array([0.0, 1.0, 2.0, 4.0]), np.arange(5.0))
+        assert resampled.dtype == np.float32
+        np.testing.assert_allclose(resampled[0, 0], [0, 10, 20, 30, 40])
+
+
+class TestSeriesWithGap:
+    @pytest.fixture
+    def gap_dir(self, dcm_dir, tmp_path):
+        for filename in dcm_dir.iterdir():
+            if filename.name not in ("IM50.dcm", "IM51.dcm"):
+                shutil.copy(filename, tmp_path)
+        return tmp_path
+
+    def test_reject(self, gap_dir) -> None:
+        with pytest.raises(DicomImportException):
+            PdcmIO.read_img(gap_dir)
+
+    def test_resample(self, gap_dir) -> None:
+        img, _ = PdcmIO.read_img(gap_dir, spacing_policy="resample")
+        meta = PdcmIO.read_meta(gap_dir, spacing_policy="resample")
+        assert img.shape[2] == 150
+        assert meta.spatial_shape == img.shape
+
+    def test_split(self, gap_dir) -> None:
+        img, metadata = PdcmIO.read_img(gap_dir, spacing_policy="split")
+        meta = PdcmIO.read_meta(gap_dir, spacing_policy="split")
+        assert img.shape[2] == 99
+        assert meta.spatial_shape == img.shape
+        np.testing.assert_allclose(meta.affine, metadata.affine)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import numpy as np
+import pydicom
+import pytest
+from dicom_numpy import DicomImportException
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+
+from medio.backends.pdcm_io import PdcmIO
+from medio.backends.pdcm_unpack_ds import DEFAULT_SLICE_SPACING, _ijk_to_patient_xyz_transform_matrix, frame_indices
+from medio.metadata.pdcm_ds import MultiFrameFileDataset
+from tests.conftest import write_multiframe_dcm
+
+
+class TestFrameIndices:
+    def test_all(self) -> None:
+        np.testing.assert_array_equal(frame_indices(4), [0, 1, 2, 3])
+
+    def test_slice_and_negative(self) -> None:
+        np.testing.assert_array_equal(frame_indices(10, slice(1, None, 4)), [1, 5, 9])
+        np.testing.assert_array_equal(frame_indices(10, [-1]), [9])
+
+    def test_empty(self) -> None:
+        with pytest.raises(ValueError):
+            frame_indices(4, slice(2, 2))
+
+
+class TestMultiframeRead:
+    def test_full_read(self, tmp_path) -> None:
+        pixels = write_multiframe_dcm(tmp_path / "mf.dcm")
+        img, metadata = PdcmIO.read_img(tmp_path / "mf.dcm")
+        np.testing.assert_array_equal(img, pixels.T)
+        np.testing.assert_allclose(metadata.spacing, [0.75, 0.5, 2.5])
+
+    def test_frames_subset(self, tmp_path) -> None:
+        pixels = write_multiframe_dcm(tmp_path / "mf.dcm")
+        img, metadata = PdcmIO.read_img(tmp_path / "mf.dcm", frames=slice(1, None, 2))
+        np.testing.assert_array_equal(img, pixels[1::2].T)
+        np.testing.assert_allclose(metadata.spacing, [0.75, 0.5, 5.0])
+        np.testing.assert_allclose(metadata.affine.origin, [-10.0, 20.0, 2.5])
+
+    def test_frames_meta_matches_read(self, tmp_path) -> None:
+        write_multiframe_dcm(tmp_path / "mf.dcm")
+        img, metadata = PdcmIO.read_img(tmp_path / "mf.dcm", frames=[4])
+        meta = PdcmIO.read_meta(tmp_path / "mf.dcm", frames=[4])
+        assert meta.spatial_shape == img.shape
+        np.testing.assert_allclose(meta.affine, metadata.affine)
+
+    def test_frame_orientations(self, tmp_path) -> None:
+        write_multiframe_dcm(tmp_path / "mf.dcm")
+        ds = pydicom.dcmread(tmp_path / "mf.dcm")
+        orientation = Dataset()
+        orientation.ImageOrientationPatient = [0, 1, 0, 0, 0, -1]
+        ds.PerFrameFunctionalGroupsSequence[5].PlaneOrientationSequence = Sequence([orientation])
+        ds.save_as(tmp_path / "mf.dcm")
+        meta = PdcmIO.read_meta(tmp_path / "mf.dcm", frames=slice(0, 5))
+        assert meta.spatial_shape == (4, 5, 5)
+        with pytest.raises(DicomImportException, match="ImageOrientationPatient"):
+            PdcmIO.read_meta(tmp_path / "mf.dcm", frames=[0, 5])
+
+    def test_non_uniform_frames(self, tmp_path) -> None:
+        write_multiframe_dcm(tmp_path / "mf.dcm")
+        with pytest.raises(DicomImportException, match="equally spaced"):
+            PdcmIO.read_img(tmp_path / "mf.dcm", frames=[0, 1, 5])
+        with pytest.raises(DicomImportException, match="equally spaced"):
+            PdcmIO.read_meta(tmp_path / "mf.dcm", frames=[1, 1])
+        # descending frames are equally spaced too
+        _, metadata = PdcmIO.read_img(tmp_path / "mf.dcm", frames=[4, 2, 0])
+        np.testing.assert_allclose(metadata.affine.origin, [-10.0, 20.0, 10.0])
+
+    def test_single_frame_affine(self, tmp_path) -> None:
+        write_multiframe_dcm(tmp_path / "mf.dcm", n_frames=1)
+        ds = pydicom.dcmread(tmp_path / "mf.dcm")
+        ds.__class__ = MultiFrameFileDataset
+        transform = _ijk_to_patient_xyz_transform_matrix(ds)
+        np.testing.assert_allclose(transform[:3, 2], [0, 0, DEFAULT_SLICE_SPACING])
+
+    def test_rescale(self, tmp_path) -> None:
+        pixels = write_multiframe_dcm(tmp_path / "mf.dcm", intercept=-1024)
+        img, _ = PdcmIO.read_img(tmp_path / "mf.dcm")
+        assert img.dtype == np.int16  # 12 bits stored
+        np.testing.assert_array_equal(img, pixels.T.astype(np.int32) - 1024)
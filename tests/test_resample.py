@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from medio.backends import nib_io
+from medio.medimg.medimg import MedImg
+from medio.metadata.affine import Affine
+from medio.metadata.metadata import MetaData
+from medio.read_save import read_img
+from medio.utils.resample import (
+    block_reduce,
+    downsample,
+    resample_separable,
+    resample_spacing,
+    resample_to_grid,
+    spacing_grid,
+)
+
+
+def oblique_metadata(spacing=(0.8, 1.2, 2.5)) -> MetaData:
+    angle = np.deg2rad(30)
+    rotation = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+    return MetaData(Affine(direction=rotation, spacing=list(spacing), origin=[-10.0, 5.0, 3.0]), coord_sys="itk")
+
+
+def interp_reference(array: np.ndarray, positions) -> np.ndarray:
+    """Linear interpolation with np.interp along every axis"""
+    for axis, p in enumerate(positions):
+        xp = np.arange(array.shape[axis])
+        array = np.apply_along_axis(lambda line, p=p, xp=xp: np.interp(p, xp, line), axis, array)
+    return array
+
+
+class TestSpacingGrid:
+    def test_block_centers(self) -> None:
+        positions, shape = spacing_grid((8, 6, 5), (1.0, 1.0, 2.0), (2.0, 3.0, 2.0))
+        assert shape == (4, 2, 5)
+        np.testing.assert_allclose(positions[0], [0.5, 2.5, 4.5, 6.5])
+        np.testing.assert_allclose(positions[1], [1, 4])
+        np.testing.assert_array_equal(positions[2], np.arange(5))
+
+    def test_extent(self) -> None:
+        positions, shape = spacing_grid((10,), (1.0,), (0.3,))
+        assert shape == (33,)
+        # the grid is centered in the extent of the image
+        assert positions[0][0] + 0.5 == pytest.approx(9.5 - positions[0][-1])
+
+
+class TestResample:
+    @pytest.mark.parametrize("new_spacing", [(0.5, 0.7, 1.0), (2.0, 3.1, 5.0), 1.0])
+    def test_linear(self, new_spacing) -> None:
+        rng = np.random.default_rng(0)
+        image = rng.normal(size=(13, 9, 7))
+        metadata = oblique_metadata()
+        new_image, new_metadata = resample_spacing(image, metadata, new_spacing)
+        positions, shape = spacing_grid(image.shape, metadata.spacing, np.broadcast_to(new_spacing, 3))
+        assert new_image.shape == shape
+        np.testing.assert_allclose(new_image, interp_reference(image, positions))
+        np.testing.assert_allclose(new_metadata.spacing, np.broadcast_to(new_spacing, 3))
+        np.testing.assert_allclose(new_metadata.affine.direction, metadata.affine.direction)
+        # the new voxels are at the sampled positions in the world
+        index = np.array([[0, 0, 0], [shape[0] - 1, 1, shape[2] - 1]])
+        expected = metadata.affine.index2coord(np.stack([p[i] for p, i in zip(positions, index.T)], axis=1))
+        np.testing.assert_allclose(new_metadata.affine.index2coord(index), expected)
+
+    def test_nearest(self) -> None:
+        labels = np.random.default_rng(1).integers(0, 4, size=(10, 12, 5)).astype(np.uint8)
+        new_labels, _ = resample_spacing(labels, oblique_metadata(), (0.4, 2.4, None), order=0)
+        assert new_labels.dtype == np.uint8
+        assert new_labels.shape == (20, 6, 5)
+        np.testing.assert_array_equal(new_labels[::2], labels[:, 1::2])
+        np.testing.assert_array_equal(new_labels[1::2], labels[:, 1::2])
+
+    def test_dtype(self) -> None:
+        image = np.arange(64, dtype=np.int16).reshape(4, 4, 4)
+        assert resample_spacing(image, oblique_metadata(), 2.0)[0].dtype == np.float32
+        assert resample_spacing(image.astype(np.float64), oblique_metadata(), 2.0)[0].dtype == np.float64
+
+    def test_chunks_and_channels(self) -> None:
+        image = np.random.default_rng(2).normal(size=(17, 11, 6, 3)).astype(np.float32)
+        positions, _ = spacing_grid(image.shape[:3], (1, 1, 1), (0.6, 1.7, 1.3))
+        expected = np.stack([interp_reference(image[..., c], positions) for c in range(3)], axis=-1)
+        for order, reference in ((1, expected), (0, None)):
+            whole = resample_separable(image, positions, order, max_workers=1)
+            chunked = resample_separable(image, positions, order, max_workers=4, chunk_bytes=64)
+            np.testing.assert_array_equal(chunked, whole)
+            if reference is not None:
+                np.testing.assert_allclose(whole, reference, rtol=1e-5, atol=1e-5)
+
+    def test_identity(self) -> None:
+        image = np.ones((3, 4, 5), np.float32)
+        assert resample_spacing(image, oblique_metadata(), (None, None, None))[0] is image
+
+    def test_invalid(self) -> None:
+        image = np.zeros((3, 4, 5))
+        with pytest.raises(ValueError, match="order"):
+            resample_spacing(image, oblique_metadata(), 1.0, order=3)
+        with pytest.raises(ValueError, match="positive"):
+            resample_spacing(image, oblique_metadata(), (1.0, 0.0, 1.0))
+        with pytest.raises(ValueError, match="sequence of 3"):
+            resample_spacing(image, oblique_metadata(), (1.0, 1.0))
+
+
+class TestResampleImg:
+    def test_medimg(self) -> None:
+        mimg = MedImg(np.zeros((10, 10, 10), np.float32), oblique_metadata())
+        resampled = mimg.resample([1.6, None, 1.25])
+        assert resampled.np_image.shape == (5, 10, 20)
+        np.testing.assert_allclose(resampled.metadata.spacing, [1.6, 1.2, 1.25])
+        assert resampled.metadata.coord_sys == "itk"
+
+    @pytest.mark.parametrize("backend", ["nib", "itk"])
+    def test_read_img(self, nii_path, backend) -> None:
+        img, metadata = read_img(nii_path, "RAS", backend=backend)
+        new_img, new_metadata = read_img(nii_path, "RAS", backend=backend, target_spacing=2.0, dtype=np.float32)
+        np.testing.assert_allclose(new_metadata.spacing, [2.0, 2.0, 2.0])
+        expected, expected_metadata = resample_spacing(img, metadata, 2.0)
+        np.testing.assert_allclose(new_img, expected)
+        np.testing.assert_allclose(new_metadata.affine, expected_metadata.affine)
+
+
+def linear_image(metadata: MetaData, shape) -> np.ndarray:
+    """An image of a linear function of the world coordinates, which linear interpolation reproduces"""
+    index = np.stack(np.meshgrid(*[np.arange(n) for n in shape], indexing="ij"), axis=-1).reshape(-1, 3)
+    return (metadata.affine.index2coord(index) @ [0.3, -1.2, 0.7] + 4).reshape(shape)
+
+
+def rotated_metadata(angles, spacing, origin, coord_sys="itk") -> MetaData:
+    direction = np.eye(3)
+    for axis, angle in enumerate(np.deg2rad(angles)):
+        c, s = np.cos(angle), np.sin(angle)
+        a, b = [i for i in range(3) if i != axis]
+        rotation = np.eye(3)
+        rotation[[a, a, b, b], [a, b, a, b]] = c, -s, s, c
+        direction = rotation @ direction
+    return MetaData(Affine(direction=direction, spacing=spacing, origin=origin), coord_sys=coord_sys)
+
+
+class TestResampleToGrid:
+    shape = (12, 10, 8)
+
+    def interior(self, metadata, target, target_shape) -> np.ndarray:
+        """The mask of the target voxels inside the convex hull of the image voxels"""
+        index = np.stack(np.meshgrid(*[np.arange(n) for n in target_shape], indexing="ij"), axis=-1).reshape(-1, 3)
+        src = metadata.affine.coord2index(target.affine.index2coord(index))
+        return ((src >= 0) & (src <= np.array(self.shape) - 1)).all(axis=1).reshape(target_shape)
+
+    @pytest.mark.parametrize(
+        "target",
+        [
+            rotated_metadata((0, 0, 0), (0.7, 1.3, 0.9), (1.0, -2.0, 0.5)),  # separable
+            rotated_metadata((0, 0, 90), (1.0, 1.0, 1.0), (10.0, 1.0, 3.0)),  # permuted axes
+            rotated_metadata((10, -20, 35), (0.8, 1.1, 1.2), (2.0, 1.0, 0.0)),  # oblique
+        ],
+    )
+    def test_linear(self, target) -> None:
+        metadata = rotated_metadata((0, 0, 0), (1.0, 1.0, 1.5), (0.0, 0.0, 0.0))
+        image = linear_image(metadata, self.shape)
+        target_shape = (11, 9, 7)
+        new_image, new_metadata = resample_to_grid(image, metadata, target, target_shape)
+        assert new_image.shape == target_shape
+        np.testing.assert_allclose(new_metadata.affine, target.affine)
+        interior = self.interior(metadata, target, target_shape)
+        assert interior.sum() > 20
+        expected = linear_image(target, target_shape)
+        np.testing.assert_allclose(new_image[interior], expected[interior], atol=1e-9)
+
+    def test_separable_like_oblique(self) -> None:
+        metadata = rotated_metadata((0, 0, 0), (1.0, 1.0, 1.5), (0.0, 0.0, 0.0))
+        image = np.random.default_rng(3).normal(size=self.shape)
+        target = rotated_metadata((90, 0, 180), (0.6, 1.1, 1.3), (5.0, 4.0, 3.0))
+        tilted = rotated_metadata((90, 0, 180.001), (0.6, 1.1, 1.3), (5.0, 4.0, 3.0))
+        for order in (0, 1):
+            separable, _ = resample_to_grid(image, metadata, target, (9, 8, 7), order=order, fill_value=-1)
+            oblique, _ = resample_to_grid(image, metadata, tilted, (9, 8, 7), order=order, fill_value=-1)
+            assert (separable == -1).any()
+            np.testing.assert_allclose(separable, oblique, atol=1e-3)
+
+    def test_identical_and_shifted(self) -> None:
+        metadata = rotated_metadata((0, 30, 0), (1.0, 1.0, 1.5), (0.0, 0.0, 0.0))
+        image = np.arange(np.prod(self.shape), dtype=np.float32).reshape(self.shape)
+        # the same grid in the other coordinate system
+        same, _ = resample_to_grid(image, metadata, metadata.in_coord_sys("nib"), self.shape)
+        assert same is image
+        shifted = MetaData(metadata.affine.clone(), coord_sys="itk")
+        shifted.affine.origin = metadata.affine.index2coord([2, -3, 0])
+        new_image, _ = resample_to_grid(image, metadata, shifted, (12, 10, 9), fill_value=-1)
+        np.testing.assert_array_equal(new_image[:10, 3:, :8], image[2:, :7])
+        assert (new_image[10:] == -1).all() and (new_image[:, :3] == -1).all() and (new_image[..., 8] == -1).all()
+
+    def test_nearest_labels_and_channels(self) -> None:
+        metadata = rotated_metadata((0, 0, 0), (1.0, 1.0, 1.0), (0.0, 0.0, 0.0))
+        labels = np.random.default_rng(4).integers(0, 5, size=(*self.shape, 2)).astype(np.uint8)
+        target = rotated_metadata((15, 0, 25), (0.9, 0.9, 0.9), (1.0, 1.0, 1.0))
+        new_labels, _ = resample_to_grid(labels, metadata, target, (10, 10, 10), order=0, fill_value=255)
+        assert new_labels.dtype == np.uint8
+        assert new_labels.shape == (10, 10, 10, 2)
+        assert set(np.unique(new_labels)) <= {0, 1, 2, 3, 4, 255}
+        # the nearest source voxel of every target voxel
+        index = np.stack(np.meshgrid(*map(np.arange, (10, 10, 10)), indexing="ij"), axis=-1).reshape(-1, 3)
+        src = np.floor(metadata.affine.coord2index(target.affine.index2coord(index)) + 0.5).astype(int)
+        inside = ((src >= 0) & (src < self.shape)).all(axis=1)
+        np.testing.assert_array_equal(new_labels.reshape(-1, 2)[inside], labels[tuple(src[inside].T)])
+
+    def test_medimg(self, nii_path) -> None:
+        mimg = MedImg.from_file(nii_path)
+        target = mimg.resample(2.0)
+        resampled = mimg.resample_like(target)
+        assert resampled.np_image.shape == target.np_image.shape
+        np.testing.assert_allclose(resampled.np_image, target.np_image, atol=1e-3)
+        target.metadata.spatial_shape = target.np_image.shape
+        np.testing.assert_array_equal(mimg.resample_like(target.metadata).np_image, resampled.np_image)
+        target.metadata.spatial_shape = None
+        with pytest.raises(ValueError, match="spatial_shape"):
+            mimg.resample_like(target.metadata)
+
+
+def block_reference(array: np.ndarray, factors, func) -> np.ndarray:
+    """func of every block of factors, with loops"""
+    shape = tuple(n // f for n, f in zip(array.shape, factors))
+    out = np.empty(shape, dtype=array.dtype if func is not np.mean else np.float64)
+    for index in np.ndindex(shape):
+        block = array[tuple(slice(i * f, (i + 1) * f) for i, f in zip(index, factors))]
+        out[index] = func(block)
+    return out
+
+
+def block_mode(block: np.ndarray) -> int:
+    values, counts = np.unique(block, return_counts=True)
+    return values[counts.argmax()]
+
+
+class TestDownsample:
+    @pytest.mark.parametrize("factors", [(2, 2, 2), (3, 1, 2), (1, 4, 3)])
+    def test_block_reduce(self, factors) -> None:
+        labels = np.random.default_rng(5).integers(0, 4, size=(10, 9, 7)).astype(np.int16)
+        mean = block_reduce(labels, factors, "mean")
+        assert mean.dtype == np.float32
+        np.testing.assert_allclose(mean, block_reference(labels, factors, np.mean), rtol=1e-6)
+        np.testing.assert_array_equal(block_reduce(labels, factors, "max"), block_reference(labels, factors, np.max))
+        mode = block_reduce(labels, factors, "mode")
+        assert mode.dtype == np.int16
+        np.testing.assert_array_equal(mode, block_reference(labels, factors, block_mode))
+
+    def test_affine(self) -> None:
+        metadata = oblique_metadata()
+        image = np.random.default_rng(6).normal(size=(9, 8, 7, 2))
+        new_image, new_metadata = downsample(image, metadata, (2, 4, 1))
+        assert new_image.shape == (4, 2, 7, 2)
+        np.testing.assert_allclose(new_image[1, 0, 3], image[2:4, :4, 3].mean(axis=(0, 1)))
+        np.testing.assert_allclose(new_metadata.spacing, metadata.spacing * [2, 4, 1])
+        # the new voxels are at the centers of the blocks
+        np.testing.assert_allclose(
+            new_metadata.affine.index2coord(np.array([[0, 0, 0], [3, 1, 6]])),
+            metadata.affine.index2coord(np.array([[0.5, 1.5, 0], [6.5, 5.5, 6]])),
+        )
+
+    def test_invalid(self) -> None:
+        image = np.zeros((4, 4, 4))
+        with pytest.raises(ValueError, match="reduce"):
+            downsample(image, oblique_metadata(), 2, reduce="median")
+        with pytest.raises(ValueError, match="positive integers"):
+            downsample(image, oblique_metadata(), (2, 1.5, 1))  # type: ignore[arg-type]
+        with pytest.raises(ValueError, match="larger than the shape"):
+            downsample(image, oblique_metadata(), (5, 1, 1))
+
+    def test_medimg(self) -> None:
+        mimg = MedImg(np.arange(1000.0).reshape(10, 10, 10), oblique_metadata())
+        downsampled = mimg.downsample((2, 5, 1), reduce="max")
+        np.testing.assert_array_equal(downsampled.np_image, mimg.np_image[1::2, 4::5])
+        np.testing.assert_allclose(downsampled.metadata.spacing, [1.6, 6.0, 2.5])
+
+    @pytest.mark.parametrize("desired_ornt", [None, "RAS", "SPL"])
+    def test_read_img(self, nii_path, desired_ornt, monkeypatch) -> None:
+        # slabs of a few slices
+        monkeypatch.setattr(nib_io, "SLAB_BYTES", 1024)
+        img, metadata = read_img(nii_path, desired_ornt, backend="nib")
+        # the factors divide the shape of the image, so the blocks do not depend on the orientation
+        factors = (2, 3, 2) if desired_ornt is None else (3, 2, 2)
+        expected, expected_metadata = downsample(img, metadata, factors, "mode")
+        for backend in ("nib", "itk"):
+            new_img, new_metadata = read_img(
+                nii_path, desired_ornt, backend=backend, downsample=factors, downsample_reduce="mode"
+            )
+            np.testing.assert_array_equal(new_img, expected)
+            np.testing.assert_allclose(new_metadata.affine, expected_metadata.affine, atol=1e-9)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from medio.medimg import MedImg
+from medio.read_save import read_img
+from medio.shared import SharedImg, read_img_shared
+
+
+def assert_same_image(np_image, metadata, expected_image, expected_metadata) -> None:
+    assert np.array_equal(np_image, expected_image)
+    assert np_image.dtype == expected_image.dtype
+    np.testing.assert_array_equal(metadata.affine, expected_metadata.affine)
+    np.testing.assert_array_equal(metadata.spacing, expected_metadata.spacing)
+    assert metadata.orig_ornt == expected_metadata.orig_ornt
+    assert metadata.coord_sys == expected_metadata.coord_sys
+    assert metadata.spatial_shape == expected_metadata.spatial_shape
+
+
+def is_unlinked(name: str) -> bool:
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return True
+    shm.close()
+    return False
+
+
+class TestSharedImg:
+    def test_transfer_and_attach(self, nii_path) -> None:
+        img, metadata = read_img(nii_path, "RAS", header=True)
+        ref = SharedImg.create(img, metadata).transfer()
+        ref = pickle.loads(pickle.dumps(ref))
+        with SharedImg.attach(ref) as shared:
+            assert_same_image(shared.np_image, shared.metadata, img, metadata)
+            assert shared.metadata.header is not None and metadata.header is not None
+            assert shared.metadata.header.keys() == metadata.header.keys()
+            assert not shared.np_image.flags.owndata
+        assert is_unlinked(ref.name)
+
+    def test_without_header(self, nii_path) -> None:
+        img, metadata = read_img(nii_path, header=True)
+        with SharedImg.create(img, metadata, header=False) as shared:
+            assert shared.metadata.header is None
+            assert len(pickle.dumps(shared.ref)) < 1024
+            assert shared.owner
+        assert is_unlinked(shared.ref.name)
+
+    def test_read_img_shared_in_subprocess(self, nii_path) -> None:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            ref = executor.submit(read_img_shared, nii_path, "RAS").result()
+        # the block outlives the worker process, which transferred its ownership
+        with SharedImg.attach(ref) as shared:
+            assert_same_image(shared.np_image, shared.metadata, *read_img(nii_path, "RAS"))
+        assert is_unlinked(ref.name)
+
+    def test_lifetime(self, nii_path) -> None:
+        img, metadata = read_img(nii_path)
+        shared = SharedImg.create(img, metadata)
+        reader = SharedImg.attach(shared.ref, owner=False)
+        view = reader.np_image
+        with pytest.raises(BufferError):
+            reader.close()
+        view = view[::2]
+        with pytest.raises(BufferError):
+            reader.close()
+        del view
+        reader.close()
+        with pytest.raises(ValueError, match="closed"):
+            _ = reader.np_image
+        with pytest.raises(ValueError, match="owner"):
+            reader.unlink()
+        shared.close()
+        assert not is_unlinked(shared.ref.name)
+        shared.unlink()
+        assert is_unlinked(shared.ref.name)
+
+    def test_close_with_views(self, nii_path) -> None:
+        img, metadata = read_img(nii_path)
+        shared = SharedImg.create(img, metadata)
+        view = shared.np_image[1:]
+        with pytest.raises(BufferError):
+            shared.close()
+        assert np.array_equal(shared.np_image, img)
+        with pytest.raises(BufferError):
+            shared.transfer()
+        assert shared.owner
+        del view
+        ref = shared.transfer()
+        assert not shared.owner
+        with SharedImg.attach(ref) as owner:
+            assert np.array_equal(owner.np_image, img)
+        assert is_unlinked(ref.name)
+
+    def test_medimg(self, nii_path) -> None:
+        mimg = MedImg.from_file(nii_path)
+        ref = mimg.to_shared().transfer()
+        with SharedImg.attach(ref) as shared:
+            shared_mimg = MedImg.from_shared(shared)
+            assert_same_image(shared_mimg.np_image, shared_mimg.metadata, mimg.np_image, mimg.metadata)
+            del shared_mimg
+        with pytest.raises(ValueError, match="closed"):
+            MedImg.from_shared(shared)